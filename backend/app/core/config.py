@@ -5,9 +5,10 @@ Contains configurations
 import os
 import re
 from functools import lru_cache
+from typing import Optional
 
 from pydantic_settings import BaseSettings
-from pydantic import computed_field
+from pydantic import Field, computed_field
 
 
 class Settings(BaseSettings):
@@ -18,6 +19,12 @@ class Settings(BaseSettings):
     CHROMA_HOST: str
     CHROMA_PORT: str
 
+    # "chroma" for a Chroma server, "local" for the embedded memory-mapped store
+    VECTOR_STORE_BACKEND: str = "chroma"
+    # Local store: collections with more live rows are searched approximately
+    LOCAL_VECTOR_IVF_THRESHOLD: int = 50_000
+    LOCAL_VECTOR_NPROBE: int = 8
+
     # ------------------------------------------------------------------
     # File Storage
     # ------------------------------------------------------------------
@@ -25,6 +32,11 @@ class Settings(BaseSettings):
     MINIO_ACCESS_KEY: str
     MINIO_SECRET_KEY: str
     MINIO_BUCKET: str
+    S3_MAX_POOL_CONNECTIONS: int = 32
+    UPLOAD_MAX_BYTES: int = 512 * 1024 * 1024
+    UPLOAD_PART_SIZE: int = 8 * 1024 * 1024
+    # Batches of files deleted concurrently by bulk deletes
+    DELETE_CONCURRENCY: int = 8
 
     # ------------------------------------------------------------------
     # Embedding
@@ -34,6 +46,105 @@ class Settings(BaseSettings):
     UPLOAD_DIR: str
     EMBEDDING_BASE_URL: str
 
+    # ------------------------------------------------------------------
+    # Tokenizer
+    # ------------------------------------------------------------------
+    # Path to a local tokenizer.json (or its directory) for EMBEDDING_MODEL;
+    # when set, tokenization runs in-process instead of calling TEI
+    TOKENIZER_PATH: Optional[str] = None
+    TOKENIZER_CACHE_SIZE: int = 4096
+    TOKENIZE_BATCH_SIZE: int = 32
+
+    # ------------------------------------------------------------------
+    # Ingestion
+    # ------------------------------------------------------------------
+    # Workers per stage: downloads and embed/upsert run in threads, PDF
+    # parsing in processes (0 parses in the calling thread)
+    INGEST_DOWNLOAD_WORKERS: int = 4
+    INGEST_PARSE_WORKERS: int = Field(default_factory=lambda: os.cpu_count() or 1)
+    INGEST_EMBED_WORKERS: int = 2
+    # Objects up to this size are parsed from memory, larger ones from temporary files
+    INGEST_IN_MEMORY_MAX_BYTES: int = 64 * 1024 * 1024
+    # Embedding batches kept in flight against TEI over pooled connections
+    EMBEDDING_MAX_IN_FLIGHT: int = 4
+    # Embedding batches are packed up to a token budget that adapts to TEI
+    EMBEDDING_BATCH_MAX_TOKENS: int = 4096
+    EMBEDDING_BATCH_MAX_SIZE: int = 32
+    EMBEDDING_BATCH_TARGET_LATENCY: float = 2.0
+    # Chunks whose normalized content is already stored, e.g. boilerplate
+    # repeated across documents, reuse that chunk instead of being embedded
+    # and stored again. Opt-in, since a source filter then only matches the
+    # source owning a shared chunk. Near-duplicates are matched by MinHash
+    # similarity when enabled
+    DEDUP_ENABLED: bool = False
+    DEDUP_NEAR_DUPLICATES: bool = False
+    DEDUP_NEAR_THRESHOLD: float = 0.9
+    # Upserts are batched by estimated payload size and sent concurrently;
+    # requests in flight are reduced when latency exceeds the target
+    UPSERT_MAX_BATCH_BYTES: int = 4 * 1024 * 1024
+    UPSERT_MAX_BATCH_SIZE: int = 1000
+    UPSERT_MAX_IN_FLIGHT: int = 4
+    UPSERT_TARGET_LATENCY: float = 1.0
+    UPSERT_RETRIES: int = 3
+
+    # Chunking of the index built when none was activated by a re-index
+    CHUNK_SIZE: int = 256
+    CHUNK_OVERLAP: int = 50
+    # Text extracted from each object version is kept compressed, so
+    # re-indexing chunks and embeds it without downloading or parsing PDFs
+    PAGE_STORE_ENABLED: bool = True
+    PAGE_STORE_COMPRESSION_LEVEL: int = 6
+
+    # Background ingestion jobs; each runs its files through the ingestion pipeline
+    INGEST_JOB_WORKERS: int = 1
+    # Seconds without a heartbeat after which a running job is taken over
+    INGEST_JOB_STALE_SECONDS: float = 60.0
+    # Replicas sharing STATE_DIR split bucket syncs through leased work items
+    INGEST_DISTRIBUTED: bool = False
+    INGEST_LEASE_TTL_SECONDS: float = 120.0
+
+    # ------------------------------------------------------------------
+    # Search
+    # ------------------------------------------------------------------
+    # Query embeddings are cached in an LRU; results until they expire or
+    # a write to the vector store could change them
+    SEARCH_QUERY_CACHE_SIZE: int = 10_000
+    SEARCH_RESULT_CACHE_SIZE: int = 10_000
+    SEARCH_RESULT_TTL_SECONDS: float = 300.0
+    SEARCH_MAX_K: int = 100
+    # Chunks are also indexed for BM25 keyword search, used by the lexical
+    # and hybrid modes; hybrid fuses both rankings by reciprocal rank
+    LEXICAL_INDEX_ENABLED: bool = True
+    SEARCH_HYBRID_RRF_K: int = 60
+    # Candidates taken from each ranking per requested result
+    SEARCH_HYBRID_CANDIDATES: int = 4
+
+    # ------------------------------------------------------------------
+    # Observability
+    # ------------------------------------------------------------------
+    # Per-stage latency, throughput, retries and peak memory on /metrics
+    METRICS_ENABLED: bool = False
+    # Log a per-request stage breakdown and return it as a Server-Timing header
+    METRICS_PROFILE_REQUESTS: bool = False
+
+    # ------------------------------------------------------------------
+    # Startup
+    # ------------------------------------------------------------------
+    # PDF parsers and the Chroma client are imported on first use; the
+    # warm-up importing them and checking the bucket and vector store runs
+    # after startup, in the background, and /ready reports when it is done.
+    # Otherwise startup waits for a first attempt
+    WARM_UP_IN_BACKGROUND: bool = True
+    # Seconds between warm-up attempts while backing services are unreachable
+    WARM_UP_RETRY_SECONDS: float = 5.0
+
+    # ------------------------------------------------------------------
+    # Local state (caches, manifests)
+    # ------------------------------------------------------------------
+    STATE_DIR: str = ".state"
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 1_000_000
+
     @computed_field
     @property
     def EMBEDDING_API_URL(self) -> str:
@@ -50,6 +161,51 @@ class Settings(BaseSettings):
         safe_model_name = re.sub(r'[^a-zA-Z0-9_-]', '_', self.EMBEDDING_MODEL)
         return f"{self.BASE_COLLECTION_NAME}_{safe_model_name}"
 
+    @computed_field
+    @property
+    def EMBEDDING_CACHE_PATH(self) -> str:
+        return os.path.join(self.STATE_DIR, "embedding_cache.sqlite3")
+
+    @computed_field
+    @property
+    def SYNC_MANIFEST_PATH(self) -> str:
+        return os.path.join(self.STATE_DIR, "sync_manifest.sqlite3")
+
+    @computed_field
+    @property
+    def DEDUP_PATH(self) -> str:
+        return os.path.join(self.STATE_DIR, "chunk_dedup.sqlite3")
+
+    @computed_field
+    @property
+    def PAGE_STORE_PATH(self) -> str:
+        return os.path.join(self.STATE_DIR, "pages.sqlite3")
+
+    @computed_field
+    @property
+    def INDEX_CATALOG_PATH(self) -> str:
+        return os.path.join(self.STATE_DIR, "indexes.sqlite3")
+
+    @computed_field
+    @property
+    def JOB_STORE_PATH(self) -> str:
+        return os.path.join(self.STATE_DIR, "jobs.sqlite3")
+
+    @computed_field
+    @property
+    def LEASE_STORE_PATH(self) -> str:
+        return os.path.join(self.STATE_DIR, "leases.sqlite3")
+
+    @computed_field
+    @property
+    def LOCAL_VECTOR_STORE_PATH(self) -> str:
+        return os.path.join(self.STATE_DIR, "vectors", self.COLLECTION_NAME)
+
+    @computed_field
+    @property
+    def LEXICAL_INDEX_PATH(self) -> str:
+        return os.path.join(self.STATE_DIR, "lexical", self.COLLECTION_NAME)
+
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -66,5 +222,4 @@ def get_settings() -> Settings:
     return Settings()
 
 
-settings = get_settings()
-os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
\ No newline at end of file
+settings = get_settings()
\ No newline at end of file
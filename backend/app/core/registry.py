@@ -0,0 +1,228 @@
+"""Contains the registry of long-lived clients and services"""
+
+import os
+import time
+import logging
+import threading
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from backend.app.core.config import settings
+from backend.app.utils import metrics
+from backend.app.utils.s3 import ensure_bucket
+from backend.app.schemas.index_schema import IndexSpec
+from backend.app.services.embeddings.document_loader import load_parsers
+from backend.app.services.embeddings.embedding_service import EmbeddingService
+from backend.app.services.embeddings.factory import EmbeddingServiceFactory
+from backend.app.services.embeddings.file_processor import FileProcessor
+from backend.app.services.embeddings.index_catalog import IndexCatalog
+from backend.app.services.embeddings.page_store import PageStore, version_key
+from backend.app.services.embeddings.sync_manifest import SyncManifest
+from backend.app.services.jobs.job_store import JobStore
+from backend.app.services.jobs.job_runner import JobRunner
+from backend.app.services.jobs.lease_store import LeaseStore
+from backend.app.services.search.search_service import SearchService
+
+logger = logging.getLogger(__name__)
+
+
+class ActiveIndex(NamedTuple):
+    """The index requests are served from, swapped as a whole by a re-index."""
+    spec: IndexSpec
+    embedding_service: EmbeddingService
+    sync_manifest: SyncManifest
+    search_service: SearchService
+
+
+class ServiceRegistry:
+    """
+    Clients and services built once at application startup and shared by
+    every request: a pooled S3 client (created on first use by the file
+    processor), the active index with its embedding
+    service, TEI sessions, cached Chroma collection and search service,
+    the file processor and the background ingestion job workers.
+
+    Slow imports and checks of backing services run as a warm-up after
+    startup, retried until they succeed; ``ready`` is set once they did.
+    """
+
+    def __init__(self):
+        self.index: Optional[ActiveIndex] = None
+        self.index_catalog: Optional[IndexCatalog] = None
+        self.page_store: Optional[PageStore] = None
+        self.file_processor: Optional[FileProcessor] = None
+        self.job_store: Optional[JobStore] = None
+        self.job_runner: Optional[JobRunner] = None
+        self.lease_store: Optional[LeaseStore] = None
+        self.bucket_ready = False
+        # Replaced by the last switch; closed at the next one, once requests stopped using it
+        self._retired: Optional[ActiveIndex] = None
+        self.ready = threading.Event()
+        self._warm_up_steps: Dict[str, Callable[[], None]] = {}
+        self._stopping = threading.Event()
+
+    @property
+    def s3_client(self):
+        return self.file_processor.s3_client if self.file_processor is not None else None
+
+    @property
+    def embedding_service(self) -> Optional[EmbeddingService]:
+        return self.index.embedding_service if self.index is not None else None
+
+    @property
+    def sync_manifest(self) -> Optional[SyncManifest]:
+        return self.index.sync_manifest if self.index is not None else None
+
+    @property
+    def search_service(self) -> Optional[SearchService]:
+        return self.index.search_service if self.index is not None else None
+
+    def start(self) -> None:
+        metrics.configure(settings.METRICS_ENABLED)
+        os.makedirs(settings.STATE_DIR, exist_ok=True)
+        os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+        # Re-indexing switches the index serving the collection named after the model
+        self.index_catalog = IndexCatalog(settings.INDEX_CATALOG_PATH)
+        spec = self.index_catalog.active(settings.COLLECTION_NAME) or EmbeddingServiceFactory.default_spec()
+        self.index = self._open_index(spec, *self.build_index(spec))
+        if settings.PAGE_STORE_ENABLED:
+            self.page_store = PageStore(settings.PAGE_STORE_PATH, settings.PAGE_STORE_COMPRESSION_LEVEL)
+        self.file_processor = FileProcessor(page_store=self.page_store)
+        self.job_store = JobStore(settings.JOB_STORE_PATH)
+        if settings.INGEST_DISTRIBUTED:
+            self.lease_store = LeaseStore(settings.LEASE_STORE_PATH, settings.INGEST_LEASE_TTL_SECONDS)
+        self.job_runner = JobRunner(
+            self.job_store,
+            self.file_processor,
+            self.embedding_service,
+            self.sync_manifest,
+            workers=settings.INGEST_JOB_WORKERS,
+            stale_after=settings.INGEST_JOB_STALE_SECONDS,
+            build_index=self.build_index,
+            activate_index=self.activate_index,
+            lease_store=self.lease_store
+        )
+
+        # Jobs interrupted by a previous shutdown or crash resume here
+        self.job_runner.start()
+
+        # Backing services may still be starting; requests retry these lazily
+        self._warm_up_steps = {
+            "pdf_parsers": load_parsers,
+            "bucket": self.ensure_bucket,
+            # Only the Chroma store has a remote collection to connect to
+            "vector_store": lambda: getattr(self.embedding_service.vector_store, "collection", None)
+        }
+        if settings.WARM_UP_IN_BACKGROUND or not self.warm_up():
+            threading.Thread(target=self._keep_warming_up, name="warm-up", daemon=True).start()
+        logger.info("Service registry started")
+
+    def warm_up(self) -> bool:
+        """
+        Run the warm-up steps that have not succeeded yet, from one thread at
+        a time. Returns whether all have.
+        """
+        for name, step in list(self._warm_up_steps.items()):
+            started = time.perf_counter()
+            try:
+                step()
+            except Exception as e:
+                logger.warning("Warm-up step %s failed: %s", name, e)
+                continue
+            del self._warm_up_steps[name]
+            logger.info("Warm-up step %s took %.3fs", name, time.perf_counter() - started)
+        if not self._warm_up_steps:
+            self.ready.set()
+        return self.ready.is_set()
+
+    def pending_warm_up(self) -> List[str]:
+        return list(self._warm_up_steps)
+
+    def _keep_warming_up(self) -> None:
+        while not self.warm_up():
+            if self._stopping.wait(settings.WARM_UP_RETRY_SECONDS):
+                return
+        logger.info("Service registry ready")
+
+    @staticmethod
+    def build_index(spec: IndexSpec) -> Tuple[EmbeddingService, SyncManifest]:
+        return EmbeddingServiceFactory.create(spec), SyncManifest(settings.SYNC_MANIFEST_PATH, spec.collection)
+
+    @staticmethod
+    def new_index_spec(chunk_size: int, chunk_overlap: int) -> IndexSpec:
+        """Describe an index to build next to the active one."""
+        return IndexSpec(
+            collection=f"{settings.COLLECTION_NAME}_{time.strftime('%Y%m%d%H%M%S')}",
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap
+        )
+
+    def activate_index(self, spec: IndexSpec, embedding_service: EmbeddingService, manifest: SyncManifest) -> None:
+        """
+        Serve requests and jobs from a fully built index. Other replicas
+        switch to it when they restart.
+        """
+        self.index_catalog.activate(settings.COLLECTION_NAME, spec)
+        retired = self.index
+        self.index = self._open_index(spec, embedding_service, manifest)
+        self.job_runner.use_index(embedding_service, manifest)
+        logger.info("Switched index %s to collection %s", settings.COLLECTION_NAME, spec.collection)
+
+        if self._retired is not None:
+            self._close_index(self._retired)
+        self._retired = retired
+
+        # Pages of object versions the new index doesn't hold won't be read again
+        if self.page_store is not None:
+            try:
+                self.page_store.prune(
+                    version_key({"ETag": etag, "Size": size}) for etag, size in manifest.versions().values()
+                )
+            except Exception as e:
+                logger.warning("Could not prune the page store: %s", e)
+
+    def ensure_bucket(self) -> None:
+        if not self.bucket_ready:
+            ensure_bucket(self.s3_client, settings.MINIO_BUCKET)
+            self.bucket_ready = True
+
+    def close(self) -> None:
+        self._stopping.set()
+        # Workers finish their current file before the services they use close
+        if self.job_runner is not None:
+            self.job_runner.stop()
+
+        for index in (self.index, self._retired):
+            if index is not None:
+                self._close_index(index)
+        for component in (self.job_store, self.lease_store, self.file_processor, self.page_store, self.index_catalog):
+            self._close(component)
+        logger.info("Service registry closed")
+
+    @staticmethod
+    def _open_index(spec: IndexSpec, embedding_service: EmbeddingService, manifest: SyncManifest) -> ActiveIndex:
+        # Query embeddings bypass the on-disk cache, which is meant for chunks
+        provider = embedding_service.embedding_provider
+        search_service = SearchService(
+            getattr(provider, "embedding_provider", provider),
+            embedding_service.vector_store,
+            lexical_index=embedding_service.lexical_index,
+            query_cache_size=settings.SEARCH_QUERY_CACHE_SIZE,
+            result_cache_size=settings.SEARCH_RESULT_CACHE_SIZE,
+            result_ttl=settings.SEARCH_RESULT_TTL_SECONDS,
+            rrf_k=settings.SEARCH_HYBRID_RRF_K,
+            candidates=settings.SEARCH_HYBRID_CANDIDATES
+        )
+        return ActiveIndex(spec, embedding_service, manifest, search_service)
+
+    def _close_index(self, index: ActiveIndex) -> None:
+        for component in (index.search_service, index.embedding_service, index.sync_manifest):
+            self._close(component)
+
+    @staticmethod
+    def _close(component) -> None:
+        if component is None or not hasattr(component, "close"):
+            return
+        try:
+            component.close()
+        except Exception as e:
+            logger.warning("Error closing %s: %s", type(component).__name__, e)
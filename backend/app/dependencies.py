@@ -1,13 +1,54 @@
 """Contains dependencies"""
 
+from typing import Optional
+
+from fastapi import Request
+
+from backend.app.core.registry import ActiveIndex, ServiceRegistry
 from backend.app.services.embeddings.file_processor import FileProcessor
 from backend.app.services.embeddings.embedding_service import EmbeddingService
-from backend.app.services.embeddings.factory import EmbeddingServiceFactory
+from backend.app.services.embeddings.sync_manifest import SyncManifest
+from backend.app.services.jobs.job_runner import JobRunner
+from backend.app.services.jobs.job_store import JobStore
+from backend.app.services.jobs.lease_store import LeaseStore
+from backend.app.services.search.search_service import SearchService
+
+
+def get_registry(request: Request) -> ServiceRegistry:
+    return request.app.state.registry
+
+
+def get_index(request: Request) -> ActiveIndex:
+    """The active index, read once per request so a switch can't mix two indexes."""
+    index = getattr(request.state, "index", None)
+    if index is None:
+        index = request.state.index = get_registry(request).index
+    return index
+
+
+def get_file_processor(request: Request) -> FileProcessor:
+    return get_registry(request).file_processor
+
+
+def get_embedding_service(request: Request) -> EmbeddingService:
+    return get_index(request).embedding_service
+
+
+def get_sync_manifest(request: Request) -> SyncManifest:
+    return get_index(request).sync_manifest
+
+
+def get_job_runner(request: Request) -> JobRunner:
+    return get_registry(request).job_runner
+
+
+def get_job_store(request: Request) -> JobStore:
+    return get_registry(request).job_store
 
 
-def get_file_processor() -> FileProcessor:
-    return FileProcessor()
+def get_lease_store(request: Request) -> Optional[LeaseStore]:
+    return get_registry(request).lease_store
 
 
-def get_embedding_service() -> EmbeddingService:
-    return EmbeddingServiceFactory.create()
+def get_search_service(request: Request) -> SearchService:
+    return get_index(request).search_service
@@ -1,7 +1,9 @@
 """Contains protocols"""
 
-from typing import List, Dict, Any, Protocol
+from concurrent.futures import Future
+from typing import List, Dict, Any, BinaryIO, Iterable, Iterator, Optional, Protocol, Tuple
 
+import numpy as np
 from pydantic import BaseModel, Field, ConfigDict
 
 
@@ -11,24 +13,93 @@ class DocumentChunk(BaseModel):
     content: str
     metadata: Dict[str, Any] = Field(default_factory=dict)
     id: str
+    token_count: Optional[int] = None
+
+
+class SearchResult(BaseModel):
+    id: str
+    content: str
+    metadata: Dict[str, Any] = Field(default_factory=dict)
+    # Higher is more similar
+    score: float
 
 
 class TokenizerProtocol(Protocol):
     def count_tokens(self, text: str) -> int: ...
 
+    def token_offsets(self, text: str) -> List[Tuple[int, int]]: ...
+
+    def token_offsets_batch(self, texts: List[str]) -> List[List[Tuple[int, int]]]: ...
+
 
 class EmbeddingProviderProtocol(Protocol):
-    def get_embeddings(self, texts: List[str]) -> List[List[float]]: ...
+    def get_embeddings(self, texts: List[str]) -> np.ndarray: ...
+
+
+class AsyncEmbeddingProviderProtocol(EmbeddingProviderProtocol, Protocol):
+    async def aget_embeddings(self, texts: List[str]) -> np.ndarray: ...
+
+    def submit_embeddings(self, texts: List[str]) -> "Future[np.ndarray]": ...
 
 
 class VectorStoreProtocol(Protocol):
     def add_documents(self,
                       chunks: List[DocumentChunk],
-                      embeddings: List[List[float]]) -> None: ...
+                      embeddings: np.ndarray) -> None: ...
+
+    def delete_by_source(self, source: str) -> None: ...
+
+    def delete_by_sources(self, sources: List[str]) -> None: ...
+
+    def delete_ids(self, ids: List[str]) -> None: ...
+
+    def search(self,
+               query_embedding: np.ndarray,
+               top_k: int = 5,
+               where: Optional[Dict[str, Any]] = None) -> List[SearchResult]: ...
+
+    def similarity(self, embeddings: np.ndarray, queries: np.ndarray) -> np.ndarray: ...
+
+    def get_documents(self,
+                      ids: List[str],
+                      where: Optional[Dict[str, Any]] = None) -> List[SearchResult]: ...
+
+    def get_embeddings(self, ids: List[str]) -> Dict[str, np.ndarray]: ...
 
 
 class DocumentLoaderProtocol(Protocol):
     def load_and_split(self,
                        file_path: str,
                        chunk_size: int,
-                       chunk_overlap: int) -> List[DocumentChunk]: ...
+                       chunk_overlap: int,
+                       source: Optional[str] = None) -> List[DocumentChunk]: ...
+
+    def lazy_load_and_split(self,
+                            file_path: str,
+                            chunk_size: int,
+                            chunk_overlap: int,
+                            source: Optional[str] = None) -> Iterator[DocumentChunk]: ...
+
+    def split_pages(self,
+                    pages: Iterable[Tuple[str, Dict[str, Any]]],
+                    chunk_size: int,
+                    chunk_overlap: int,
+                    source: Optional[str] = None) -> List[DocumentChunk]: ...
+
+    def lazy_split_pages(self,
+                         pages: Iterable[Tuple[str, Dict[str, Any]]],
+                         chunk_size: int,
+                         chunk_overlap: int,
+                         source: Optional[str] = None) -> Iterator[DocumentChunk]: ...
+
+    def load_and_split_stream(self,
+                              stream: BinaryIO,
+                              source: str,
+                              chunk_size: int,
+                              chunk_overlap: int) -> List[DocumentChunk]: ...
+
+    def lazy_load_and_split_stream(self,
+                                   stream: BinaryIO,
+                                   source: str,
+                                   chunk_size: int,
+                                   chunk_overlap: int) -> Iterator[DocumentChunk]: ...
@@ -1,18 +1,78 @@
 # backend/app/main.py
-from fastapi import FastAPI
+import time
+import logging
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from backend.app.routers.files import router as files_router
 from backend.app.routers.embed import router as embed_router
+from backend.app.routers.search import router as search_router
+from backend.app.routers.metrics import router as metrics_router
+from backend.app.routers.health import router as health_router
+from backend.app.core.config import settings
+from backend.app.core.registry import ServiceRegistry
+from backend.app.services.file_service import reject_oversized_upload
+from backend.app.utils import metrics
 from backend.app.utils.logger import setup_logging
 
 
 # Set up logging
 setup_logging()
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    registry = ServiceRegistry()
+    registry.start()
+    app.state.registry = registry
+    try:
+        yield
+    finally:
+        registry.close()
 
-app = FastAPI(title="RAG Ingestion Microservice")
+
+app = FastAPI(title="RAG Ingestion Microservice", lifespan=lifespan)
 
 app.include_router(files_router)
 app.include_router(embed_router)
+app.include_router(search_router)
+app.include_router(metrics_router)
+app.include_router(health_router)
+
+
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    """Refuse oversized uploads before their body is received and spooled."""
+    if request.method == "POST" and request.url.path.rstrip("/") == "/files":
+        error = reject_oversized_upload(request.headers.get("content-length"))
+        if error is not None:
+            return JSONResponse(status_code=error.status_code, content={"detail": error.detail})
+    return await call_next(request)
+
+
+if settings.METRICS_PROFILE_REQUESTS:
+    @app.middleware("http")
+    async def profile_stages(request: Request, call_next):
+        """Record where each request spent its time, stage by stage."""
+        profile, token = metrics.start_profile()
+        try:
+            response = await call_next(request)
+        finally:
+            metrics.stop_profile(token)
+        logger.info(
+            "%s %s took %.3fs: %s",
+            request.method,
+            request.url.path,
+            time.perf_counter() - profile.started,
+            profile.summary()
+        )
+        if profile.stages:
+            response.headers["Server-Timing"] = profile.server_timing()
+        return response
+
 
 @app.get("/")
 def read_root():
-    return {"message": "RAG Ingestion Service is running", "endpoints": ["/files", "/embed"]}
\ No newline at end of file
+    return {"message": "RAG Ingestion Service is running", "endpoints": ["/files", "/embed", "/search", "/metrics", "/ready"]}
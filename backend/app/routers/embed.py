@@ -2,15 +2,32 @@
 
 import logging
 import os
-from typing import Dict, Any
+import time
+from typing import Dict, Any, Optional
 
 from fastapi import APIRouter, Depends, HTTPException
 
 from backend.app.core.config import settings
-from backend.app.dependencies import get_file_processor, get_embedding_service
+from backend.app.core.registry import ActiveIndex, ServiceRegistry
+from backend.app.dependencies import (
+    get_file_processor,
+    get_index,
+    get_registry,
+    get_embedding_service,
+    get_sync_manifest,
+    get_job_runner,
+    get_job_store,
+    get_lease_store
+)
 from backend.app.services.embeddings.file_processor import FileProcessor
 from backend.app.services.embeddings.embedding_service import EmbeddingService
+from backend.app.services.embeddings.sync_manifest import SyncManifest
+from backend.app.services.jobs.job_runner import JobRunner
+from backend.app.services.jobs.job_store import JobStore, DONE, FAILED
+from backend.app.services.jobs.lease_store import LeaseStore
 from backend.app.schemas.embedding_schema import EmbedResponse
+from backend.app.schemas.index_schema import IndexSpec, ReindexRequest
+from backend.app.schemas.job_schema import EmbedJobRequest, EmbedJobStatus, EmbedJobSubmitted
 
 
 logger = logging.getLogger(__name__)
@@ -20,14 +37,24 @@ router = APIRouter(prefix="/embed", tags=["embed"])
 @router.post("/", response_model=EmbedResponse)
 def embed_documents(
     file_processor: FileProcessor = Depends(get_file_processor),
-    embedding_service: EmbeddingService = Depends(get_embedding_service)
+    embedding_service: EmbeddingService = Depends(get_embedding_service),
+    manifest: SyncManifest = Depends(get_sync_manifest),
+    lease_store: Optional[LeaseStore] = Depends(get_lease_store),
+    prefix: str = "",
+    start_after: Optional[str] = None
 ) -> EmbedResponse:
     """
-    Process all PDF files in the upload directory and create embeddings.
-    
+    Sync embeddings with the PDF files in the bucket.
+
+    New and modified files are embedded, unchanged files are skipped and
+    embeddings of files deleted from the bucket are removed.
     Returns a summary of processed and failed files.
+
+    In distributed mode replicas share the work of a sync through leases,
+    and the summary covers the files this replica processed. ``prefix``
+    and ``start_after`` limit the sync to part of the bucket.
     """
-    return file_processor.process_files(embedding_service)
+    return file_processor.process_files(embedding_service, manifest, lease_store, prefix, start_after)
 
 
 @router.post("/file/{filename}", response_model=Dict[str, Any])
@@ -59,4 +86,98 @@ def embed_specific_file(
         raise HTTPException(
             status_code=500, 
             detail=f"Failed to process {filename}: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+
+@router.post("/jobs", response_model=EmbedJobSubmitted, status_code=202)
+def submit_embed_job(
+    request: Optional[EmbedJobRequest] = None,
+    job_runner: JobRunner = Depends(get_job_runner)
+) -> EmbedJobSubmitted:
+    """
+    Queue an ingestion job and return its ID without waiting for it.
+
+    Without a body the job syncs the whole bucket like ``POST /embed``;
+    otherwise it embeds the listed object keys.
+    """
+    files = request.files if request is not None else None
+    if files is not None:
+        if not files:
+            raise HTTPException(status_code=400, detail="No files to embed")
+        unsupported = [filename for filename in files if not filename.endswith(".pdf")]
+        if unsupported:
+            raise HTTPException(status_code=400, detail=f"Only PDF files are supported: {unsupported}")
+
+    job_id = job_runner.submit(files)
+    return EmbedJobSubmitted(job_id=job_id, status="queued")
+
+
+@router.post("/reindex", response_model=EmbedJobSubmitted, status_code=202)
+def submit_reindex_job(
+    request: Optional[ReindexRequest] = None,
+    registry: ServiceRegistry = Depends(get_registry),
+    index: ActiveIndex = Depends(get_index)
+) -> EmbedJobSubmitted:
+    """
+    Queue a rebuild of the bucket into a new collection and return the job ID.
+
+    Chunks are made from the stored page text of each object, so PDFs are
+    only downloaded and parsed when their text is not stored yet. Requests
+    keep using the active index until every file was ingested, then switch
+    to the new one. Chunking defaults to the active index's.
+    """
+    request = request or ReindexRequest()
+    chunk_size = request.chunk_size if request.chunk_size is not None else index.spec.chunk_size
+    chunk_overlap = request.chunk_overlap if request.chunk_overlap is not None else index.spec.chunk_overlap
+    if chunk_overlap >= chunk_size:
+        raise HTTPException(status_code=400, detail="chunk_size must be greater than chunk_overlap")
+
+    job_id = registry.job_runner.submit_reindex(registry.new_index_spec(chunk_size, chunk_overlap))
+    return EmbedJobSubmitted(job_id=job_id, status="queued")
+
+
+@router.get("/index", response_model=IndexSpec)
+def get_active_index(index: ActiveIndex = Depends(get_index)) -> IndexSpec:
+    """The collection and chunking of the index serving requests."""
+    return index.spec
+
+
+@router.get("/jobs/{job_id}", response_model=EmbedJobStatus)
+def get_embed_job(
+    job_id: str,
+    job_store: JobStore = Depends(get_job_store)
+) -> EmbedJobStatus:
+    """
+    Report the progress of an ingestion job: per-file status and chunk
+    counts, throughput and errors.
+    """
+    job = job_store.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+
+    files = job["files"]
+    done = [f for f in files if f["status"] == DONE]
+    chunks = sum(f["chunks"] for f in done)
+    elapsed = 0.0
+    if job["started_at"] is not None:
+        elapsed = (job["finished_at"] or time.time()) - job["started_at"]
+
+    return EmbedJobStatus(
+        job_id=job_id,
+        kind=job["kind"],
+        status=job["status"],
+        error=job["error"],
+        created_at=job["created_at"],
+        started_at=job["started_at"],
+        finished_at=job["finished_at"],
+        files_total=len(files),
+        files_done=len(done),
+        files_failed=sum(1 for f in files if f["status"] == FAILED),
+        skipped=job["skipped"],
+        removed=job["removed"],
+        chunks=chunks,
+        chunks_per_second=chunks / elapsed if elapsed > 0 else 0.0,
+        files_per_second=len(done) / elapsed if elapsed > 0 else 0.0,
+        failed=[{f["filename"]: f["error"]} for f in files if f["status"] == FAILED],
+        files=files
+    )
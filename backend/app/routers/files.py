@@ -1,13 +1,25 @@
 """Contains endpoints to upload & delete file"""
 
 import logging
+from typing import Optional
 
 from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Path
+from starlette.concurrency import run_in_threadpool
 
 from backend.app.services.file_service import save_uploaded_file
+from backend.app.schemas.file_schema import UploadResponse, BulkDeleteRequest, BulkDeleteResponse
 from backend.app.services.embeddings.file_processor import FileProcessor
 from backend.app.services.embeddings.embedding_service import EmbeddingService
-from backend.app.dependencies import get_file_processor, get_embedding_service
+from backend.app.services.embeddings.sync_manifest import SyncManifest
+from backend.app.services.jobs.lease_store import LeaseStore
+from backend.app.core.registry import ServiceRegistry
+from backend.app.dependencies import (
+    get_file_processor,
+    get_embedding_service,
+    get_lease_store,
+    get_registry,
+    get_sync_manifest
+)
 
 logger = logging.getLogger(__name__)
 
@@ -15,23 +27,54 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/files", tags=["upload"])
 
 
-@router.post("/", summary="Upload a PDF file")
-async def upload_file(file: UploadFile = File(...)):
+@router.post("/", summary="Upload a PDF file", response_model=UploadResponse)
+async def upload_file(
+    file: UploadFile = File(...),
+    registry: ServiceRegistry = Depends(get_registry)
+):
     if not file.filename.endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files are allowed")
 
     try:
-        file_path = await save_uploaded_file(file)
-        return {"filename": file.filename, "location": file_path}
+        await run_in_threadpool(registry.ensure_bucket)
+        return await save_uploaded_file(file, registry.s3_client)
+    except HTTPException as he:
+        raise he
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"File upload failed: {str(e)}")
 
 
+@router.delete("/", summary="Delete many files and their embeddings", response_model=BulkDeleteResponse)
+def delete_files(
+    request: BulkDeleteRequest,
+    file_processor: FileProcessor = Depends(get_file_processor),
+    embedding_service: EmbeddingService = Depends(get_embedding_service),
+    manifest: SyncManifest = Depends(get_sync_manifest),
+    lease_store: Optional[LeaseStore] = Depends(get_lease_store)
+) -> BulkDeleteResponse:
+    """
+    Deletes the listed files, or every PDF under a prefix, from storage
+    together with their embeddings, in batched and concurrent calls.
+    """
+    if (request.filenames is None) == (request.prefix is None):
+        raise HTTPException(status_code=400, detail="Provide either filenames or a prefix")
+
+    if request.prefix is not None:
+        return file_processor.delete_prefix(request.prefix, embedding_service, manifest, lease_store)
+
+    unsupported = [filename for filename in request.filenames if not filename.endswith(".pdf")]
+    if unsupported:
+        raise HTTPException(status_code=400, detail=f"Only PDF files can be deleted: {unsupported}")
+    return file_processor.delete_files(request.filenames, embedding_service, manifest, lease_store)
+
+
 @router.delete("/{filename}", summary="Delete a file and its embeddings")
 async def delete_file(
     filename: str = Path(..., description="Name of the file to delete (e.g., 'report.pdf')"),
     file_processor: FileProcessor = Depends(get_file_processor),
-    embedding_service: EmbeddingService = Depends(get_embedding_service)
+    embedding_service: EmbeddingService = Depends(get_embedding_service),
+    manifest: SyncManifest = Depends(get_sync_manifest),
+    lease_store: Optional[LeaseStore] = Depends(get_lease_store)
 ):
     """
     Deletes a file from storage and removes all associated embeddings.
@@ -39,7 +82,7 @@ async def delete_file(
     if not filename.endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files can be deleted")
     try:
-        success = file_processor.delete_file(filename, embedding_service)
+        success = file_processor.delete_file(filename, embedding_service, manifest, lease_store)
 
         if not success:
             raise HTTPException(status_code=500, detail="Deletion failed unexpectedly")
@@ -0,0 +1,22 @@
+# backend/app/routers/health.py
+
+from typing import Dict
+
+from fastapi import APIRouter, Depends, HTTPException
+
+from backend.app.core.registry import ServiceRegistry
+from backend.app.dependencies import get_registry
+
+
+router = APIRouter(tags=["health"])
+
+
+@router.get("/ready")
+def get_readiness(registry: ServiceRegistry = Depends(get_registry)) -> Dict[str, str]:
+    """
+    Whether the service finished warming up: PDF parsers imported and the
+    bucket and vector store reached. Answers 503 until then.
+    """
+    if not registry.ready.is_set():
+        raise HTTPException(status_code=503, detail=f"Warming up: {', '.join(registry.pending_warm_up())}")
+    return {"status": "ready"}
@@ -0,0 +1,20 @@
+# backend/app/routers/metrics.py
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from backend.app.utils import metrics
+
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics() -> PlainTextResponse:
+    """
+    Per-stage latency histograms, call, item, byte and retry counts and
+    peak memory in the Prometheus text format.
+    """
+    if not metrics.is_enabled():
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
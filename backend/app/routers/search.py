@@ -0,0 +1,50 @@
+# backend/app/routers/search.py
+
+import logging
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from backend.app.core.config import settings
+from backend.app.dependencies import get_search_service
+from backend.app.services.search.search_service import SearchService
+from backend.app.schemas.search_schema import SearchRequest, SearchResponse
+
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/search", tags=["search"])
+
+
+@router.post("/", response_model=SearchResponse)
+async def search(
+    request: SearchRequest,
+    search_service: SearchService = Depends(get_search_service)
+) -> SearchResponse:
+    """
+    Return the ``k`` chunks most similar to the query.
+
+    Cached results are answered on the event loop; misses embed the query
+    and search the vector store in the thread pool. ``mode`` selects vector,
+    keyword (BM25) or hybrid retrieval.
+    """
+    if request.k > settings.SEARCH_MAX_K:
+        raise HTTPException(status_code=400, detail=f"k must be at most {settings.SEARCH_MAX_K}")
+
+    results = search_service.cached_search(request.query, request.k, request.filter, request.mode)
+    if results is not None:
+        return SearchResponse(query=request.query, results=results, mode=request.mode, cached=True)
+
+    try:
+        results = await run_in_threadpool(
+            search_service.search,
+            request.query,
+            request.k,
+            request.filter,
+            request.mode
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error("Search failed: %s", e)
+        raise HTTPException(status_code=502, detail=f"Search failed: {e}")
+    return SearchResponse(query=request.query, results=results, mode=request.mode)
@@ -8,3 +8,7 @@ class EmbedResponse(BaseModel):
     processed: List[str]
     failed: List[Dict[str, str]]
     message: str
+    added: int = 0
+    updated: int = 0
+    skipped: int = 0
+    removed: int = 0
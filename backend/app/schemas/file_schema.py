@@ -0,0 +1,25 @@
+"""Contains schema for files"""
+
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
+
+
+class UploadResponse(BaseModel):
+    filename: str
+    location: str
+    size: int
+    sha256: str
+    deduplicated: bool = False
+
+
+class BulkDeleteRequest(BaseModel):
+    # Either the files to delete or a key prefix selecting them
+    filenames: Optional[List[str]] = None
+    prefix: Optional[str] = None
+
+
+class BulkDeleteResponse(BaseModel):
+    deleted: List[str]
+    failed: List[Dict[str, str]]
+    message: str
@@ -0,0 +1,24 @@
+"""Contains schema for indexes"""
+
+from typing import Optional
+
+from pydantic import BaseModel, Field, model_validator
+
+
+class IndexSpec(BaseModel):
+    # Vector store collection holding the index
+    collection: str
+    chunk_size: int
+    chunk_overlap: int
+
+
+class ReindexRequest(BaseModel):
+    # Chunking of the new index; the active index's when omitted
+    chunk_size: Optional[int] = Field(default=None, ge=1)
+    chunk_overlap: Optional[int] = Field(default=None, ge=0)
+
+    @model_validator(mode="after")
+    def check_overlap(self) -> "ReindexRequest":
+        if self.chunk_size is not None and self.chunk_overlap is not None and self.chunk_size <= self.chunk_overlap:
+            raise ValueError("chunk_size must be greater than chunk_overlap")
+        return self
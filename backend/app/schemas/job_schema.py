@@ -0,0 +1,44 @@
+"""Contains schema for ingestion jobs"""
+
+from typing import List, Dict, Optional
+
+from pydantic import BaseModel
+
+
+class EmbedJobRequest(BaseModel):
+    # Object keys to embed; the whole bucket is synced when omitted
+    files: Optional[List[str]] = None
+
+
+class EmbedJobSubmitted(BaseModel):
+    job_id: str
+    status: str
+
+
+class JobFileStatus(BaseModel):
+    filename: str
+    status: str
+    chunks: int = 0
+    error: Optional[str] = None
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+
+class EmbedJobStatus(BaseModel):
+    job_id: str
+    kind: str
+    status: str
+    error: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    files_total: int = 0
+    files_done: int = 0
+    files_failed: int = 0
+    skipped: int = 0
+    removed: int = 0
+    chunks: int = 0
+    chunks_per_second: float = 0.0
+    files_per_second: float = 0.0
+    failed: List[Dict[str, str]] = []
+    files: List[JobFileStatus] = []
@@ -0,0 +1,23 @@
+"""Contains schema for search"""
+
+from typing import Any, Dict, List, Literal, Optional
+
+from pydantic import BaseModel, Field
+
+from backend.app.domain.protocols import SearchResult
+
+
+class SearchRequest(BaseModel):
+    query: str = Field(min_length=1)
+    k: int = Field(default=5, ge=1)
+    # Metadata filter in the vector store's where syntax, e.g. {"source": "a.pdf"}
+    filter: Optional[Dict[str, Any]] = None
+    # "lexical" matches keywords with BM25, "hybrid" fuses both rankings
+    mode: Literal["vector", "lexical", "hybrid"] = "vector"
+
+
+class SearchResponse(BaseModel):
+    query: str
+    results: List[SearchResult]
+    mode: str = "vector"
+    cached: bool = False
@@ -0,0 +1,101 @@
+"""Contains token-budget batching of embedding requests"""
+
+import logging
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from backend.app.domain.protocols import DocumentChunk
+
+logger = logging.getLogger(__name__)
+
+# Statuses TEI answers with when a request is too large or it is overloaded
+OVERLOAD_STATUS_CODES = {413, 429}
+
+
+class TokenBudgetBatcher:
+    """
+    Packs chunks into embedding batches of at most ``max_count`` chunks and
+    a token budget, using the token counts computed by the splitter.
+
+    The budget adapts to TEI: it is halved on 413/429 responses, shrunk when
+    batches take longer than ``target_latency`` seconds and grown again
+    while full batches come back quickly.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = 4096,
+        max_count: int = 32,
+        min_tokens: int = 256,
+        target_latency: float = 2.0,
+        increase_step: int = 256
+    ):
+        self.max_tokens = max_tokens
+        self.max_count = max_count
+        self.min_tokens = min(min_tokens, max_tokens)
+        self.target_latency = target_latency
+        self.increase_step = increase_step
+        self.budget = max_tokens
+        self._lock = threading.Lock()
+        self.batches_sent = 0
+        self.overloads = 0
+        self._fill_total = 0.0
+
+    def pack(self, chunks: Iterable[DocumentChunk]) -> Iterator[List[DocumentChunk]]:
+        """Group chunks into batches that fit the current budget."""
+        batch: List[DocumentChunk] = []
+        tokens = 0
+        for chunk in chunks:
+            chunk_tokens = chunk_token_count(chunk)
+            if batch and (len(batch) >= self.max_count or tokens + chunk_tokens > self.budget):
+                yield batch
+                batch, tokens = [], 0
+            batch.append(chunk)
+            tokens += chunk_tokens
+        if batch:
+            yield batch
+
+    def record_success(self, batch: List[DocumentChunk], latency: float) -> None:
+        tokens = sum(chunk_token_count(chunk) for chunk in batch)
+        with self._lock:
+            self.batches_sent += 1
+            self._fill_total += min(tokens / self.budget, 1.0)
+
+            if latency > self.target_latency:
+                self.budget = max(self.min_tokens, int(self.budget * 0.8))
+            elif tokens >= 0.9 * self.budget or len(batch) >= self.max_count:
+                self.budget = min(self.max_tokens, self.budget + self.increase_step)
+
+    def record_overload(self) -> None:
+        with self._lock:
+            self.overloads += 1
+            self.budget = max(self.min_tokens, self.budget // 2)
+            logger.warning("Embedding server overloaded, token budget lowered to %d", self.budget)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "batches_sent": self.batches_sent,
+                "avg_fill": self._fill_total / self.batches_sent if self.batches_sent else 0.0,
+                "token_budget": self.budget,
+                "overloads": self.overloads
+            }
+
+
+def chunk_token_count(chunk: DocumentChunk) -> int:
+    if chunk.token_count is not None:
+        return chunk.token_count
+    return len(chunk.content) // 4 + 1  # ~4 chars per token
+
+
+def is_overload_error(error: BaseException) -> bool:
+    return error_status_code(error) in OVERLOAD_STATUS_CODES
+
+
+def error_status_code(error: BaseException) -> Optional[int]:
+    """HTTP status of a requests/httpx error, looking through tenacity's RetryError."""
+    last_attempt = getattr(error, "last_attempt", None)
+    if last_attempt is not None and last_attempt.exception() is not None:
+        error = last_attempt.exception()
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None)
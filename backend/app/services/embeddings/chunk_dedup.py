@@ -0,0 +1,441 @@
+"""Contains corpus-wide chunk deduplication"""
+
+import re
+import zlib
+import sqlite3
+import logging
+import threading
+import unicodedata
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+import numpy as np
+
+from backend.app.domain.protocols import DocumentChunk
+from backend.app.utils import metrics
+from backend.app.utils.identifiers import generate_deterministic_id
+
+logger = logging.getLogger(__name__)
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+def normalize_content(text: str) -> str:
+    """Unicode-normalized text with runs of whitespace collapsed, as compared for duplicates."""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+class Fingerprint(NamedTuple):
+    # Hash of the normalized content
+    key: str
+    # MinHash signature, None when near-duplicates are not matched or the text is too short
+    signature: Optional[np.ndarray]
+
+
+class MinHasher:
+    """
+    MinHash signatures of word shingles, split into LSH bands: texts whose
+    shingle sets have Jaccard similarity s share a band with probability
+    1 - (1 - s^rows)^bands.
+    """
+
+    def __init__(self, num_perm: int = 128, bands: int = 16, shingle_size: int = 3, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        # Multiply-shift hash functions; odd multipliers, arithmetic wraps modulo 2^64
+        self._a = rng.integers(0, 1 << 63, size=(num_perm, 1), dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._b = rng.integers(0, 1 << 63, size=(num_perm, 1), dtype=np.uint64)
+        self._mix = rng.integers(0, 1 << 63, size=shingle_size, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._band_mix = rng.integers(0, 1 << 63, size=self.rows, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        words = _WORD_PATTERN.findall(text.lower())
+        if len(words) < 2 * self.shingle_size:
+            # Too few shingles for the estimate to mean much
+            return None
+        word_hashes = np.fromiter(map(zlib.crc32, map(str.encode, words)), dtype=np.uint64, count=len(words))
+        # Each shingle's hash mixes the hashes of its words
+        count = len(words) - self.shingle_size + 1
+        shingles = np.zeros(count, dtype=np.uint64)
+        for offset in range(self.shingle_size):
+            shingles += word_hashes[offset:offset + count] * self._mix[offset]
+        shingles = np.unique(shingles >> np.uint64(32))
+        return ((self._a * shingles + self._b) >> np.uint64(32)).min(axis=1).astype(np.uint32)
+
+    def buckets(self, signature: np.ndarray) -> List[Tuple[int, int]]:
+        """(band, bucket) pairs, where near-duplicates are likely to collide."""
+        rows = signature.reshape(self.bands, self.rows).astype(np.uint64)
+        # Shifted to fit SQLite's signed 64-bit integers
+        hashes = (rows * self._band_mix).sum(axis=1, dtype=np.uint64) >> np.uint64(1)
+        return list(enumerate(hashes.tolist()))
+
+    @staticmethod
+    def similarity(a: np.ndarray, b: np.ndarray) -> float:
+        """Estimated Jaccard similarity of the shingle sets."""
+        return float(np.count_nonzero(a == b)) / len(a)
+
+
+class ChunkDeduplicator:
+    """
+    Records, per collection, one stored chunk for each distinct normalized
+    content, the source owning it (whose name is in its metadata) and every
+    source whose documents contain that content, so duplicates reuse the
+    stored chunk and its vector instead of being embedded again.
+
+    A stored chunk is deleted once no source references it. When its owner
+    goes but other sources still reference it, it passes to the source
+    that referenced it first. With ``near_duplicates``, chunks whose MinHash
+    similarity to a stored chunk reaches ``threshold`` reuse it too.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        collection_name: str,
+        near_duplicates: bool = False,
+        threshold: float = 0.9,
+        minhasher: Optional[MinHasher] = None
+    ):
+        self.path = path
+        self.collection_name = collection_name
+        self.near_duplicates = near_duplicates
+        self.threshold = threshold
+        self.minhasher = minhasher or MinHasher()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                collection TEXT NOT NULL,
+                content_key TEXT NOT NULL,
+                chunk_id TEXT NOT NULL,
+                owner TEXT NOT NULL,
+                signature BLOB,
+                PRIMARY KEY (collection, content_key)
+            );
+            CREATE INDEX IF NOT EXISTS idx_chunks_id ON chunks(collection, chunk_id);
+            CREATE INDEX IF NOT EXISTS idx_chunks_owner ON chunks(collection, owner);
+            CREATE TABLE IF NOT EXISTS refs (
+                collection TEXT NOT NULL,
+                chunk_id TEXT NOT NULL,
+                source TEXT NOT NULL,
+                PRIMARY KEY (collection, chunk_id, source)
+            );
+            CREATE INDEX IF NOT EXISTS idx_refs_source ON refs(collection, source);
+            CREATE TABLE IF NOT EXISTS bands (
+                collection TEXT NOT NULL,
+                band INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                chunk_id TEXT NOT NULL,
+                PRIMARY KEY (collection, bucket, band, chunk_id)
+            );
+            """
+        )
+        self._conn.commit()
+
+    def fingerprint(self, content: str) -> Fingerprint:
+        normalized = normalize_content(content)
+        signature = self.minhasher.signature(normalized) if self.near_duplicates else None
+        return Fingerprint(generate_deterministic_id(normalized, {}), signature)
+
+    def session(self) -> "DedupSession":
+        return DedupSession(self)
+
+    def find(self, fingerprint: Fingerprint) -> Optional[str]:
+        """ID of the stored chunk with the fingerprinted content, or near to it; None if there is none."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT chunk_id FROM chunks WHERE collection = ? AND content_key = ?",
+                (self.collection_name, fingerprint.key)
+            ).fetchone()
+            return row[0] if row is not None else self._find_near_duplicate(fingerprint.signature)
+
+    def reference(self, source: str, ids: Iterable[str]) -> List[str]:
+        """
+        Record that ``source`` references the stored chunks ``ids``. Returns
+        those no longer registered, deleted since they were found.
+        """
+        missing = []
+        with self._lock:
+            for chunk_id in dict.fromkeys(ids):
+                registered = self._conn.execute(
+                    "SELECT 1 FROM chunks WHERE collection = ? AND chunk_id = ?",
+                    (self.collection_name, chunk_id)
+                ).fetchone()
+                if registered is None:
+                    missing.append(chunk_id)
+                    continue
+                self._conn.execute("INSERT OR IGNORE INTO refs VALUES (?, ?, ?)", (self.collection_name, chunk_id, source))
+            self._conn.commit()
+        return missing
+
+    def register(self, chunks: Iterable[DocumentChunk], fingerprints: Dict[str, Fingerprint]) -> List[str]:
+        """
+        Record stored chunks as the copies of their content, owned by their
+        source, and return the IDs registered. A chunk whose content another
+        source registered meanwhile stays its source's own.
+        """
+        registered = []
+        with self._lock:
+            for chunk in chunks:
+                fingerprint = fingerprints[chunk.id]
+                source = chunk.metadata.get("source", "")
+                signature = fingerprint.signature
+                inserted = self._conn.execute(
+                    "INSERT OR IGNORE INTO chunks VALUES (?, ?, ?, ?, ?)",
+                    (
+                        self.collection_name,
+                        fingerprint.key,
+                        chunk.id,
+                        source,
+                        signature.tobytes() if signature is not None else None
+                    )
+                ).rowcount
+                if not inserted:
+                    continue
+                registered.append(chunk.id)
+                self._conn.execute("INSERT OR IGNORE INTO refs VALUES (?, ?, ?)", (self.collection_name, chunk.id, source))
+                if signature is not None:
+                    self._conn.executemany(
+                        "INSERT OR IGNORE INTO bands VALUES (?, ?, ?, ?)",
+                        [(self.collection_name, band, bucket, chunk.id) for band, bucket in self.minhasher.buckets(signature)]
+                    )
+            self._conn.commit()
+        return registered
+
+    def successors(self, sources: List[str], ids: Optional[List[str]] = None) -> Dict[str, str]:
+        """
+        The chunks owned by ``sources`` (among ``ids``, if given) that other
+        sources still reference, mapped to the source each passes to when
+        ``release`` drops the references of ``sources``.
+        """
+        releasing = set(sources)
+        successors = {}
+        with self._lock:
+            for chunk_id in self._owned(sources, ids):
+                successor = self._first_reference(chunk_id, releasing)
+                if successor is not None:
+                    successors[chunk_id] = successor
+        return successors
+
+    def release(self, sources: List[str], ids: Optional[List[str]] = None) -> List[str]:
+        """
+        Drop the references of ``sources`` (to ``ids`` only, if given) and
+        return the IDs no source references any more, which can be deleted.
+        IDs that were never registered are returned as they are.
+        """
+        releasing = set(sources)
+        unreferenced = []
+        with self._lock:
+            if ids is None:
+                affected = list(dict.fromkeys(
+                    chunk_id for source in sources for (chunk_id,) in self._conn.execute(
+                        "SELECT chunk_id FROM refs WHERE collection = ? AND source = ?",
+                        (self.collection_name, source)
+                    )
+                ))
+            else:
+                affected = list(dict.fromkeys(ids))
+            self._conn.executemany(
+                "DELETE FROM refs WHERE collection = ? AND chunk_id = ? AND source = ?",
+                [(self.collection_name, chunk_id, source) for chunk_id in affected for source in sources]
+            )
+
+            for chunk_id in affected:
+                row = self._conn.execute(
+                    "SELECT owner FROM chunks WHERE collection = ? AND chunk_id = ?",
+                    (self.collection_name, chunk_id)
+                ).fetchone()
+                if row is None:
+                    unreferenced.append(chunk_id)
+                    continue
+                successor = self._first_reference(chunk_id, releasing)
+                if successor is None:
+                    self._forget(chunk_id)
+                    unreferenced.append(chunk_id)
+                elif row[0] in releasing:
+                    self._conn.execute(
+                        "UPDATE chunks SET owner = ? WHERE collection = ? AND chunk_id = ?",
+                        (successor, self.collection_name, chunk_id)
+                    )
+            self._conn.commit()
+        return unreferenced
+
+    def forget(self, ids: List[str]) -> None:
+        """Drop chunks deleted regardless of their references."""
+        with self._lock:
+            for chunk_id in ids:
+                self._forget(chunk_id)
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            chunks = self._conn.execute(
+                "SELECT COUNT(*) FROM chunks WHERE collection = ?", (self.collection_name,)
+            ).fetchone()[0]
+            references = self._conn.execute(
+                "SELECT COUNT(*) FROM refs WHERE collection = ?", (self.collection_name,)
+            ).fetchone()[0]
+        return {"chunks": chunks, "references": references}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _find_near_duplicate(self, signature: Optional[np.ndarray]) -> Optional[str]:
+        if signature is None:
+            return None
+        buckets = set(self.minhasher.buckets(signature))
+        rows = self._conn.execute(
+            f"SELECT band, bucket, chunk_id FROM bands WHERE collection = ? AND bucket IN ({','.join('?' * len(buckets))})",
+            (self.collection_name, *(bucket for _, bucket in buckets))
+        )
+        candidates: Set[str] = {chunk_id for band, bucket, chunk_id in rows if (band, bucket) in buckets}
+
+        best, best_similarity = None, self.threshold
+        for chunk_id in candidates:
+            row = self._conn.execute(
+                "SELECT signature FROM chunks WHERE collection = ? AND chunk_id = ?",
+                (self.collection_name, chunk_id)
+            ).fetchone()
+            if row is None or row[0] is None:
+                continue
+            similarity = self.minhasher.similarity(signature, np.frombuffer(row[0], dtype=np.uint32))
+            if similarity >= best_similarity:
+                best, best_similarity = chunk_id, similarity
+        return best
+
+    def _owned(self, sources: List[str], ids: Optional[List[str]]) -> Iterator[str]:
+        for source in sources:
+            if ids is None:
+                for (chunk_id,) in self._conn.execute(
+                    "SELECT chunk_id FROM chunks WHERE collection = ? AND owner = ?",
+                    (self.collection_name, source)
+                ):
+                    yield chunk_id
+                continue
+            for chunk_id in ids:
+                if self._conn.execute(
+                    "SELECT 1 FROM chunks WHERE collection = ? AND chunk_id = ? AND owner = ?",
+                    (self.collection_name, chunk_id, source)
+                ).fetchone() is not None:
+                    yield chunk_id
+
+    def _first_reference(self, chunk_id: str, excluded: Set[str]) -> Optional[str]:
+        for (source,) in self._conn.execute(
+            "SELECT source FROM refs WHERE collection = ? AND chunk_id = ? ORDER BY rowid",
+            (self.collection_name, chunk_id)
+        ):
+            if source not in excluded:
+                return source
+        return None
+
+    def _forget(self, chunk_id: str) -> None:
+        for table in ("chunks", "refs", "bands"):
+            self._conn.execute(f"DELETE FROM {table} WHERE collection = ? AND chunk_id = ?", (self.collection_name, chunk_id))
+
+
+class DedupSession:
+    """
+    Deduplicates the chunks of one document against the stored ones and
+    against each other, before they are embedded.
+
+    References to chunks stored by other documents are only recorded by
+    ``commit``, once the document was stored; ``abort`` releases the chunks
+    the session registered when storing it failed.
+    """
+
+    def __init__(self, deduplicator: ChunkDeduplicator):
+        self.deduplicator = deduplicator
+        # IDs of stored chunks reused for duplicates, in order
+        self.reused: List[str] = []
+        self.chunks = 0
+        # Source of the document's chunks
+        self.source: Optional[str] = None
+        # Fingerprints of the chunks passed on, until they are registered
+        self._fingerprints: Dict[str, Fingerprint] = {}
+        # Chunks registered and stored chunks referenced, released if the document fails
+        self._registered: List[str] = []
+        # Duplicates of chunks stored by other documents, by the stored chunk's ID
+        self._found: Dict[str, List[Tuple[DocumentChunk, Fingerprint]]] = {}
+        self._lock = threading.Lock()
+        # Chunks passed on in this session, by content key and LSH bucket
+        self._keys: Dict[str, str] = {}
+        self._buckets: Dict[Tuple[int, int], List[str]] = {}
+        self._signatures: Dict[str, np.ndarray] = {}
+
+    def unique(self, chunks: Iterable[DocumentChunk]) -> Iterator[DocumentChunk]:
+        """The chunks whose content is new; the others are recorded in ``reused``."""
+        for chunk in chunks:
+            self.chunks += 1
+            self.source = chunk.metadata.get("source", "")
+            with metrics.stage("dedup"):
+                fingerprint = self.deduplicator.fingerprint(chunk.content)
+                duplicate = self._keys.get(fingerprint.key) or self._near_duplicate(fingerprint.signature)
+                if duplicate is None:
+                    duplicate = self.deduplicator.find(fingerprint)
+                    if duplicate is not None:
+                        self._found.setdefault(duplicate, []).append((chunk, fingerprint))
+            if duplicate is not None:
+                self.reused.append(duplicate)
+                continue
+
+            self._keys[fingerprint.key] = chunk.id
+            if fingerprint.signature is not None:
+                self._signatures[chunk.id] = fingerprint.signature
+                for bucket in self.deduplicator.minhasher.buckets(fingerprint.signature):
+                    self._buckets.setdefault(bucket, []).append(chunk.id)
+            with self._lock:
+                self._fingerprints[chunk.id] = fingerprint
+            yield chunk
+
+    def stored(self, chunks: List[DocumentChunk]) -> None:
+        """Register chunks once stored; may run in another thread than ``unique``."""
+        with self._lock:
+            fingerprints = {chunk.id: self._fingerprints.pop(chunk.id) for chunk in chunks}
+        registered = self.deduplicator.register(chunks, fingerprints)
+        with self._lock:
+            self._registered.extend(registered)
+
+    def commit(self) -> List[DocumentChunk]:
+        """
+        Record the references to the stored chunks reused, once the document
+        was stored. Returns the duplicates whose stored chunk was deleted
+        meanwhile, one per deleted chunk, which must be stored themselves
+        and passed to ``stored``; ``reused`` then names them instead.
+        """
+        missing = self.deduplicator.reference(self.source, list(self._found)) if self._found else []
+        with self._lock:
+            self._registered.extend(chunk_id for chunk_id in self._found if chunk_id not in missing)
+        replacements = {}
+        for chunk_id in missing:
+            chunk, fingerprint = self._found[chunk_id][0]
+            replacements[chunk_id] = chunk
+            with self._lock:
+                self._fingerprints[chunk.id] = fingerprint
+        self.reused = [replacements[chunk_id].id if chunk_id in replacements else chunk_id for chunk_id in self.reused]
+        self._found.clear()
+        return list(replacements.values())
+
+    def abort(self) -> List[str]:
+        """IDs of the chunks this session registered or referenced, whose references must be released."""
+        self._found.clear()
+        with self._lock:
+            registered, self._registered = self._registered, []
+        return registered
+
+    def _near_duplicate(self, signature: Optional[np.ndarray]) -> Optional[str]:
+        if signature is None:
+            return None
+        minhasher = self.deduplicator.minhasher
+        for bucket in minhasher.buckets(signature):
+            for chunk_id in self._buckets.get(bucket, ()):
+                if minhasher.similarity(signature, self._signatures[chunk_id]) >= self.deduplicator.threshold:
+                    return chunk_id
+        return None
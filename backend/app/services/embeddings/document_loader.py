@@ -1,54 +1,188 @@
 """Loads document"""
 
-from typing import List
-
-from langchain_community.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+import io
+import logging
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
 
+from backend.app.utils import metrics
 from backend.app.utils.identifiers import generate_deterministic_id
+from backend.app.services.embeddings.text_splitter import TokenOffsetTextSplitter
 from backend.app.domain.protocols import (
     DocumentChunk,
     DocumentLoaderProtocol,
     TokenizerProtocol
 )
 
+logger = logging.getLogger(__name__)
+
+Page = Tuple[str, Dict[str, Any]]
+
+
+def load_parsers() -> None:
+    """
+    Import the PDF parsers, which take a large share of startup time and
+    are otherwise imported when the first PDF is parsed.
+    """
+    import pypdf
+    import langchain_community.document_loaders
+
+
+def iter_pdf_pages(file_path: str) -> Iterator[Page]:
+    """Lazily extract the text and metadata of each page of a PDF."""
+    from langchain_community.document_loaders import PyPDFLoader
+
+    loader = PyPDFLoader(file_path, extract_images=False)
+    docs = loader.lazy_load()
+    while True:
+        with metrics.stage("parse"):
+            doc = next(docs, None)
+        if doc is None:
+            return
+        metrics.record("parse", items=1)
+        yield doc.page_content, doc.metadata
+
+
+def extract_pdf_pages(file_path: str) -> List[Page]:
+    """
+    Extract the text and metadata of every page of a PDF.
+
+    This is the CPU-bound part of loading and is a module-level function
+    so it can run in a process pool.
+    """
+    return list(iter_pdf_pages(file_path))
+
+
+def iter_pdf_stream_pages(stream: BinaryIO, source: str) -> Iterator[Page]:
+    """
+    Lazily extract pages from a seekable PDF byte stream, with the same
+    metadata PyPDFLoader records for a file at ``source``.
+    """
+    from pypdf import PdfReader
+
+    with metrics.stage("parse"):
+        reader = PdfReader(stream)
+    for page_number, page in enumerate(reader.pages):
+        with metrics.stage("parse"):
+            text = page.extract_text()
+        metrics.record("parse", items=1)
+        yield text, {"source": source, "page": page_number}
+
+
+def extract_pdf_pages_from_bytes(data: bytes, source: str) -> List[Page]:
+    """Like extract_pdf_pages, for a PDF held in memory."""
+    return list(iter_pdf_stream_pages(io.BytesIO(data), source))
+
 
 class PDFDocumentLoader(DocumentLoaderProtocol):
-    def __init__(self, tokenizer: TokenizerProtocol):
+    def __init__(self, tokenizer: TokenizerProtocol, pages_per_batch: int = 8):
         self.tokenizer = tokenizer
+        # Pages tokenized per request while streaming
+        self.pages_per_batch = pages_per_batch
 
-    def load_and_split(self, file_path: str, chunk_size: int = 256, chunk_overlap: int = 50) -> List[DocumentChunk]:
+    def load_and_split(
+        self,
+        file_path: str,
+        chunk_size: int = 256,
+        chunk_overlap: int = 50,
+        source: Optional[str] = None
+    ) -> List[DocumentChunk]:
+        """
+        Load a PDF and split it into chunks. ``source`` overrides the file
+        path recorded in chunk metadata, e.g. with the object key.
+        """
+        return list(self.lazy_load_and_split(file_path, chunk_size, chunk_overlap, source))
+
+    def lazy_load_and_split(
+        self,
+        file_path: str,
+        chunk_size: int = 256,
+        chunk_overlap: int = 50,
+        source: Optional[str] = None
+    ) -> Iterator[DocumentChunk]:
+        """Like load_and_split, but yields chunks as pages are parsed."""
         if chunk_size <= chunk_overlap:
             raise ValueError("chunk_size must be greater than chunk_overlap")
 
-        loader = PyPDFLoader(file_path, extract_images=False)
-        documents = loader.load()
+        return self.lazy_split_pages(iter_pdf_pages(file_path), chunk_size, chunk_overlap, source)
+
+    def load_and_split_stream(
+        self,
+        stream: BinaryIO,
+        source: str,
+        chunk_size: int = 256,
+        chunk_overlap: int = 50
+    ) -> List[DocumentChunk]:
+        """Load a PDF from a seekable byte stream and split it into chunks."""
+        return list(self.lazy_load_and_split_stream(stream, source, chunk_size, chunk_overlap))
+
+    def lazy_load_and_split_stream(
+        self,
+        stream: BinaryIO,
+        source: str,
+        chunk_size: int = 256,
+        chunk_overlap: int = 50
+    ) -> Iterator[DocumentChunk]:
+        """Like load_and_split_stream, but yields chunks as pages are parsed."""
+        if chunk_size <= chunk_overlap:
+            raise ValueError("chunk_size must be greater than chunk_overlap")
 
-        text_splitter = RecursiveCharacterTextSplitter(
+        return self.lazy_split_pages(iter_pdf_stream_pages(stream, source), chunk_size, chunk_overlap, source)
+
+    def split_pages(
+        self,
+        pages: Iterable[Page],
+        chunk_size: int = 256,
+        chunk_overlap: int = 50,
+        source: Optional[str] = None
+    ) -> List[DocumentChunk]:
+        """Split already extracted pages into chunks."""
+        return list(self.lazy_split_pages(pages, chunk_size, chunk_overlap, source))
+
+    def lazy_split_pages(
+        self,
+        pages: Iterable[Page],
+        chunk_size: int = 256,
+        chunk_overlap: int = 50,
+        source: Optional[str] = None
+    ) -> Iterator[DocumentChunk]:
+        """Split pages into chunks, yielding them page by page."""
+        text_splitter = TokenOffsetTextSplitter(
+            self.tokenizer,
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap,
-            length_function=self.tokenizer.count_tokens,
-            separators=["\n\n", "\n", " ", ""]
+            separators=["\n\n", "\n", " "]
         )
 
-        split_docs = text_splitter.split_documents(documents)
-
-        return [
-            DocumentChunk(
-                content=doc.page_content,
-                metadata={
-                    "source": doc.metadata.get("source", "unknown"),
-                    "page": doc.metadata.get("page", -1),
-                    "chunk_index": i
-                },
-                id=generate_deterministic_id(
-                    doc.page_content,
-                    {
-                        "source": doc.metadata.get("source", "unknown"),
-                        "page": doc.metadata.get("page", -1),
-                        "chunk_index": i
-                    }
-                )
-            )
-            for i, doc in enumerate(split_docs)
-        ]
+        # Pages are tokenized in small batched requests; chunks never span pages
+        chunk_index = 0
+        for page_batch in _batched(pages, self.pages_per_batch):
+            page_offsets = self.tokenizer.token_offsets_batch([text for text, _ in page_batch])
+
+            for (text, metadata), offsets in zip(page_batch, page_offsets):
+                page_metadata = {
+                    "source": source or metadata.get("source", "unknown"),
+                    "page": metadata.get("page", -1),
+                }
+                for content, token_count in text_splitter.split_offsets(text, offsets):
+                    chunk_metadata = {**page_metadata, "chunk_index": chunk_index}
+                    yield DocumentChunk(
+                        content=content,
+                        metadata=chunk_metadata,
+                        id=generate_deterministic_id(content, chunk_metadata),
+                        token_count=token_count
+                    )
+                    chunk_index += 1
+
+        if hasattr(self.tokenizer, "stats"):
+            logger.info("Tokenizer stats: %s", self.tokenizer.stats())
+
+
+def _batched(items: Iterable[Page], size: int) -> Iterator[List[Page]]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
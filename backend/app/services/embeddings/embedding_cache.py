@@ -0,0 +1,186 @@
+"""Contains content-addressed embedding cache"""
+
+import time
+import sqlite3
+import logging
+import threading
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+from backend.app.domain.protocols import EmbeddingProviderProtocol
+from backend.app.utils.identifiers import generate_deterministic_id
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteEmbeddingCache:
+    """
+    On-disk embedding cache storing float32 vectors in SQLite.
+
+    When the cache grows past ``max_entries`` the least recently used
+    entries are evicted down to ``evict_to`` of the limit.
+    """
+
+    def __init__(self, path: str, max_entries: int = 1_000_000, evict_to: float = 0.9):
+        self.path = path
+        self.max_entries = max_entries
+        self.evict_to = evict_to
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, np.ndarray]:
+        keys = list(dict.fromkeys(keys))
+        found: Dict[str, np.ndarray] = {}
+        if not keys:
+            return found
+
+        with self._lock:
+            # Stay well below SQLite's bound parameter limit
+            for i in range(0, len(keys), 500):
+                batch = keys[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                    batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                self._conn.commit()
+
+        return found
+
+    def put_many(self, items: Dict[str, np.ndarray]) -> None:
+        if not items:
+            return
+
+        now = time.time()
+        with self._lock:
+            # Only keys not stored yet grow the cache; the others are overwritten
+            keys = list(items)
+            existing = 0
+            for i in range(0, len(keys), 500):
+                batch = keys[i:i + 500]
+                existing += self._conn.execute(
+                    f"SELECT COUNT(*) FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                    batch
+                ).fetchone()[0]
+
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [
+                    (key, np.ascontiguousarray(vector, dtype=np.float32).tobytes(), now)
+                    for key, vector in items.items()
+                ]
+            )
+            self._size += len(items) - existing
+            if self._size > self.max_entries:
+                self._evict()
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _evict(self) -> None:
+        self._size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = self._size - int(self.max_entries * self.evict_to)
+        if excess <= 0:
+            return
+
+        self._conn.execute(
+            """
+            DELETE FROM embeddings WHERE key IN (
+                SELECT key FROM embeddings ORDER BY last_used LIMIT ?
+            )
+            """,
+            (excess,)
+        )
+        self._size -= excess
+        logger.info("Evicted %d entries from embedding cache %s", excess, self.path)
+
+
+class CachedEmbeddingProvider(EmbeddingProviderProtocol):
+    """
+    Serves embeddings from a cache keyed by (model name, content hash) and
+    only sends cache misses to the wrapped provider.
+    """
+
+    def __init__(
+        self,
+        embedding_provider: EmbeddingProviderProtocol,
+        cache: SQLiteEmbeddingCache,
+        model_name: str
+    ):
+        self.embedding_provider = embedding_provider
+        self.cache = cache
+        self.model_name = model_name
+        # Batches are embedded from several threads at once
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_embeddings(self, texts: List[str]) -> np.ndarray:
+        keys = [self._key(text) for text in texts]
+        cached = self.cache.get_many(keys)
+
+        # Identical texts in the same batch are embedded once
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in cached:
+                missing.setdefault(key, text)
+
+        with self._lock:
+            self.hits += len(texts) - sum(1 for key in keys if key in missing)
+            self.misses += len(missing)
+
+        if missing:
+            embeddings = self.embedding_provider.get_embeddings(list(missing.values()))
+            if len(embeddings) != len(missing):
+                raise ValueError(
+                    f"Embedding count mismatch: expected {len(missing)}, got {len(embeddings)}"
+                )
+            fetched = dict(zip(missing.keys(), embeddings))
+            self.cache.put_many(fetched)
+            cached.update(fetched)
+
+        if not keys:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.stack([cached[key] for key in keys]).astype(np.float32, copy=False)
+
+    def close(self) -> None:
+        self.cache.close()
+        if hasattr(self.embedding_provider, "close"):
+            self.embedding_provider.close()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+    def _key(self, text: str) -> str:
+        return generate_deterministic_id(text, {"model": self.model_name})
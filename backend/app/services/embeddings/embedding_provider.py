@@ -1,41 +1,150 @@
 """Contains embedding provider"""
 
+import asyncio
 import logging
-import requests
-from typing import List
+import threading
+from concurrent.futures import Future
+from typing import List, Optional
 
-from tenacity import retry, stop_after_attempt, wait_exponential
+import httpx
+import numpy as np
+import orjson
+import requests
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential
 
-from backend.app.domain.protocols import EmbeddingProviderProtocol
+from backend.app.domain.protocols import (
+    EmbeddingProviderProtocol,
+    AsyncEmbeddingProviderProtocol
+)
+from backend.app.utils import metrics
 
 
 logger = logging.getLogger(__name__)
 
 
+def _is_retryable(error: BaseException) -> bool:
+    # Client errors other than throttling won't succeed on retry
+    status = getattr(getattr(error, "response", None), "status_code", None)
+    return status is None or status == 429 or status >= 500
+
+
+def _count_retry(retry_state) -> None:
+    metrics.retried("embed")
+
+
 class TEIEmbeddingProvider(EmbeddingProviderProtocol):
     def __init__(self, api_url: str, timeout: int = 30):
         self.api_url = api_url
         self.timeout = timeout
+        self._session = requests.Session()
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, max=10))
-    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
-        response = requests.post(
-            self.api_url,
-            json={"inputs": texts},
-            timeout=self.timeout
-        )
-        response.raise_for_status()
-        result = response.json()
+    @retry(
+        retry=retry_if_exception(_is_retryable),
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, max=10),
+        before_sleep=_count_retry
+    )
+    def get_embeddings(self, texts: List[str]) -> np.ndarray:
+        with metrics.stage("embed"):
+            response = self._session.post(
+                self.api_url,
+                data=orjson.dumps({"inputs": texts}),
+                headers={"Content-Type": "application/json"},
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+        metrics.record("embed", items=len(texts), nbytes=len(response.content))
+        result = orjson.loads(response.content)
 
         return self._parse_embedding_response(result)
 
-    def _parse_embedding_response(self, result) -> List[List[float]]:
+    def close(self) -> None:
+        self._session.close()
+
+    def _parse_embedding_response(self, result) -> np.ndarray:
+        """Parse the response into a contiguous (n, dim) float32 matrix."""
         # Parse response: support multiple formats
-        if isinstance(result, list):
-            if result and isinstance(result[0], (int, float)):  # single flat vector
-                return [result]
-            return result  # assume list of vectors
-        elif isinstance(result, dict):
-            return result.get("embeddings", []) or result.get("data", [])
-        
-        raise ValueError(f"Unknown embedding response format: {result}")
+        if isinstance(result, dict):
+            result = result.get("embeddings", []) or result.get("data", [])
+        elif not isinstance(result, list):
+            raise ValueError(f"Unknown embedding response format: {result}")
+
+        if not result:
+            return np.empty((0, 0), dtype=np.float32)
+        if isinstance(result[0], (int, float)):  # single flat vector
+            result = [result]
+        return np.array(result, dtype=np.float32, order="C")
+
+
+class AsyncTEIEmbeddingProvider(TEIEmbeddingProvider, AsyncEmbeddingProviderProtocol):
+    """
+    TEI provider built on a pooled httpx.AsyncClient.
+
+    Requests run on a private event loop thread, so synchronous callers in
+    any number of threads share one set of keep-alive connections, with at
+    most ``max_in_flight`` requests outstanding against TEI.
+    """
+
+    def __init__(self, api_url: str, timeout: int = 30, max_in_flight: int = 4):
+        super().__init__(api_url, timeout)
+        self.max_in_flight = max_in_flight
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="tei-embed-loop", daemon=True)
+        self._thread.start()
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+
+    async def _start(self) -> None:
+        self._client = httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=httpx.Limits(
+                max_connections=self.max_in_flight,
+                max_keepalive_connections=self.max_in_flight
+            )
+        )
+        self._semaphore = asyncio.Semaphore(self.max_in_flight)
+
+    @retry(
+        retry=retry_if_exception(_is_retryable),
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, max=10),
+        before_sleep=_count_retry
+    )
+    async def aget_embeddings(self, texts: List[str]) -> np.ndarray:
+        # The slot is released between retries so waiting doesn't block other batches
+        async with self._semaphore:
+            # Runs as a task on the provider's loop, which inherits the caller's profiling context
+            with metrics.stage("embed"):
+                response = await self._client.post(
+                    self.api_url,
+                    content=orjson.dumps({"inputs": texts}),
+                    headers={"Content-Type": "application/json"}
+                )
+                response.raise_for_status()
+        metrics.record("embed", items=len(texts), nbytes=len(response.content))
+        result = orjson.loads(response.content)
+
+        return self._parse_embedding_response(result)
+
+    def submit_embeddings(self, texts: List[str]) -> "Future[np.ndarray]":
+        """Schedule a batch on the provider's loop and return its future."""
+        return asyncio.run_coroutine_threadsafe(self.aget_embeddings(texts), self._loop)
+
+    def get_embeddings(self, texts: List[str]) -> np.ndarray:
+        return self.submit_embeddings(texts).result()
+
+    def get_embeddings_many(self, batches: List[List[str]]) -> List[np.ndarray]:
+        """Embed several batches concurrently, returning results in input order."""
+        futures = [self.submit_embeddings(batch) for batch in batches]
+        return [future.result() for future in futures]
+
+    def close(self) -> None:
+        if self._loop.is_closed():
+            return
+        if self._client is not None:
+            asyncio.run_coroutine_threadsafe(self._client.aclose(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        super().close()
@@ -1,70 +1,372 @@
 """Contains embedding service"""
 
 import os
+import queue
 import logging
-from typing import List
+import time
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, BinaryIO, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
 from backend.app.domain.protocols import (
     DocumentLoaderProtocol, 
     EmbeddingProviderProtocol, 
     VectorStoreProtocol,
     DocumentChunk
 )
+from backend.app.services.embeddings.batching import TokenBudgetBatcher, is_overload_error
+from backend.app.services.embeddings.chunk_dedup import ChunkDeduplicator, DedupSession
+from backend.app.services.search.lexical_index import LexicalIndex
+from backend.app.utils import metrics
 
 logger = logging.getLogger(__name__)
 
 
+_DONE = object()
+
+
 class EmbeddingService:
     def __init__(
         self,
         document_loader: DocumentLoaderProtocol,
         embedding_provider: EmbeddingProviderProtocol,
         vector_store: VectorStoreProtocol,
-        batch_size: int = 16
+        batch_size: int = 16,
+        max_pending_batches: int = 4,
+        embed_concurrency: int = 1,
+        batcher: Optional[TokenBudgetBatcher] = None,
+        lexical_index: Optional[LexicalIndex] = None,
+        deduplicator: Optional[ChunkDeduplicator] = None,
+        chunk_size: int = 256,
+        chunk_overlap: int = 50
     ):
         self.document_loader = document_loader
         self.embedding_provider = embedding_provider
         self.vector_store = vector_store
         self.batch_size = batch_size
+        self.batcher = batcher or TokenBudgetBatcher(max_count=batch_size)
+        # Bound on batches queued between pipeline stages
+        self.max_pending_batches = max(max_pending_batches, embed_concurrency)
+        self.embed_concurrency = embed_concurrency
+        # Chunks are indexed for keyword search once they are stored
+        self.lexical_index = lexical_index
+        # Chunks whose content is already stored reuse it instead of being embedded
+        self.deduplicator = deduplicator
+        # Chunking used when a call doesn't specify its own
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
 
     def process_file(
         self,
         file_path: str,
-        chunk_size: int = 256,
-        chunk_overlap: int = 50
-    ) -> None:
+        chunk_size: Optional[int] = None,
+        chunk_overlap: Optional[int] = None,
+        source: Optional[str] = None
+    ) -> List[str]:
+        """
+        Embed a PDF and store its chunks. Returns the IDs of the stored chunks.
+        """
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"File not found: {file_path}")
 
         logger.info("Loading and splitting PDF: %s", file_path)
-        chunks = self.document_loader.load_and_split(file_path, chunk_size, chunk_overlap)
-        logger.info("Split into %d chunks", len(chunks))
+        chunk_size, chunk_overlap = self._chunking(chunk_size, chunk_overlap)
+        chunks = self.document_loader.lazy_load_and_split(file_path, chunk_size, chunk_overlap, source)
+        return self._store_chunks(chunks)
+
+    def process_stream(
+        self,
+        stream: BinaryIO,
+        source: str,
+        chunk_size: Optional[int] = None,
+        chunk_overlap: Optional[int] = None
+    ) -> List[str]:
+        """
+        Embed a PDF read from a seekable byte stream, e.g. an S3 object body.
+        Returns the IDs of the stored chunks.
+        """
+        chunk_size, chunk_overlap = self._chunking(chunk_size, chunk_overlap)
+        chunks = self.document_loader.lazy_load_and_split_stream(stream, source, chunk_size, chunk_overlap)
+        return self._store_chunks(chunks)
+
+    def process_pages(
+        self,
+        pages: Iterable[Tuple[str, Dict[str, Any]]],
+        source: str,
+        chunk_size: Optional[int] = None,
+        chunk_overlap: Optional[int] = None
+    ) -> List[str]:
+        """
+        Embed pages that were already extracted from a PDF, e.g. in a worker
+        process. Returns the IDs of the stored chunks.
+        """
+        chunk_size, chunk_overlap = self._chunking(chunk_size, chunk_overlap)
+        chunks = self.document_loader.lazy_split_pages(pages, chunk_size, chunk_overlap, source)
+        return self._store_chunks(chunks)
+
+    def delete_by_source(self, source: str) -> None:
+        """
+        Delete the chunks of a source from the vector store and the lexical
+        index, except those other sources share.
+        """
+        self._release([source])
+        self.vector_store.delete_by_source(source)
+        if self.lexical_index is not None:
+            self.lexical_index.delete_sources([source])
 
+    def delete_by_sources(self, sources: List[str]) -> None:
+        self._release(sources)
+        self.vector_store.delete_by_sources(sources)
+        if self.lexical_index is not None:
+            self.lexical_index.delete_sources(sources)
+
+    def delete_ids(self, ids: List[str], source: Optional[str] = None) -> None:
+        """
+        Delete chunks by ID. With ``source``, only its references to them
+        are dropped and chunks other sources share are kept.
+        """
+        if self.deduplicator is not None:
+            if source is not None:
+                ids = self._release([source], ids)
+            else:
+                self.deduplicator.forget(ids)
+        if not ids:
+            return
+        self.vector_store.delete_ids(ids)
+        if self.lexical_index is not None:
+            self.lexical_index.delete_ids(ids)
+
+    def close(self) -> None:
+        """Release the connections held by the service's components."""
+        tokenizer = getattr(self.document_loader, "tokenizer", None)
+        for component in (tokenizer, self.embedding_provider, self.vector_store, self.lexical_index, self.deduplicator):
+            if hasattr(component, "close"):
+                component.close()
+
+    def _chunking(self, chunk_size: Optional[int], chunk_overlap: Optional[int]) -> Tuple[int, int]:
+        return (
+            self.chunk_size if chunk_size is None else chunk_size,
+            self.chunk_overlap if chunk_overlap is None else chunk_overlap
+        )
+
+    def _release(self, sources: List[str], ids: Optional[List[str]] = None) -> Optional[List[str]]:
+        """
+        Drop the references of ``sources`` to shared chunks (to ``ids`` only,
+        if given) and return the IDs that can be deleted.
+        """
+        if self.deduplicator is None:
+            return ids
+        # Chunks still shared move to another source before their owner's are deleted
+        self._reassign(self.deduplicator.successors(sources, ids))
+        return self.deduplicator.release(sources, ids)
+
+    def _reassign(self, owners: Dict[str, str]) -> None:
+        """Store chunks again under the source that takes them over, keeping the rest of their metadata."""
+        if not owners:
+            return
+        # Stored again with their stored embeddings, so nothing is embedded twice
+        embeddings = self.vector_store.get_embeddings(list(owners))
+        chunks = [
+            DocumentChunk(id=doc.id, content=doc.content, metadata={**doc.metadata, "source": owners[doc.id]})
+            for doc in self.vector_store.get_documents(list(owners)) if doc.id in embeddings
+        ]
         if not chunks:
+            return
+        self.vector_store.add_documents(chunks, np.stack([embeddings[chunk.id] for chunk in chunks]))
+        if self.lexical_index is not None:
+            self.lexical_index.add(chunks)
+        logger.info("Reassigned %d shared chunks to other sources", len(chunks))
+
+    def _abort(self, dedup: DedupSession) -> None:
+        """Release what a failed document registered, so later copies of its chunks aren't skipped."""
+        ids = dedup.abort()
+        if not ids:
+            return
+        try:
+            self.delete_ids(ids, source=dedup.source)
+        except Exception as e:
+            logger.warning("Could not release %d chunks of a failed document: %s", len(ids), e)
+
+    def _store_chunks(self, chunks: Iterable[DocumentChunk]) -> List[str]:
+        """
+        Pipeline chunks through deduplication, embedding and upserting.
+
+        Splitting and deduplication run in the calling thread, up to
+        ``embed_concurrency`` batches are embedded concurrently and upserts
+        are issued from their own thread in chunk order, running
+        concurrently when the store can submit them. The bounded queue
+        between the stages keeps memory flat regardless of document size.
+        Returns the IDs of the stored chunks, then those of the stored
+        chunks reused for duplicates.
+        """
+        dedup = self.deduplicator.session() if self.deduplicator is not None else None
+        if dedup is not None:
+            chunks = dedup.unique(chunks)
+
+        # Holds (batch, future) pairs in chunk order; its bound also caps
+        # the number of embedding batches in flight
+        to_upsert: queue.Queue = queue.Queue(maxsize=self.max_pending_batches)
+        stop = threading.Event()
+        errors: List[BaseException] = []
+        stored_ids: List[str] = []
+        # Upserts submitted to a store that runs them concurrently, in chunk order
+        submitted: Deque[Tuple[List[DocumentChunk], Future]] = deque()
+        submit_documents = getattr(self.vector_store, "submit_documents", None)
+
+        def collect_upserts(wait: bool) -> None:
+            while submitted and (wait or submitted[0][1].done()):
+                batch, future = submitted.popleft()
+                future.result()
+                stored(batch)
+
+        def stored(batch: List[DocumentChunk]) -> None:
+            stored_ids.extend(chunk.id for chunk in batch)
+            if dedup is not None:
+                dedup.stored(batch)
+            if self.lexical_index is not None:
+                with metrics.stage("index"):
+                    self.lexical_index.add(batch)
+
+        def upsert_batch(item) -> None:
+            batch, future = item
+            if submit_documents is None:
+                self.vector_store.add_documents(batch, future.result())
+                stored(batch)
+                return
+
+            submitted.append((batch, submit_documents(batch, future.result())))
+            collect_upserts(wait=False)
+
+        upserter = threading.Thread(
+            target=metrics.propagate(_run_stage),
+            args=(upsert_batch, to_upsert, None, stop, errors),
+            name="upsert-stage",
+            daemon=True
+        )
+        upserter.start()
+        embed_pool = ThreadPoolExecutor(max_workers=self.embed_concurrency, thread_name_prefix="embed")
+
+        embed = metrics.propagate(self._generate_embeddings_batched)
+
+        def dispatch(batch: List[DocumentChunk]) -> None:
+            future = embed_pool.submit(embed, batch)
+            _put(to_upsert, (batch, future), stop)
+
+        try:
+            for batch in self.batcher.pack(chunks):
+                if stop.is_set():
+                    break
+                dispatch(batch)
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            _put(to_upsert, _DONE, stop)
+            upserter.join()
+            embed_pool.shutdown(wait=True, cancel_futures=True)
+
+        if not errors:
+            try:
+                collect_upserts(wait=True)
+                if dedup is not None:
+                    missing = dedup.commit()
+                    if missing:
+                        # Stored chunks found for duplicates were deleted meanwhile, so the duplicates are stored
+                        self.vector_store.add_documents(missing, self._generate_embeddings_batched(missing))
+                        stored(missing)
+            except BaseException as e:
+                errors.append(e)
+        if errors:
+            if dedup is not None:
+                self._abort(dedup)
+            raise errors[0]
+
+        if dedup is not None and dedup.reused:
+            metrics.record("dedup", items=len(dedup.reused))
+            logger.info("Reused stored chunks for %d of %d chunks", len(dedup.reused), dedup.chunks)
+            stored_ids = list(dict.fromkeys(stored_ids + dedup.reused))
+
+        if not stored_ids:
             logger.warning("No documents extracted from PDF.")
+        else:
+            logger.info("Stored %d chunks", len(stored_ids))
+
+        if hasattr(self.embedding_provider, "stats"):
+            logger.info("Embedding cache stats: %s", self.embedding_provider.stats())
+        logger.info("Embedding batch stats: %s", self.batcher.stats())
+        if hasattr(self.vector_store, "stats"):
+            logger.info("Upsert stats: %s", self.vector_store.stats())
+
+        return stored_ids
+
+    def _generate_embeddings_batched(self, chunks: List[DocumentChunk]) -> np.ndarray:
+        # Re-pack in case the token budget shrank since the chunks were batched
+        all_embeddings = [self._embed_batch(batch) for batch in self.batcher.pack(chunks)]
+
+        if len(all_embeddings) == 1:
+            return all_embeddings[0]
+        return np.concatenate(all_embeddings)
+
+    def _embed_batch(self, batch: List[DocumentChunk]) -> np.ndarray:
+        texts = [chunk.content for chunk in batch]
+        started = time.perf_counter()
+        try:
+            batch_embeddings = self.embedding_provider.get_embeddings(texts)
+        except Exception as e:
+            if is_overload_error(e) and len(batch) > 1:
+                # Too large for TEI right now: lower the budget and halve the batch
+                self.batcher.record_overload()
+                middle = len(batch) // 2
+                return np.concatenate([self._embed_batch(batch[:middle]), self._embed_batch(batch[middle:])])
+            logger.error("Failed to get embeddings for batch of %d chunks: %s", len(batch), e)
+            raise
+
+        self.batcher.record_success(batch, time.perf_counter() - started)
+        if len(batch_embeddings) != len(batch):
+            logger.warning(
+                "Embedding count mismatch: expected %d, got %d", 
+                len(batch), 
+                len(batch_embeddings)
+            )
+        return batch_embeddings
+
+
+def _put(target: queue.Queue, item: Any, stop: threading.Event) -> None:
+    """Put with backpressure, giving up once the pipeline is stopping."""
+    while True:
+        if stop.is_set() and item is not _DONE:
             return
+        try:
+            target.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            if stop.is_set():
+                return
+
 
-        embeddings = self._generate_embeddings_batched(chunks)
-        self.vector_store.add_documents(chunks, embeddings)
-
-    def _generate_embeddings_batched(self, chunks: List[DocumentChunk]) -> List[List[float]]:
-        texts = [chunk.content for chunk in chunks]
-        all_embeddings = []
-        
-        logger.info("Generating embeddings in batches of %d", self.batch_size)
-        
-        for i in range(0, len(texts), self.batch_size):
-            batch = texts[i:i + self.batch_size]
+def _run_stage(
+    stage: Callable[[Any], Any],
+    source: queue.Queue,
+    sink: Optional[queue.Queue],
+    stop: threading.Event,
+    errors: List[BaseException]
+) -> None:
+    try:
+        while not stop.is_set():
             try:
-                batch_embeddings = self.embedding_provider.get_embeddings(batch)
-                if len(batch_embeddings) != len(batch):
-                    logger.warning(
-                        "Embedding count mismatch: expected %d, got %d", 
-                        len(batch), 
-                        len(batch_embeddings)
-                    )
-                all_embeddings.extend(batch_embeddings)
-            except Exception as e:
-                logger.error("Failed to get embeddings for batch %d: %s", i, e)
-                raise
-
-        return all_embeddings
\ No newline at end of file
+                item = source.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                break
+            result = stage(item)
+            if sink is not None:
+                _put(sink, result, stop)
+    except BaseException as e:
+        errors.append(e)
+        stop.set()
+    finally:
+        if sink is not None:
+            _put(sink, _DONE, stop)
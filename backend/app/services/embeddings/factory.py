@@ -1,27 +1,112 @@
 """Factory of embedding service"""
 
+import os
+from typing import Optional
+
 from backend.app.core.config import settings
-from backend.app.services.embeddings.tokenizer import TEITokenizer
+from backend.app.schemas.index_schema import IndexSpec
+from backend.app.services.embeddings.tokenizer import (
+    TEITokenizer,
+    LocalTokenizer,
+    CachedTokenizer
+)
 from backend.app.services.embeddings.document_loader import PDFDocumentLoader
-from backend.app.services.embeddings.embedding_provider import TEIEmbeddingProvider
+from backend.app.services.embeddings.embedding_provider import AsyncTEIEmbeddingProvider
+from backend.app.services.embeddings.embedding_cache import (
+    SQLiteEmbeddingCache,
+    CachedEmbeddingProvider
+)
 from backend.app.services.embeddings.vector_store import ChromaVectorStore
+from backend.app.services.embeddings.local_vector_store import LocalVectorStore
+from backend.app.services.embeddings.upsert_engine import UpsertEngine
 from backend.app.services.embeddings.embedding_service import EmbeddingService
+from backend.app.services.embeddings.batching import TokenBudgetBatcher
+from backend.app.services.embeddings.chunk_dedup import ChunkDeduplicator
+from backend.app.services.search.lexical_index import LexicalIndex
 
 
 class EmbeddingServiceFactory:
     @staticmethod
-    def create() -> EmbeddingService:
-        tokenizer = TEITokenizer(settings.EMBEDDING_TOKENIZE_URL)
+    def default_spec() -> IndexSpec:
+        return IndexSpec(
+            collection=settings.COLLECTION_NAME,
+            chunk_size=settings.CHUNK_SIZE,
+            chunk_overlap=settings.CHUNK_OVERLAP
+        )
+
+    @staticmethod
+    def create(spec: Optional[IndexSpec] = None) -> EmbeddingService:
+        """Build the service of an index, by default the one named after the embedding model."""
+        spec = spec or EmbeddingServiceFactory.default_spec()
+        if settings.TOKENIZER_PATH:
+            base_tokenizer = LocalTokenizer(settings.TOKENIZER_PATH)
+        else:
+            base_tokenizer = TEITokenizer(
+                settings.EMBEDDING_TOKENIZE_URL,
+                batch_size=settings.TOKENIZE_BATCH_SIZE
+            )
+        tokenizer = CachedTokenizer(base_tokenizer, max_entries=settings.TOKENIZER_CACHE_SIZE)
         document_loader = PDFDocumentLoader(tokenizer)
-        embedding_provider = TEIEmbeddingProvider(settings.EMBEDDING_API_URL)
-        vector_store = ChromaVectorStore(
-            host=settings.CHROMA_HOST,
-            port=settings.CHROMA_PORT,
-            collection_name=settings.COLLECTION_NAME
+        embedding_provider = AsyncTEIEmbeddingProvider(
+            settings.EMBEDDING_API_URL,
+            max_in_flight=settings.EMBEDDING_MAX_IN_FLIGHT
         )
-        
+        if settings.EMBEDDING_CACHE_ENABLED:
+            embedding_provider = CachedEmbeddingProvider(
+                embedding_provider,
+                SQLiteEmbeddingCache(
+                    settings.EMBEDDING_CACHE_PATH,
+                    max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES
+                ),
+                model_name=settings.EMBEDDING_MODEL
+            )
+        if settings.VECTOR_STORE_BACKEND == "local":
+            vector_store = LocalVectorStore(
+                os.path.join(os.path.dirname(settings.LOCAL_VECTOR_STORE_PATH), spec.collection),
+                ivf_threshold=settings.LOCAL_VECTOR_IVF_THRESHOLD,
+                nprobe=settings.LOCAL_VECTOR_NPROBE
+            )
+        elif settings.VECTOR_STORE_BACKEND == "chroma":
+            vector_store = ChromaVectorStore(
+                host=settings.CHROMA_HOST,
+                port=settings.CHROMA_PORT,
+                collection_name=spec.collection,
+                upsert_engine=UpsertEngine(
+                    max_batch_bytes=settings.UPSERT_MAX_BATCH_BYTES,
+                    max_batch_size=settings.UPSERT_MAX_BATCH_SIZE,
+                    max_in_flight=settings.UPSERT_MAX_IN_FLIGHT,
+                    target_latency=settings.UPSERT_TARGET_LATENCY,
+                    retries=settings.UPSERT_RETRIES
+                )
+            )
+        else:
+            raise ValueError(f"Unknown vector store backend: {settings.VECTOR_STORE_BACKEND}")
+
+        lexical_index = None
+        if settings.LEXICAL_INDEX_ENABLED:
+            lexical_index = LexicalIndex(os.path.join(os.path.dirname(settings.LEXICAL_INDEX_PATH), spec.collection))
+        deduplicator = None
+        if settings.DEDUP_ENABLED:
+            deduplicator = ChunkDeduplicator(
+                settings.DEDUP_PATH,
+                spec.collection,
+                near_duplicates=settings.DEDUP_NEAR_DUPLICATES,
+                threshold=settings.DEDUP_NEAR_THRESHOLD
+            )
+
         return EmbeddingService(
             document_loader=document_loader,
             embedding_provider=embedding_provider,
-            vector_store=vector_store
+            vector_store=vector_store,
+            batch_size=settings.EMBEDDING_BATCH_MAX_SIZE,
+            embed_concurrency=settings.EMBEDDING_MAX_IN_FLIGHT,
+            batcher=TokenBudgetBatcher(
+                max_tokens=settings.EMBEDDING_BATCH_MAX_TOKENS,
+                max_count=settings.EMBEDDING_BATCH_MAX_SIZE,
+                target_latency=settings.EMBEDDING_BATCH_TARGET_LATENCY
+            ),
+            lexical_index=lexical_index,
+            deduplicator=deduplicator,
+            chunk_size=spec.chunk_size,
+            chunk_overlap=spec.chunk_overlap
         )
\ No newline at end of file
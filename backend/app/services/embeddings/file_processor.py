@@ -1,106 +1,703 @@
 """Contains file processor"""
 
 import os
+import uuid
+import socket
 import logging
 import tempfile
-from typing import List, Dict
+import threading
+import multiprocessing
+from datetime import datetime
+from functools import partial
+from contextlib import contextmanager
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    ProcessPoolExecutor,
+    wait
+)
+from itertools import islice
+from typing import List, Dict, Any, BinaryIO, Callable, ContextManager, Iterable, Iterator, Optional, Set, Tuple
 
-import boto3
-from botocore.exceptions import ClientError
-from botocore.client import Config
 from fastapi import HTTPException
-from pydantic import BaseModel
 
 from backend.app.core.config import settings
+from backend.app.schemas.embedding_schema import EmbedResponse
+from backend.app.schemas.file_schema import BulkDeleteResponse
 from backend.app.services.embeddings.embedding_service import EmbeddingService
+from backend.app.services.embeddings.document_loader import (
+    Page,
+    extract_pdf_pages,
+    extract_pdf_pages_from_bytes,
+    iter_pdf_stream_pages
+)
+from backend.app.services.embeddings.page_store import PageStore, version_key
+from backend.app.services.embeddings.sync_manifest import SyncManifest, ManifestEntry
+from backend.app.services.jobs.lease_store import LeaseStore
+from backend.app.utils import metrics
+from backend.app.utils.s3 import create_s3_client
 
 logger = logging.getLogger(__name__)
 
-
-class EmbedResponse(BaseModel):
-    processed: List[str]
-    failed: List[Dict[str, str]]
-    message: str
+# Read size when streaming object bodies into memory
+OBJECT_READ_CHUNK_SIZE = 1024 * 1024
+# Keys per S3 delete_objects request, its maximum
+DELETE_BATCH_SIZE = 1000
+# Listed objects queued as work items per lease store write
+LEASE_ENQUEUE_BATCH = 1000
 
 
 class FileProcessor:
-    def __init__(self):
-        self.s3_client = boto3.client(
-            "s3",
-            endpoint_url=settings.MINIO_ENDPOINT,
-            aws_access_key_id=settings.MINIO_ACCESS_KEY,
-            aws_secret_access_key=settings.MINIO_SECRET_KEY,
-            config=Config(signature_version="s3v4"),
-            region_name="us-east-1",
-            verify=False,
-        )
+    def __init__(self, s3_client=None, page_store: Optional[PageStore] = None):
+        # Without a client one is created on first use, keeping boto3 off the startup path
+        self._s3_client = s3_client
+        self._owns_s3_client = s3_client is None
+        self._s3_client_lock = threading.Lock()
         self.bucket_name = settings.MINIO_BUCKET
+        # Extracted page text by object version, reused instead of downloading and parsing
+        self.page_store = page_store
+        # PDF parsing processes are started on first use and kept until close()
+        self._parse_pool: Optional[ProcessPoolExecutor] = None
+        self._parse_pool_lock = threading.Lock()
 
-    def get_pdf_files(self) -> List[str]:
-        """List all PDF files in the bucket."""
-        try:
-            response = self.s3_client.list_objects_v2(Bucket=self.bucket_name)
-            if "Contents" not in response:
-                raise HTTPException(status_code=400, detail="No PDF files to embed")
+    @property
+    def s3_client(self):
+        if self._s3_client is None:
+            with self._s3_client_lock:
+                if self._s3_client is None:
+                    self._s3_client = create_s3_client()
+        return self._s3_client
 
-            pdf_files = [
-                obj["Key"] for obj in response["Contents"]
-                if obj["Key"].endswith(".pdf")
-            ]
+    def iter_pdf_objects(
+        self,
+        prefix: str = "",
+        suffix: str = ".pdf",
+        start_after: Optional[str] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Lazily list the objects in the bucket with their key, ETag, size and
+        last-modified, page by page. Keys are filtered by ``prefix`` and
+        ``suffix`` and listing resumes after the ``start_after`` key.
+        """
+        params = {"Bucket": self.bucket_name, "Prefix": prefix}
+        if start_after:
+            params["StartAfter"] = start_after
 
-            if not pdf_files:
-                raise HTTPException(status_code=400, detail="No PDF files to embed")
-            return pdf_files
+        try:
+            pages = iter(self.s3_client.get_paginator("list_objects_v2").paginate(**params))
+            while True:
+                with metrics.stage("list"):
+                    page = next(pages, None)
+                if page is None:
+                    return
+                contents = page.get("Contents", [])
+                metrics.record("list", items=len(contents))
+                for obj in contents:
+                    if obj["Key"].endswith(suffix):
+                        yield obj
 
-        except ClientError as e:
+        except Exception as e:
+            # botocore is imported with the S3 client, not with this module
+            from botocore.exceptions import ClientError
+            if not isinstance(e, ClientError):
+                raise
             logger.error("S3 error: %s", e)
             raise HTTPException(status_code=500, detail="Error accessing S3 bucket")
 
-    def process_files(self, embedding_service: EmbeddingService) -> EmbedResponse:
-        pdf_files = self.get_pdf_files()
+    def list_pdf_objects(self, prefix: str = "", start_after: Optional[str] = None) -> List[Dict[str, Any]]:
+        """List all PDF objects in the bucket with their key, ETag, size and last-modified."""
+        return list(self.iter_pdf_objects(prefix, start_after=start_after))
+
+    def get_pdf_files(self) -> List[str]:
+        """List all PDF files in the bucket."""
+        pdf_files = [obj["Key"] for obj in self.iter_pdf_objects()]
+
+        if not pdf_files:
+            raise HTTPException(status_code=400, detail="No PDF files to embed")
+        return pdf_files
+
+    def process_files(
+        self,
+        embedding_service: EmbeddingService,
+        manifest: Optional[SyncManifest] = None,
+        lease_store: Optional[LeaseStore] = None,
+        prefix: str = "",
+        start_after: Optional[str] = None
+    ) -> EmbedResponse:
+        """
+        Embed the PDFs in the bucket. With a manifest, only new and modified
+        objects are ingested and embeddings of deleted objects are removed.
+
+        With a lease store shared by several replicas, each object is
+        ingested by whichever replica claims it; the response then covers
+        the objects this replica ingested.
+
+        ``prefix`` and ``start_after`` restrict the sync to part of the
+        bucket; only embeddings of deleted objects in that part are removed.
+        """
+        # Keys stream from the listing into the pipeline, so work starts on the first page
+        versions = manifest.versions(prefix) if manifest is not None else {}
+        plan = self.plan_sync(self.iter_pdf_objects(prefix, start_after=start_after), versions)
+
         processed = []
         errors = []
+        added = updated = 0
 
-        # Create a temporary directory to download files
-        with tempfile.TemporaryDirectory() as tmp_dir:
-            for filename in pdf_files:
-                local_path = os.path.join(tmp_dir, filename)
-                try:
-                    # Download file from S3/MinIO
-                    self.s3_client.download_file(self.bucket_name, filename, local_path)
-                    logger.info("Downloaded %s to %s", filename, local_path)
+        for obj, chunk_ids, error in self.ingest_objects(plan, embedding_service, manifest, lease_store):
+            filename = obj["Key"]
+            if error is not None:
+                logger.error("Failed to process %s: %s", filename, error)
+                errors.append({filename: str(error)})
+                continue
+            if obj.get("Updated"):
+                updated += 1
+            elif manifest is not None:
+                added += 1
+            processed.append(filename)
 
-                    # Process with existing embedding service (expects local file path)
-                    embedding_service.process_file(local_path)
-                    processed.append(filename)
-                    logger.info("Successfully processed file: %s", filename)
+        if manifest is None and lease_store is None and not plan.seen:
+            raise HTTPException(status_code=400, detail="No PDF files to embed")
 
-                except Exception as e:
-                    error_msg = f"Failed to process {filename}: {str(e)}"
-                    logger.error(error_msg)
-                    errors.append({filename: str(e)})
+        removed = 0
+        if manifest is not None:
+            deleted = plan.deleted(start_after)
+            removed, removal_errors = self.remove_deleted(deleted, embedding_service, manifest)
+            errors.extend(removal_errors)
+            if lease_store is not None:
+                lease_store.forget(deleted)
 
         return EmbedResponse(
             processed=processed,
             failed=errors,
-            message=f"Embedded {len(processed)} file(s)"
+            message=f"Embedded {len(processed)} file(s)",
+            added=added,
+            updated=updated,
+            skipped=plan.skipped,
+            removed=removed
+        )
+
+    def ingest_objects(
+        self,
+        objects: Iterable[Dict[str, Any]],
+        embedding_service: EmbeddingService,
+        manifest: Optional[SyncManifest] = None,
+        lease_store: Optional[LeaseStore] = None,
+        stop: Optional[threading.Event] = None
+    ) -> Iterator[Tuple[Dict[str, Any], List[str], Optional[Exception]]]:
+        """
+        Ingest objects through the download, parse and embed stages and
+        record each in the manifest, yielding (object, chunk IDs, error) as
+        files finish. With a lease store the objects are queued as work
+        items and the items this replica claims are ingested instead.
+
+        Once ``stop`` is set no further files are started; the ones in
+        flight still finish and are yielded.
+        """
+        # Create a temporary directory to download files
+        with tempfile.TemporaryDirectory() as tmp_dir, self._ingest_pools() as (ingest_pool, parse_pool):
+            ingest = metrics.propagate(partial(
+                self._ingest_file,
+                tmp_dir=tmp_dir,
+                embedding_service=embedding_service,
+                parse_pool=parse_pool,
+                download_slots=threading.BoundedSemaphore(max(settings.INGEST_DOWNLOAD_WORKERS, 1)),
+                embed_slots=threading.BoundedSemaphore(max(settings.INGEST_EMBED_WORKERS, 1))
+            ))
+            if lease_store is None:
+                results = self._ingest_all(objects, ingest, ingest_pool, stop)
+            else:
+                results = self._ingest_leased(objects, ingest, ingest_pool, lease_store, stop)
+
+            for obj, future in results:
+                try:
+                    chunk_ids = future.result()
+                    # Recorded per file, so a failed delete or manifest write only fails this file
+                    if manifest is not None:
+                        obj["Updated"] = self._record_ingested(
+                            obj, chunk_ids, manifest.get(obj["Key"]), embedding_service, manifest
+                        )
+                except Exception as e:
+                    # A leased work item is failed along with its file
+                    obj["Error"] = str(e)
+                    yield obj, [], e
+                    continue
+                yield obj, chunk_ids, None
+
+    def _ingest_all(
+        self,
+        objects: Iterable[Dict[str, Any]],
+        ingest: Callable[[Dict[str, Any]], List[str]],
+        ingest_pool: ThreadPoolExecutor,
+        stop: Optional[threading.Event] = None
+    ) -> Iterator[Tuple[Dict[str, Any], Future]]:
+        # Submissions are bounded so a huge listing isn't buffered as futures
+        objects = iter(objects)
+        capacity = 2 * self._ingest_capacity()
+        in_flight: Dict[Future, Dict[str, Any]] = {}
+
+        while True:
+            if stop is not None and stop.is_set():
+                objects = iter(())
+            for obj in islice(objects, capacity - len(in_flight)):
+                in_flight[ingest_pool.submit(ingest, obj)] = obj
+            if not in_flight:
+                return
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield in_flight.pop(future), future
+
+    def _ingest_leased(
+        self,
+        objects: Iterable[Dict[str, Any]],
+        ingest: Callable[[Dict[str, Any]], List[str]],
+        ingest_pool: ThreadPoolExecutor,
+        lease_store: LeaseStore,
+        stop: Optional[threading.Event] = None
+    ) -> Iterator[Tuple[Dict[str, Any], Future]]:
+        """
+        Queue the objects as work items while listing, and ingest items
+        claimed from the lease store until none are left to claim.
+        """
+        objects = iter(objects)
+        listing = True
+        owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        capacity = self._ingest_capacity()
+        in_flight: Dict[Future, Dict[str, Any]] = {}
+
+        with lease_store.keep_alive(owner):
+            while True:
+                if stop is not None and stop.is_set():
+                    # Items not claimed yet stay pending for the next run or another replica
+                    listing = False
+                    capacity = 0
+                if listing and len(in_flight) < capacity:
+                    page = list(islice(objects, LEASE_ENQUEUE_BATCH))
+                    listing = len(page) == LEASE_ENQUEUE_BATCH
+                    lease_store.enqueue(page)
+                if len(in_flight) < capacity:
+                    for item in lease_store.claim(owner, capacity - len(in_flight)):
+                        obj = {
+                            "Key": item["key"],
+                            "ETag": item["etag"],
+                            "Size": item["size"],
+                            "LastModified": datetime.fromisoformat(item["last_modified"]),
+                            "WorkItem": item["id"]
+                        }
+                        in_flight[ingest_pool.submit(ingest, obj)] = obj
+                if not in_flight:
+                    if listing:
+                        continue
+                    return
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    obj = in_flight.pop(future)
+                    # Completed only once the caller recorded the result in the manifest
+                    yield obj, future
+                    error = obj.get("Error") or future.exception()
+                    if error is None:
+                        lease_store.complete(obj["WorkItem"], owner)
+                    else:
+                        lease_store.fail(obj["WorkItem"], owner, str(error))
+
+    @staticmethod
+    def plan_sync(
+        pdf_objects: Iterable[Dict[str, Any]],
+        versions: Dict[str, Tuple[str, int]]
+    ) -> "SyncPlan":
+        """Compare listed objects with the manifest's versions as they stream in."""
+        return SyncPlan(pdf_objects, versions)
+
+    def head_pdf_object(self, key: str) -> Dict[str, Any]:
+        """Fetch an object's version in the same shape as a listing entry."""
+        response = self.s3_client.head_object(Bucket=self.bucket_name, Key=key)
+        return {
+            "Key": key,
+            "ETag": response["ETag"],
+            "Size": response["ContentLength"],
+            "LastModified": response["LastModified"]
+        }
+
+    def remove_deleted(
+        self,
+        keys: List[str],
+        embedding_service: EmbeddingService,
+        manifest: SyncManifest
+    ) -> Tuple[int, List[Dict[str, str]]]:
+        """Remove the embeddings and manifest entries of objects deleted from the bucket."""
+        removed = 0
+        errors = []
+        for filename in keys:
+            try:
+                embedding_service.delete_by_source(filename)
+                manifest.remove(filename)
+                removed += 1
+            except Exception as e:
+                logger.error("Failed to remove embeddings of deleted file %s: %s", filename, e)
+                errors.append({filename: str(e)})
+        return removed, errors
+
+    @staticmethod
+    def _record_ingested(
+        obj: Dict[str, Any],
+        chunk_ids: List[str],
+        previous: Optional[ManifestEntry],
+        embedding_service: EmbeddingService,
+        manifest: SyncManifest
+    ) -> bool:
+        """Record an ingested object, dropping chunks its previous version no longer produces."""
+        if previous is not None:
+            stale_ids = sorted(set(previous.chunk_ids) - set(chunk_ids))
+            embedding_service.delete_ids(stale_ids, source=obj["Key"])
+
+        manifest.record(ManifestEntry(
+            key=obj["Key"],
+            etag=obj["ETag"],
+            size=obj["Size"],
+            last_modified=obj["LastModified"].isoformat(),
+            chunk_ids=chunk_ids
+        ))
+        return previous is not None
+
+    def _ingest_file(
+        self,
+        obj: Dict[str, Any],
+        tmp_dir: str,
+        embedding_service: EmbeddingService,
+        parse_pool: Optional[ProcessPoolExecutor],
+        download_slots: ContextManager,
+        embed_slots: ContextManager
+    ) -> List[str]:
+        """Download, parse and embed one file, each stage within its worker limit."""
+        try:
+            with metrics.stage("file"):
+                chunk_ids = self._run_ingest_stages(
+                    obj, tmp_dir, embedding_service, parse_pool, download_slots, embed_slots
+                )
+        except Exception:
+            metrics.file_finished("failed")
+            raise
+        metrics.file_finished("succeeded")
+        return chunk_ids
+
+    def _run_ingest_stages(
+        self,
+        obj: Dict[str, Any],
+        tmp_dir: str,
+        embedding_service: EmbeddingService,
+        parse_pool: Optional[ProcessPoolExecutor],
+        download_slots: ContextManager,
+        embed_slots: ContextManager
+    ) -> List[str]:
+        filename = obj["Key"]
+        pages = self._stored_pages(obj)
+        if pages is not None:
+            with embed_slots:
+                chunk_ids = embedding_service.process_pages(pages, source=filename)
+            logger.info("Successfully processed file from its stored page text: %s", filename)
+            return chunk_ids
+
+        if obj["Size"] > settings.INGEST_IN_MEMORY_MAX_BYTES:
+            return self._ingest_file_on_disk(
+                obj, tmp_dir, embedding_service, parse_pool, download_slots, embed_slots
+            )
+
+        # Small and medium objects are parsed from memory, skipping the disk round-trip
+        with download_slots:
+            body = self._read_object(filename, tmp_dir)
+        logger.info("Downloaded %s into memory", filename)
+
+        with body:
+            if parse_pool is None:
+                with embed_slots:
+                    if self.page_store is None:
+                        chunk_ids = embedding_service.process_stream(body, source=filename)
+                    else:
+                        pages = []
+                        chunk_ids = embedding_service.process_pages(
+                            _collect(iter_pdf_stream_pages(body, filename), pages), source=filename
+                        )
+                        self._save_pages(obj, pages)
+                logger.info("Successfully processed file: %s", filename)
+                return chunk_ids
+
+            # PyPDF parsing is CPU-bound and holds the GIL, so it runs in processes
+            with metrics.stage("parse"):
+                pages = parse_pool.submit(extract_pdf_pages_from_bytes, body.read(), filename).result()
+            metrics.record("parse", items=len(pages))
+        self._save_pages(obj, pages)
+
+        with embed_slots:
+            chunk_ids = embedding_service.process_pages(pages, source=filename)
+        logger.info("Successfully processed file: %s", filename)
+        return chunk_ids
+
+    def _ingest_file_on_disk(
+        self,
+        obj: Dict[str, Any],
+        tmp_dir: str,
+        embedding_service: EmbeddingService,
+        parse_pool: Optional[ProcessPoolExecutor],
+        download_slots: ContextManager,
+        embed_slots: ContextManager
+    ) -> List[str]:
+        filename = obj["Key"]
+        local_path = os.path.join(tmp_dir, filename)
+        try:
+            # Download file from S3/MinIO
+            with download_slots, metrics.stage("download"):
+                os.makedirs(os.path.dirname(local_path), exist_ok=True)
+                self.s3_client.download_file(self.bucket_name, filename, local_path)
+            metrics.record("download", items=1, nbytes=os.path.getsize(local_path))
+            logger.info("Downloaded %s to %s", filename, local_path)
+
+            # PyPDF parsing is CPU-bound and holds the GIL, so it runs in processes
+            if parse_pool is None:
+                pages = extract_pdf_pages(local_path)
+            else:
+                with metrics.stage("parse"):
+                    pages = parse_pool.submit(extract_pdf_pages, local_path).result()
+                metrics.record("parse", items=len(pages))
+        finally:
+            if os.path.exists(local_path):
+                os.remove(local_path)
+        self._save_pages(obj, pages)
+
+        with embed_slots:
+            chunk_ids = embedding_service.process_pages(pages, source=filename)
+        logger.info("Successfully processed file: %s", filename)
+        return chunk_ids
+
+    def _stored_pages(self, obj: Dict[str, Any]) -> Optional[List[Page]]:
+        if self.page_store is None:
+            return None
+        try:
+            with metrics.stage("page_store"):
+                pages = self.page_store.get(version_key(obj))
+        except Exception as e:
+            logger.warning("Could not read the stored page text of %s: %s", obj["Key"], e)
+            return None
+        if pages is not None:
+            metrics.record("page_store", items=len(pages))
+        return pages
+
+    def _save_pages(self, obj: Dict[str, Any], pages: List[Page]) -> None:
+        """Keep a file's extracted pages; failing to is not worth failing the file."""
+        if self.page_store is None:
+            return
+        try:
+            with metrics.stage("page_store"):
+                self.page_store.put(version_key(obj), pages)
+        except Exception as e:
+            logger.warning("Could not store the page text of %s: %s", obj["Key"], e)
+
+    def _read_object(self, filename: str, tmp_dir: str) -> BinaryIO:
+        """
+        Stream an object's body into a buffer that stays in memory up to
+        INGEST_IN_MEMORY_MAX_BYTES and spills to a temporary file beyond,
+        in case the object grew since it was listed.
+        """
+        buffer = tempfile.SpooledTemporaryFile(max_size=settings.INGEST_IN_MEMORY_MAX_BYTES, dir=tmp_dir)
+        try:
+            with metrics.stage("download"):
+                response = self.s3_client.get_object(Bucket=self.bucket_name, Key=filename)
+                for chunk in response["Body"].iter_chunks(OBJECT_READ_CHUNK_SIZE):
+                    buffer.write(chunk)
+            metrics.record("download", items=1, nbytes=buffer.tell())
+            buffer.seek(0)
+        except BaseException:
+            buffer.close()
+            raise
+        return buffer
+
+    @contextmanager
+    def _ingest_pools(self) -> Iterator[Tuple[ThreadPoolExecutor, Optional[ProcessPoolExecutor]]]:
+        ingest_pool = ThreadPoolExecutor(max_workers=self._ingest_capacity(), thread_name_prefix="ingest")
+
+        try:
+            yield ingest_pool, self._get_parse_pool()
+        finally:
+            ingest_pool.shutdown(wait=True, cancel_futures=True)
+
+    @staticmethod
+    def _ingest_capacity() -> int:
+        # One thread per in-flight file, enough to keep every stage busy
+        return (
+            max(settings.INGEST_DOWNLOAD_WORKERS, 1)
+            + max(settings.INGEST_PARSE_WORKERS, 1)
+            + max(settings.INGEST_EMBED_WORKERS, 1)
         )
 
-    def delete_file(self, filename: str, embedding_service: EmbeddingService) -> bool:
+    def _get_parse_pool(self) -> Optional[ProcessPoolExecutor]:
+        if settings.INGEST_PARSE_WORKERS <= 0:
+            return None
+
+        with self._parse_pool_lock:
+            if self._parse_pool is None:
+                self._parse_pool = ProcessPoolExecutor(
+                    max_workers=settings.INGEST_PARSE_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._parse_pool
+
+    def close(self) -> None:
+        with self._parse_pool_lock:
+            if self._parse_pool is not None:
+                self._parse_pool.shutdown(wait=True, cancel_futures=True)
+                self._parse_pool = None
+        with self._s3_client_lock:
+            if self._owns_s3_client and self._s3_client is not None:
+                self._s3_client.close()
+                self._s3_client = None
+
+    def delete_file(
+        self,
+        filename: str,
+        embedding_service: EmbeddingService,
+        manifest: Optional[SyncManifest] = None,
+        lease_store: Optional[LeaseStore] = None
+    ) -> bool:
         """
         Delete a file from S3/MinIO and remove its corresponding embeddings.
         """
         try:
             # 1. Delete embeddings by source (filename)
-            embedding_service.vector_store.delete_by_source(filename)
+            embedding_service.delete_by_source(filename)
 
             # 2. Delete file from S3/MinIO
             self.s3_client.delete_object(Bucket=self.bucket_name, Key=filename)
             logger.info("Deleted file '%s' from S3 bucket '%s'", filename, self.bucket_name)
 
+            # 3. Forget it was ingested, so a re-upload of the same content is ingested again
+            if manifest is not None:
+                manifest.remove(filename)
+            if lease_store is not None:
+                lease_store.forget([filename])
+
             return True
 
         except Exception as e:
             error_msg = f"Failed to delete file {filename}: {str(e)}"
             logger.error(error_msg)
             raise HTTPException(status_code=500, detail=error_msg)
+
+
+    def delete_files(
+        self,
+        filenames: Iterable[str],
+        embedding_service: EmbeddingService,
+        manifest: Optional[SyncManifest] = None,
+        lease_store: Optional[LeaseStore] = None
+    ) -> BulkDeleteResponse:
+        """
+        Delete many files from S3/MinIO along with their embeddings,
+        manifest entries and work items. Files are deleted in batches,
+        several at a time.
+        """
+        deleted: List[str] = []
+        errors: List[Dict[str, str]] = []
+        batches = _batched(filenames, DELETE_BATCH_SIZE)
+        in_flight: Set[Future] = set()
+
+        with ThreadPoolExecutor(max_workers=settings.DELETE_CONCURRENCY, thread_name_prefix="delete") as pool:
+            while True:
+                # Bounded, so deleting by prefix doesn't list the whole prefix up front
+                for batch in islice(batches, settings.DELETE_CONCURRENCY - len(in_flight)):
+                    in_flight.add(pool.submit(self._delete_batch, batch, embedding_service, manifest, lease_store))
+                if not in_flight:
+                    break
+
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    batch_deleted, batch_errors = future.result()
+                    deleted.extend(batch_deleted)
+                    errors.extend(batch_errors)
+
+        logger.info("Deleted %d file(s), %d failed", len(deleted), len(errors))
+        return BulkDeleteResponse(
+            deleted=deleted,
+            failed=errors,
+            message=f"Deleted {len(deleted)} file(s)"
+        )
+
+    def delete_prefix(
+        self,
+        prefix: str,
+        embedding_service: EmbeddingService,
+        manifest: Optional[SyncManifest] = None,
+        lease_store: Optional[LeaseStore] = None
+    ) -> BulkDeleteResponse:
+        """Delete every PDF under ``prefix`` and its embeddings."""
+        keys = (obj["Key"] for obj in self.iter_pdf_objects(prefix))
+        return self.delete_files(keys, embedding_service, manifest, lease_store)
+
+    def _delete_batch(
+        self,
+        filenames: List[str],
+        embedding_service: EmbeddingService,
+        manifest: Optional[SyncManifest],
+        lease_store: Optional[LeaseStore] = None
+    ) -> Tuple[List[str], List[Dict[str, str]]]:
+        try:
+            embedding_service.delete_by_sources(filenames)
+            response = self.s3_client.delete_objects(
+                Bucket=self.bucket_name,
+                Delete={"Objects": [{"Key": filename} for filename in filenames], "Quiet": True}
+            )
+        except Exception as e:
+            logger.error("Failed to delete batch of %d files: %s", len(filenames), e)
+            return [], [{filename: str(e)} for filename in filenames]
+
+        failed = {
+            error["Key"]: error.get("Message", error.get("Code", "Unknown error"))
+            for error in response.get("Errors", [])
+        }
+        deleted = [filename for filename in filenames if filename not in failed]
+        if manifest is not None:
+            manifest.remove_many(deleted)
+        # Completed work items would otherwise keep a re-upload of the same content from being claimed
+        if lease_store is not None:
+            lease_store.forget(deleted)
+        return deleted, [{filename: message} for filename, message in failed.items()]
+
+class SyncPlan:
+    """
+    Iterates over the listed objects that are new or modified, counting
+    unchanged ones and collecting the set of listed keys so deleted objects
+    can be found once the listing is exhausted.
+    """
+
+    def __init__(self, pdf_objects: Iterable[Dict[str, Any]], versions: Dict[str, Tuple[str, int]]):
+        self.pdf_objects = pdf_objects
+        self.versions = versions
+        self.seen: Set[str] = set()
+        self.skipped = 0
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for obj in self.pdf_objects:
+            self.seen.add(obj["Key"])
+            if self.versions.get(obj["Key"]) == (obj["ETag"], obj["Size"]):
+                self.skipped += 1
+            else:
+                yield obj
+
+    def deleted(self, start_after: Optional[str] = None) -> List[str]:
+        """Recorded keys that weren't listed, past the listing's ``start_after`` cursor."""
+        return sorted(
+            key for key in self.versions.keys() - self.seen
+            if not start_after or key > start_after
+        )
+
+
+def _collect(pages: Iterable[Page], collected: List[Page]) -> Iterator[Page]:
+    for page in pages:
+        collected.append(page)
+        yield page
+
+
+def _batched(items: Iterable[str], size: int) -> Iterator[List[str]]:
+    items = iter(items)
+    while batch := list(islice(items, size)):
+        yield batch
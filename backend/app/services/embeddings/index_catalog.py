@@ -0,0 +1,58 @@
+"""Contains the catalog of active indexes"""
+
+import time
+import sqlite3
+import threading
+from typing import Optional
+
+from backend.app.schemas.index_schema import IndexSpec
+
+
+class IndexCatalog:
+    """
+    Records which index serves each alias, the collection name derived
+    from the base collection name and embedding model. Re-indexing builds
+    a new collection and switches the alias to it; earlier collections are
+    left in place.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS active_indexes (
+                alias TEXT PRIMARY KEY,
+                collection TEXT NOT NULL,
+                chunk_size INTEGER NOT NULL,
+                chunk_overlap INTEGER NOT NULL,
+                activated_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    def active(self, alias: str) -> Optional[IndexSpec]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT collection, chunk_size, chunk_overlap FROM active_indexes WHERE alias = ?",
+                (alias,)
+            ).fetchone()
+        if row is None:
+            return None
+        collection, chunk_size, chunk_overlap = row
+        return IndexSpec(collection=collection, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+    def activate(self, alias: str, spec: IndexSpec) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO active_indexes VALUES (?, ?, ?, ?, ?)",
+                (alias, spec.collection, spec.chunk_size, spec.chunk_overlap, time.time())
+            )
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,424 @@
+"""Contains the embedded, memory-mapped vector store"""
+
+import os
+import json
+import glob
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from backend.app.domain.protocols import (
+    VectorStoreProtocol,
+    DocumentChunk,
+    SearchResult
+)
+from backend.app.services.embeddings.vector_store_events import ChangeNotifier, chunk_sources
+from backend.app.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Rows scored per matrix product during exact search
+SEARCH_BLOCK_ROWS = 65536
+# Rows sampled to train IVF centroids, per list
+IVF_TRAINING_ROWS_PER_LIST = 40
+IVF_TRAINING_ITERATIONS = 10
+
+
+class LocalVectorStore(ChangeNotifier, VectorStoreProtocol):
+    """
+    In-process vector store for deployments without a Chroma server.
+
+    Embeddings are appended to a float32 file that is memory-mapped for
+    search; IDs, documents and metadata live in a SQLite sidecar keyed by
+    row. Deletes and upserts leave tombstones, and the file is compacted
+    into a new generation once more than ``compact_ratio`` of the rows are
+    dead. Collections of up to ``ivf_threshold`` live rows are searched
+    exactly; larger ones through an inverted-file index probing ``nprobe``
+    of its lists.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ivf_threshold: int = 50_000,
+        nprobe: int = 8,
+        compact_ratio: float = 0.25
+    ):
+        self.path = path
+        self.ivf_threshold = ivf_threshold
+        self.nprobe = nprobe
+        self.compact_ratio = compact_ratio
+        self._lock = threading.RLock()
+        os.makedirs(path, exist_ok=True)
+
+        self._conn = sqlite3.connect(os.path.join(path, "rows.sqlite3"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS rows (
+                row INTEGER PRIMARY KEY,
+                id TEXT NOT NULL,
+                source TEXT,
+                document TEXT NOT NULL,
+                metadata TEXT NOT NULL,
+                deleted INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_rows_id ON rows(id) WHERE deleted = 0;
+            CREATE INDEX IF NOT EXISTS idx_rows_source ON rows(source) WHERE deleted = 0;
+            CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            """
+        )
+        self._conn.commit()
+
+        stored = dict(self._conn.execute("SELECT key, value FROM settings").fetchall())
+        self.dim: Optional[int] = int(stored["dim"]) if "dim" in stored else None
+        self.generation = int(stored.get("generation", 0))
+        self._matrix: Optional[np.ndarray] = None
+        self._ivf: Optional["_IVFIndex"] = None
+        self._count = self._recover()
+        self._deleted = np.zeros(self._count, dtype=bool)
+        dead = [row for row, in self._conn.execute("SELECT row FROM rows WHERE deleted = 1")]
+        self._deleted[dead] = True
+        logger.info("Opened local vector store %s with %d rows (%d deleted)", path, self._count, len(dead))
+
+    @property
+    def vectors_path(self) -> str:
+        return os.path.join(self.path, f"vectors-{self.generation}.f32")
+
+    def add_documents(self, chunks: List[DocumentChunk], embeddings: np.ndarray) -> None:
+        if len(chunks) != len(embeddings):
+            raise ValueError(f"Mismatch between chunks ({len(chunks)}) and embeddings ({len(embeddings)})")
+        if not chunks:
+            return
+
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        with metrics.stage("upsert"), self._lock:
+            if self.dim is None:
+                self.dim = embeddings.shape[1]
+                self._set_setting("dim", self.dim)
+            elif embeddings.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {embeddings.shape[1]} does not match store dimension {self.dim}")
+
+            # Vectors are written before their rows, so a crash never leaves rows without vectors
+            with open(self.vectors_path, "ab") as f:
+                f.write(embeddings.tobytes())
+
+            start = self._count
+            replaced = self._live_rows("id", [chunk.id for chunk in chunks])
+            with self._conn:
+                self._conn.executemany("UPDATE rows SET deleted = 1 WHERE row = ?", [(row,) for row in replaced])
+                self._conn.executemany(
+                    "INSERT INTO rows (row, id, source, document, metadata) VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (start + i, chunk.id, chunk.metadata.get("source"), chunk.content, json.dumps(chunk.metadata))
+                        for i, chunk in enumerate(chunks)
+                    ]
+                )
+
+            self._count += len(chunks)
+            self._deleted = np.concatenate([self._deleted, np.zeros(len(chunks), dtype=bool)])
+            self._deleted[replaced] = True
+            self._matrix = None
+            self._maybe_compact()
+        metrics.record("upsert", items=len(chunks), nbytes=embeddings.nbytes)
+        self._notify_change(chunk_sources(chunks), embeddings)
+
+    def delete_ids(self, ids: List[str]) -> None:
+        self._tombstone("id", ids)
+
+    def delete_by_source(self, source: str) -> None:
+        self._tombstone("source", [source])
+
+    def delete_by_sources(self, sources: List[str]) -> None:
+        self._tombstone("source", sources)
+
+    def search(
+        self,
+        query_embedding: np.ndarray,
+        top_k: int = 5,
+        where: Optional[Dict[str, Any]] = None
+    ) -> List[SearchResult]:
+        """Top-k chunks by inner product with the query, optionally filtered on metadata."""
+        query = np.ascontiguousarray(query_embedding, dtype=np.float32).ravel()
+        if top_k <= 0:
+            return []
+
+        with metrics.stage("vector_search"):
+            return self._search(query, top_k, where)
+
+    def _search(self, query: np.ndarray, top_k: int, where: Optional[Dict[str, Any]]) -> List[SearchResult]:
+        while True:
+            with self._lock:
+                matrix = self._get_matrix()
+                deleted = self._deleted
+                generation = self.generation
+                if where:
+                    candidates = self._filter_rows(where)
+                else:
+                    candidates = self._ivf_candidates(matrix, query)
+            if matrix is None:
+                return []
+
+            # Scoring runs outside the lock; rows are only renumbered by compaction
+            rows, scores = _top_k(matrix, query, candidates, deleted, top_k)
+            results = self._results(rows, scores, generation)
+            if results is not None:
+                return results
+
+    def get_documents(self, ids: List[str], where: Optional[Dict[str, Any]] = None) -> List[SearchResult]:
+        """Chunks with the given IDs that match ``where``, in the order of ``ids``, scored 0."""
+        with self._lock:
+            rows = self._live_rows("id", ids)
+            if where and rows:
+                rows = np.intersect1d(rows, self._filter_rows(where))
+            results = self._results(np.asarray(rows, dtype=np.int64), np.zeros(len(rows)), self.generation) or []
+        found = {result.id: result for result in results}
+        return [found[chunk_id] for chunk_id in ids if chunk_id in found]
+
+    def get_embeddings(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        """Stored embeddings of the chunks with the given IDs, by ID."""
+        found = {}
+        with self._lock:
+            for i in range(0, len(ids), 500):
+                batch = ids[i:i + 500]
+                found.update(self._conn.execute(
+                    f"SELECT id, row FROM rows WHERE deleted = 0 AND id IN ({','.join('?' * len(batch))})",
+                    batch
+                ))
+            matrix = self._get_matrix()
+            return {chunk_id: np.array(matrix[row]) for chunk_id, row in found.items()}
+
+    @staticmethod
+    def similarity(embeddings: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        """Search scores of embeddings against queries: their inner products."""
+        return np.atleast_2d(embeddings) @ np.atleast_2d(queries).T
+
+    def compact(self) -> None:
+        """Rewrite the live rows into a new generation of the vector file."""
+        with self._lock:
+            matrix = self._get_matrix()
+            live = np.flatnonzero(~self._deleted)
+            generation = self.generation + 1
+            new_path = os.path.join(self.path, f"vectors-{generation}.f32")
+
+            with open(new_path, "wb") as f:
+                for i in range(0, len(live), SEARCH_BLOCK_ROWS):
+                    f.write(np.ascontiguousarray(matrix[live[i:i + SEARCH_BLOCK_ROWS]]).tobytes())
+
+            # Rows move down in order, so each target row is already free
+            with self._conn:
+                self._conn.execute("DELETE FROM rows WHERE deleted = 1")
+                self._conn.executemany(
+                    "UPDATE rows SET row = ? WHERE row = ?",
+                    [(new, int(old)) for new, old in enumerate(live) if new != old]
+                )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO settings VALUES ('generation', ?)", (str(generation),)
+                )
+
+            old_path = self.vectors_path
+            self.generation = generation
+            self._count = len(live)
+            self._deleted = np.zeros(self._count, dtype=bool)
+            self._matrix = None
+            self._ivf = None
+            os.remove(old_path)
+            logger.info("Compacted local vector store %s to %d rows", self.path, self._count)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "rows": self._count,
+                "deleted": int(self._deleted.sum()),
+                "dim": self.dim,
+                "ivf_lists": len(self._ivf.centroids) if self._ivf is not None else 0
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._matrix = None
+            self._conn.close()
+
+    def _recover(self) -> int:
+        """Reconcile the vector file with the sidecar after an interrupted write."""
+        for path in glob.glob(os.path.join(self.path, "vectors-*.f32")):
+            if path != self.vectors_path:
+                os.remove(path)
+
+        rows = self._conn.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM rows").fetchone()[0]
+        if self.dim is None or not os.path.exists(self.vectors_path):
+            return 0
+
+        row_bytes = self.dim * 4
+        stored = os.path.getsize(self.vectors_path) // row_bytes
+        if stored > rows:
+            with open(self.vectors_path, "r+b") as f:
+                f.truncate(rows * row_bytes)
+        elif stored < rows:
+            with self._conn:
+                self._conn.execute("DELETE FROM rows WHERE row >= ?", (stored,))
+            rows = stored
+        return rows
+
+    def _get_matrix(self) -> Optional[np.ndarray]:
+        if self._matrix is None and self._count:
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(self._count, self.dim))
+        return self._matrix
+
+    def _ivf_candidates(self, matrix: Optional[np.ndarray], query: np.ndarray) -> Optional[np.ndarray]:
+        """Rows to score through the IVF index, or None to scan everything."""
+        if matrix is None or self._count - int(self._deleted.sum()) <= self.ivf_threshold:
+            return None
+
+        # Rows appended since the index was built are scanned exactly until it is rebuilt
+        if self._ivf is None or self._count - self._ivf.rows > 0.2 * self._ivf.rows:
+            self._ivf = _IVFIndex.build(matrix, self._deleted)
+        candidates = self._ivf.candidates(query, self.nprobe)
+        tail = np.arange(self._ivf.rows, self._count)
+        return np.concatenate([candidates, tail]) if len(tail) else candidates
+
+    def _filter_rows(self, where: Dict[str, Any]) -> np.ndarray:
+        clauses, params = [], []
+        for key, value in where.items():
+            column = "source" if key == "source" else "json_extract(metadata, ?)"
+            if key != "source":
+                params.append(f"$.{key}")
+            if isinstance(value, dict) and "$in" in value:
+                clauses.append(f"{column} IN ({','.join('?' * len(value['$in']))})")
+                params.extend(value["$in"])
+            else:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+
+        rows = self._conn.execute(
+            f"SELECT row FROM rows WHERE deleted = 0 AND {' AND '.join(clauses)}",
+            params
+        ).fetchall()
+        return np.array([row for row, in rows], dtype=np.int64)
+
+    def _results(self, rows: np.ndarray, scores: np.ndarray, generation: int) -> Optional[List[SearchResult]]:
+        """Results for the rows, or None if the store was compacted since they were scored."""
+        if not len(rows):
+            return []
+        with self._lock:
+            if generation != self.generation:
+                return None
+            fetched = {
+                row: (chunk_id, document, metadata)
+                for row, chunk_id, document, metadata in self._conn.execute(
+                    f"SELECT row, id, document, metadata FROM rows WHERE row IN ({','.join('?' * len(rows))})",
+                    [int(row) for row in rows]
+                )
+            }
+
+        results = []
+        for row, score in zip(rows, scores):
+            chunk_id, document, metadata = fetched[int(row)]
+            results.append(SearchResult(id=chunk_id, content=document, metadata=json.loads(metadata), score=float(score)))
+        return results
+
+    def _live_rows(self, column: str, values: List[str]) -> List[int]:
+        rows: List[int] = []
+        for i in range(0, len(values), 500):
+            batch = values[i:i + 500]
+            rows.extend(
+                row for row, in self._conn.execute(
+                    f"SELECT row FROM rows WHERE deleted = 0 AND {column} IN ({','.join('?' * len(batch))})",
+                    batch
+                )
+            )
+        return rows
+
+    def _tombstone(self, column: str, values: List[str]) -> None:
+        if not values:
+            return
+        with self._lock:
+            rows = self._live_rows(column, values)
+            with self._conn:
+                self._conn.executemany("UPDATE rows SET deleted = 1 WHERE row = ?", [(row,) for row in rows])
+            self._deleted[rows] = True
+            logger.info("Deleted %d chunks from local vector store %s", len(rows), self.path)
+            self._maybe_compact()
+        self._notify_change(values if column == "source" else None)
+
+    def _maybe_compact(self) -> None:
+        if self._count and self._deleted.sum() > self.compact_ratio * self._count:
+            self.compact()
+
+    def _set_setting(self, key: str, value: Any) -> None:
+        with self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO settings VALUES (?, ?)", (key, str(value)))
+
+
+class _IVFIndex:
+    """Inverted-file index: rows grouped by their nearest of ~sqrt(n) centroids."""
+
+    def __init__(self, centroids: np.ndarray, order: np.ndarray, offsets: np.ndarray, rows: int):
+        self.centroids = centroids
+        self.order = order
+        self.offsets = offsets
+        # Rows covered by the index; later rows are scanned exactly
+        self.rows = rows
+
+    @classmethod
+    def build(cls, matrix: np.ndarray, deleted: np.ndarray) -> "_IVFIndex":
+        live = np.flatnonzero(~deleted)
+        nlist = max(1, int(np.sqrt(len(live))))
+        rng = np.random.default_rng(0)
+        sample = matrix[np.sort(rng.choice(live, min(len(live), nlist * IVF_TRAINING_ROWS_PER_LIST), replace=False))]
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+
+        for _ in range(IVF_TRAINING_ITERATIONS):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for i in range(nlist):
+                members = sample[assignment == i]
+                if len(members):
+                    centroids[i] = members.mean(axis=0)
+
+        assignment = np.empty(len(live), dtype=np.int32)
+        for i in range(0, len(live), SEARCH_BLOCK_ROWS):
+            assignment[i:i + SEARCH_BLOCK_ROWS] = np.argmax(matrix[live[i:i + SEARCH_BLOCK_ROWS]] @ centroids.T, axis=1)
+
+        by_list = np.argsort(assignment, kind="stable")
+        offsets = np.searchsorted(assignment[by_list], np.arange(nlist + 1))
+        logger.info("Built IVF index with %d lists over %d rows", nlist, len(live))
+        return cls(centroids, live[by_list], offsets, len(deleted))
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        nprobe = min(nprobe, len(self.centroids))
+        lists = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        return np.concatenate([self.order[self.offsets[i]:self.offsets[i + 1]] for i in lists])
+
+
+def _top_k(
+    matrix: np.ndarray,
+    query: np.ndarray,
+    candidates: Optional[np.ndarray],
+    deleted: np.ndarray,
+    top_k: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Best rows and their scores, skipping tombstones."""
+    if candidates is None:
+        # Full scan over contiguous blocks of the memmap, without gathering rows
+        scores = np.empty(len(matrix), dtype=np.float32)
+        for i in range(0, len(matrix), SEARCH_BLOCK_ROWS):
+            scores[i:i + SEARCH_BLOCK_ROWS] = matrix[i:i + SEARCH_BLOCK_ROWS] @ query
+        candidates = np.flatnonzero(~deleted[:len(matrix)])
+        scores = scores[candidates]
+    else:
+        candidates = candidates[candidates < len(matrix)]
+        candidates = candidates[~deleted[candidates]]
+        scores = np.empty(len(candidates), dtype=np.float32)
+        for i in range(0, len(candidates), SEARCH_BLOCK_ROWS):
+            scores[i:i + SEARCH_BLOCK_ROWS] = matrix[candidates[i:i + SEARCH_BLOCK_ROWS]] @ query
+
+    if not len(candidates):
+        return candidates, scores
+
+    k = min(top_k, len(candidates))
+    best = np.argpartition(-scores, k - 1)[:k]
+    best = best[np.argsort(-scores[best])]
+    return candidates[best], scores[best]
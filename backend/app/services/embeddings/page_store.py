@@ -0,0 +1,101 @@
+"""Contains the store of text extracted from PDFs"""
+
+import json
+import time
+import zlib
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+from backend.app.services.embeddings.document_loader import Page
+
+logger = logging.getLogger(__name__)
+
+
+def version_key(obj: Dict[str, Any]) -> str:
+    """
+    Key of an object's content: its ETag, which S3 derives from the content
+    (the MD5 for single-part uploads), and its size, both known from a
+    listing without downloading the object.
+    """
+    return f'{obj["ETag"].strip(chr(34))}:{obj["Size"]}'
+
+
+class PageStore:
+    """
+    Page text extracted from PDFs, stored once per object version as
+    zlib-compressed JSON in SQLite, so re-chunking, model changes and
+    re-indexing skip downloading and parsing the PDFs again.
+    """
+
+    def __init__(self, path: str, compression_level: int = 6):
+        self.path = path
+        self.compression_level = compression_level
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                key TEXT PRIMARY KEY,
+                page_count INTEGER NOT NULL,
+                text_bytes INTEGER NOT NULL,
+                data BLOB NOT NULL,
+                stored_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[List[Page]]:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM pages WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return [(text, {"page": page}) for page, text in json.loads(zlib.decompress(row[0]))]
+
+    def put(self, key: str, pages: List[Page]) -> None:
+        encoded = json.dumps(
+            [[metadata.get("page", i), text] for i, (text, metadata) in enumerate(pages)],
+            ensure_ascii=False,
+            separators=(",", ":")
+        ).encode("utf-8")
+        # Compressed outside the lock
+        data = zlib.compress(encoded, self.compression_level)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)",
+                (key, len(pages), len(encoded), data, time.time())
+            )
+            self._conn.commit()
+
+    def prune(self, keep: Iterable[str]) -> int:
+        """Delete the pages of every version not in ``keep``. Returns how many were deleted."""
+        keep = set(keep)
+        with self._lock:
+            stale = [key for (key,) in self._conn.execute("SELECT key FROM pages") if key not in keep]
+            self._conn.executemany("DELETE FROM pages WHERE key = ?", [(key,) for key in stale])
+            self._conn.commit()
+        if stale:
+            logger.info("Pruned stored pages of %d object versions", len(stale))
+        return len(stale)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            objects, pages, text_bytes, stored_bytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(page_count), 0), COALESCE(SUM(text_bytes), 0), "
+                "COALESCE(SUM(LENGTH(data)), 0) FROM pages"
+            ).fetchone()
+        return {
+            "objects": objects,
+            "pages": pages,
+            "text_bytes": text_bytes,
+            "stored_bytes": stored_bytes,
+            "compression_ratio": text_bytes / stored_bytes if stored_bytes else 0.0
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,124 @@
+"""Contains the manifest of ingested bucket objects"""
+
+import json
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+
+class ManifestEntry(BaseModel):
+    key: str
+    etag: str
+    size: int
+    last_modified: str
+    chunk_ids: List[str] = Field(default_factory=list)
+
+
+class SyncManifest:
+    """
+    Records, per collection, the version of every ingested object and the
+    chunk IDs it produced, so unchanged objects can be skipped.
+    """
+
+    def __init__(self, path: str, collection_name: str):
+        self.path = path
+        self.collection_name = collection_name
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS objects (
+                collection TEXT NOT NULL,
+                key TEXT NOT NULL,
+                etag TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_modified TEXT NOT NULL,
+                chunk_ids TEXT NOT NULL,
+                PRIMARY KEY (collection, key)
+            )
+            """
+        )
+        self._conn.commit()
+
+    def load(self) -> Dict[str, ManifestEntry]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, etag, size, last_modified, chunk_ids FROM objects WHERE collection = ?",
+                (self.collection_name,)
+            ).fetchall()
+
+        return {
+            key: ManifestEntry(
+                key=key,
+                etag=etag,
+                size=size,
+                last_modified=last_modified,
+                chunk_ids=json.loads(chunk_ids)
+            )
+            for key, etag, size, last_modified, chunk_ids in rows
+        }
+
+    def versions(self, prefix: str = "") -> Dict[str, Tuple[str, int]]:
+        """ETag and size of every recorded key under ``prefix``, without chunk IDs."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, etag, size FROM objects WHERE collection = ? AND substr(key, 1, ?) = ?",
+                (self.collection_name, len(prefix), prefix)
+            ).fetchall()
+        return {key: (etag, size) for key, etag, size in rows}
+
+    def get(self, key: str) -> Optional[ManifestEntry]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT key, etag, size, last_modified, chunk_ids FROM objects WHERE collection = ? AND key = ?",
+                (self.collection_name, key)
+            ).fetchone()
+
+        if row is None:
+            return None
+        key, etag, size, last_modified, chunk_ids = row
+        return ManifestEntry(
+            key=key,
+            etag=etag,
+            size=size,
+            last_modified=last_modified,
+            chunk_ids=json.loads(chunk_ids)
+        )
+
+    def record(self, entry: ManifestEntry) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    self.collection_name,
+                    entry.key,
+                    entry.etag,
+                    entry.size,
+                    entry.last_modified,
+                    json.dumps(entry.chunk_ids)
+                )
+            )
+            self._conn.commit()
+
+    def remove(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM objects WHERE collection = ? AND key = ?",
+                (self.collection_name, key)
+            )
+            self._conn.commit()
+
+    def remove_many(self, keys: List[str]) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM objects WHERE collection = ? AND key = ?",
+                [(self.collection_name, key) for key in keys]
+            )
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
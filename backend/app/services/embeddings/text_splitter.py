@@ -0,0 +1,96 @@
+"""Contains token-aware text splitter"""
+
+from bisect import bisect_left
+from typing import List, Sequence, Tuple
+
+from backend.app.domain.protocols import TokenizerProtocol
+
+
+class TokenOffsetTextSplitter:
+    """
+    Splits text into chunks of at most ``chunk_size`` tokens.
+
+    The text is tokenized once and chunks are cut straight from the token
+    offsets, preferring to end a chunk on the highest priority separator
+    that fits, the same way RecursiveCharacterTextSplitter would.
+    """
+
+    def __init__(
+        self,
+        tokenizer: TokenizerProtocol,
+        chunk_size: int = 256,
+        chunk_overlap: int = 50,
+        separators: Sequence[str] = ("\n\n", "\n", " ")
+    ):
+        if chunk_size <= chunk_overlap:
+            raise ValueError("chunk_size must be greater than chunk_overlap")
+
+        self.tokenizer = tokenizer
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separators = [sep for sep in separators if sep]
+
+    def split_text(self, text: str) -> List[Tuple[str, int]]:
+        """Return (content, token_count) pairs for every chunk of text."""
+        offsets = self.tokenizer.token_offsets(text)
+        return self.split_offsets(text, offsets)
+
+    def split_offsets(self, text: str, offsets: List[Tuple[int, int]]) -> List[Tuple[str, int]]:
+        """Cut chunks from text given the character span of every token."""
+        total = len(offsets)
+        starts = [start for start, _ in offsets]
+        chunks = []
+
+        begin = 0
+        end = 0
+        while begin < total:
+            limit = min(begin + self.chunk_size, total)
+            # A chunk must reach past the previous one, not just repeat its overlap
+            floor = max(begin, end)
+            end = limit if limit == total else self._find_cut(text, offsets, starts, begin, floor, limit)
+
+            content = text[offsets[begin][0]:offsets[end - 1][1]].strip()
+            if content:
+                chunks.append((content, end - begin))
+
+            if end >= total:
+                break
+            begin = self._next_begin(text, offsets, begin, end)
+
+        return chunks
+
+    def _find_cut(
+        self,
+        text: str,
+        offsets: List[Tuple[int, int]],
+        starts: List[int],
+        begin: int,
+        floor: int,
+        limit: int
+    ) -> int:
+        """Index of the first token of the next chunk."""
+        low = offsets[begin][1]
+        high = offsets[limit][0]
+
+        for separator in self.separators:
+            position = text.rfind(separator, low, high)
+            if position == -1:
+                continue
+            cut = bisect_left(starts, position + len(separator))
+            if floor < cut <= limit:
+                return cut
+
+        return limit
+
+    def _next_begin(self, text: str, offsets: List[Tuple[int, int]], begin: int, end: int) -> int:
+        """Index of the first token of the chunk after [begin, end)."""
+        if end - begin <= self.chunk_overlap:
+            return end
+
+        candidate = end - self.chunk_overlap
+        # Start the overlap on a word boundary rather than mid-word
+        for index in range(candidate, end):
+            start = offsets[index][0]
+            if start == 0 or text[start - 1].isspace():
+                return index
+        return candidate
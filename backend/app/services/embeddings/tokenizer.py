@@ -1,38 +1,114 @@
 """Contains tokenizer services"""
 
+import os
+import re
+import time
+import hashlib
 import logging
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
 import requests
-from tenacity import retry, stop_after_attempt, wait_exponential
 from backend.app.domain.protocols import TokenizerProtocol
+from backend.app.utils import metrics
 
 logger = logging.getLogger(__name__)
 
+# Rough stand-in for a subword vocabulary: words are cut into pieces of at
+# most four characters and every punctuation mark is its own token.
+_FALLBACK_TOKEN_PATTERN = re.compile(r"\w{1,4}|[^\w\s]")
+
+
+class FallbackCount(int):
+    """Token count estimated without the tokenizer; not to be cached."""
+
+
+class FallbackOffsets(list):
+    """Token offsets estimated without the tokenizer; not to be cached."""
+
 
 class TEITokenizer(TokenizerProtocol):
-    def __init__(self, tokenize_url: str, timeout: int = 5):
+    def __init__(
+        self,
+        tokenize_url: str,
+        timeout: int = 5,
+        batch_size: int = 32,
+        cooldown: float = 30.0
+    ):
         self.tokenize_url = tokenize_url
         self.timeout = timeout
+        # TEI rejects requests with more inputs than its max client batch size
+        self.batch_size = batch_size
+        # After a failure, skip TEI for a while instead of waiting on every call
+        self.cooldown = cooldown
+        self._session = requests.Session()
+        self._unavailable_until = 0.0
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, max=10))
     def count_tokens(self, text: str) -> int:
         if not text or not text.strip():
             return 1
 
         clean_text = text.strip()
+        result = self._tokenize([clean_text], add_special_tokens=True)
+        if result is None:
+            return self._fallback_token_count(clean_text)
+        return self._parse_tokenize_response(result)
 
-        try:
-            response = requests.post(
-                self.tokenize_url,
-                json={"inputs": clean_text},
-                timeout=self.timeout
-            )
-            response.raise_for_status()
-            result = response.json()
+    def token_offsets(self, text: str) -> List[Tuple[int, int]]:
+        """
+        Tokenize text once and return the (start, stop) character span of
+        every non-special token.
+        """
+        return self.token_offsets_batch([text])[0]
+
+    def token_offsets_batch(self, texts: List[str]) -> List[List[Tuple[int, int]]]:
+        """Token offsets for many texts, sending one request per batch_size texts."""
+        offsets: List[List[Tuple[int, int]]] = [[] for _ in texts]
+        pending = [i for i, text in enumerate(texts) if text and text.strip()]
+
+        for start in range(0, len(pending), self.batch_size):
+            indices = pending[start:start + self.batch_size]
+            batch = [texts[i] for i in indices]
+            result = self._tokenize(batch, add_special_tokens=False)
+
+            if not isinstance(result, list) or len(result) != len(batch):
+                if result is not None:
+                    logger.warning("Unexpected tokenize response (using fallback offsets): %s", result)
+                for i in indices:
+                    offsets[i] = self._fallback_offsets(texts[i])
+                continue
+
+            for i, tokens in zip(indices, result):
+                offsets[i] = self._parse_offsets_response(texts[i], tokens)
+
+        return offsets
+
+    def close(self) -> None:
+        self._session.close()
 
-            return self._parse_tokenize_response(result)
+    def _tokenize(self, inputs: List[str], add_special_tokens: bool) -> Optional[Any]:
+        """POST to /tokenize, or None when TEI is unavailable."""
+        if time.monotonic() < self._unavailable_until:
+            return None
+
+        try:
+            with metrics.stage("tokenize"):
+                response = self._session.post(
+                    self.tokenize_url,
+                    json={"inputs": inputs, "add_special_tokens": add_special_tokens},
+                    timeout=self.timeout
+                )
+                response.raise_for_status()
+            metrics.record("tokenize", items=len(inputs), nbytes=len(response.content))
+            return response.json()
         except Exception as e:
-            logger.warning("Tokenization failed (using fallback): %s", e)
-            return self._fallback_token_count(clean_text)
+            logger.warning(
+                "Tokenization failed, using fallback for the next %.0fs: %s", self.cooldown, e
+            )
+            self._unavailable_until = time.monotonic() + self.cooldown
+            return None
 
     def _parse_tokenize_response(self, result) -> int:
         if isinstance(result, list):
@@ -46,7 +122,187 @@ class TEITokenizer(TokenizerProtocol):
         logger.warning("Unexpected tokenize response: %s", result)
         return 1
 
+    def _parse_offsets_response(self, text: str, result) -> List[Tuple[int, int]]:
+        if not isinstance(result, list) or (result and not isinstance(result[0], dict)):
+            logger.warning("Unexpected tokenize response (using fallback offsets): %s", result)
+            return self._fallback_offsets(text)
+
+        # TEI reports offsets into the UTF-8 encoded input
+        to_char = _byte_to_char_index(text)
+        return [
+            (to_char(token["start"]), to_char(token["stop"]))
+            for token in result
+            if not token.get("special") and token.get("start") is not None
+        ]
+
     def _fallback_token_count(self, text: str) -> int:
         word_count = len(text.split())
         char_estimate = len(text) / 4.0  # ~4 chars per token
-        return int(max(word_count, char_estimate)) + 10  # conservative buffer
\ No newline at end of file
+        return FallbackCount(int(max(word_count, char_estimate)) + 10)  # conservative buffer
+
+    def _fallback_offsets(self, text: str) -> List[Tuple[int, int]]:
+        return FallbackOffsets(match.span() for match in _FALLBACK_TOKEN_PATTERN.finditer(text))
+
+
+class LocalTokenizer(TokenizerProtocol):
+    """
+    In-process tokenizer loaded from a Hugging Face tokenizer.json.
+    Makes no network calls.
+    """
+
+    def __init__(self, tokenizer_path: str):
+        try:
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise ImportError("LocalTokenizer requires the 'tokenizers' package") from e
+
+        if os.path.isdir(tokenizer_path):
+            tokenizer_path = os.path.join(tokenizer_path, "tokenizer.json")
+
+        self.tokenizer_path = tokenizer_path
+        self._tokenizer = Tokenizer.from_file(tokenizer_path)
+        # Chunks are measured without padding or truncation
+        self._tokenizer.no_padding()
+        self._tokenizer.no_truncation()
+        logger.info("Loaded local tokenizer from %s", tokenizer_path)
+
+    def count_tokens(self, text: str) -> int:
+        if not text or not text.strip():
+            return 1
+        return len(self._tokenizer.encode(text.strip()).ids)
+
+    def token_offsets(self, text: str) -> List[Tuple[int, int]]:
+        return self.token_offsets_batch([text])[0]
+
+    def token_offsets_batch(self, texts: List[str]) -> List[List[Tuple[int, int]]]:
+        with metrics.stage("tokenize"):
+            encodings = self._tokenizer.encode_batch(texts, add_special_tokens=False)
+        metrics.record("tokenize", items=len(texts))
+        return [
+            [offset for offset in encoding.offsets if offset[1] > offset[0]]
+            for encoding in encodings
+        ]
+
+
+class CachedTokenizer(TokenizerProtocol):
+    """
+    Bounded LRU cache in front of another tokenizer, keyed by text hash.
+    Tracks hit rate and the latency of calls to the wrapped tokenizer.
+    Fallback estimates (made while the tokenizer is unavailable) are
+    returned but not cached, so real results replace them on recovery.
+    """
+
+    def __init__(self, tokenizer: TokenizerProtocol, max_entries: int = 4096):
+        self.tokenizer = tokenizer
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[Tuple[str, bytes], Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.calls = 0
+        self.latency = 0.0
+
+    def count_tokens(self, text: str) -> int:
+        key = ("count", _text_key(text))
+        cached = self._get(key)
+        if cached is not None:
+            return cached
+
+        count = self._timed(self.tokenizer.count_tokens, text)
+        if not isinstance(count, FallbackCount):
+            self._put(key, count)
+        return count
+
+    def token_offsets(self, text: str) -> List[Tuple[int, int]]:
+        return self.token_offsets_batch([text])[0]
+
+    def token_offsets_batch(self, texts: List[str]) -> List[List[Tuple[int, int]]]:
+        keys = [("offsets", _text_key(text)) for text in texts]
+        results: List[Optional[List[Tuple[int, int]]]] = []
+        missing: Dict[Tuple[str, bytes], List[int]] = {}
+
+        for i, key in enumerate(keys):
+            cached = self._get(key)
+            results.append(_unpack_offsets(cached) if cached is not None else None)
+            if cached is None:
+                missing.setdefault(key, []).append(i)
+
+        if missing:
+            # Duplicate texts within the batch are tokenized once
+            first = [indices[0] for indices in missing.values()]
+            fetched = self._timed(self.tokenizer.token_offsets_batch, [texts[i] for i in first])
+            for (key, indices), offsets in zip(missing.items(), fetched):
+                if not isinstance(offsets, FallbackOffsets):
+                    self._put(key, _pack_offsets(offsets))
+                for i in indices:
+                    results[i] = offsets
+
+        return results
+
+    def close(self) -> None:
+        if hasattr(self.tokenizer, "close"):
+            self.tokenizer.close()
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "tokenizer_calls": self.calls,
+            "avg_latency_ms": 1000 * self.latency / self.calls if self.calls else 0.0,
+            "entries": len(self._cache)
+        }
+
+    def _get(self, key):
+        with self._lock:
+            value = self._cache.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def _put(self, key, value) -> None:
+        with self._lock:
+            self._cache[key] = value
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def _timed(self, func, *args):
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self.calls += 1
+                self.latency += time.perf_counter() - started
+
+
+def _text_key(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+def _pack_offsets(offsets: List[Tuple[int, int]]) -> array:
+    packed = array("I")
+    for start, stop in offsets:
+        packed.append(start)
+        packed.append(stop)
+    return packed
+
+
+def _unpack_offsets(packed: array) -> List[Tuple[int, int]]:
+    return list(zip(packed[0::2], packed[1::2]))
+
+
+def _byte_to_char_index(text: str):
+    if text.isascii():
+        return lambda index: index
+
+    mapping = []
+    for char_index, char in enumerate(text):
+        mapping.extend([char_index] * len(char.encode("utf-8")))
+    mapping.append(len(text))
+    return lambda index: mapping[min(index, len(mapping) - 1)]
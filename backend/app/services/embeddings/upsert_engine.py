@@ -0,0 +1,188 @@
+"""Contains the concurrent upsert engine for vector stores"""
+
+import time
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Tuple
+
+import numpy as np
+from tenacity import Retrying, stop_after_attempt, wait_exponential
+
+from backend.app.domain.protocols import DocumentChunk
+from backend.app.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Bytes an embedding value takes once serialized to JSON by the Chroma client
+JSON_BYTES_PER_FLOAT = 12
+
+UpsertFn = Callable[[List[DocumentChunk], np.ndarray], None]
+
+
+class UpsertEngine:
+    """
+    Sends upserts in batches of at most ``max_batch_bytes`` of estimated
+    payload and ``max_batch_size`` items, with up to ``max_in_flight``
+    requests outstanding.
+
+    Failed batches are retried, which is safe because chunk IDs are
+    deterministic. The number of requests in flight is halved when a batch
+    takes longer than ``target_latency`` seconds or fails, and grows back
+    by one after each fast batch. Callers block while the window is full.
+    """
+
+    def __init__(
+        self,
+        max_batch_bytes: int = 4 * 1024 * 1024,
+        max_batch_size: int = 1000,
+        max_in_flight: int = 4,
+        target_latency: float = 1.0,
+        retries: int = 3
+    ):
+        self.max_batch_bytes = max_batch_bytes
+        self.max_batch_size = max_batch_size
+        self.max_in_flight = max(max_in_flight, 1)
+        self.target_latency = target_latency
+        self.retries = retries
+        self.limit = self.max_in_flight
+        self._active = 0
+        self._window = threading.Condition()
+        self._pool = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="upsert")
+        self._stats_lock = threading.Lock()
+        self.items = 0
+        self.bytes = 0
+        self.batches = 0
+        self.retried = 0
+        self._busy_until = 0.0
+        self._busy_time = 0.0
+
+    def submit(self, send: UpsertFn, chunks: List[DocumentChunk], embeddings: np.ndarray) -> "Future[None]":
+        """
+        Queue the upserts of ``chunks`` and return a future that completes
+        once every batch is stored, or fails with the first error.
+        """
+        futures = []
+        send_batch = metrics.propagate(self._send)
+        for start, end, size in self._plan(chunks, embeddings):
+            self._acquire()
+            futures.append(self._pool.submit(send_batch, send, chunks[start:end], embeddings[start:end], size))
+        return _gather(futures)
+
+    def upsert(self, send: UpsertFn, chunks: List[DocumentChunk], embeddings: np.ndarray) -> None:
+        self.submit(send, chunks, embeddings).result()
+
+    def stats(self) -> Dict[str, float]:
+        with self._stats_lock:
+            return {
+                "items": self.items,
+                "batches": self.batches,
+                "retried": self.retried,
+                "in_flight_limit": self.limit,
+                "items_per_second": self.items / self._busy_time if self._busy_time else 0.0,
+                "mib_per_second": self.bytes / 2**20 / self._busy_time if self._busy_time else 0.0
+            }
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=True)
+
+    def _plan(self, chunks: List[DocumentChunk], embeddings: np.ndarray) -> Iterator[Tuple[int, int, int]]:
+        """Yield (start, end, estimated bytes) of each batch."""
+        vector_bytes = embeddings.shape[1] * JSON_BYTES_PER_FLOAT if embeddings.ndim == 2 else 0
+        start, size = 0, 0
+        for i, chunk in enumerate(chunks):
+            item_bytes = vector_bytes + len(chunk.content.encode("utf-8")) + len(str(chunk.metadata)) + len(chunk.id)
+            if i > start and (i - start >= self.max_batch_size or size + item_bytes > self.max_batch_bytes):
+                yield start, i, size
+                start, size = i, 0
+            size += item_bytes
+        if start < len(chunks):
+            yield start, len(chunks), size
+
+    def _send(self, send: UpsertFn, chunks: List[DocumentChunk], embeddings: np.ndarray, size: int) -> None:
+        started = time.perf_counter()
+        try:
+            for attempt in Retrying(
+                stop=stop_after_attempt(self.retries),
+                wait=wait_exponential(multiplier=0.5, max=10),
+                before_sleep=self._on_retry,
+                reraise=True
+            ):
+                with attempt:
+                    send(chunks, embeddings)
+        except Exception:
+            self._release(slow=True)
+            raise
+
+        finished = time.perf_counter()
+        latency = finished - started
+        self._release(slow=latency > self.target_latency)
+        metrics.record("upsert", nbytes=size)
+        with self._stats_lock:
+            self.items += len(chunks)
+            self.bytes += size
+            self.batches += 1
+            # Wall time with at least one request in flight
+            self._busy_time += max(0.0, finished - max(started, self._busy_until))
+            self._busy_until = max(self._busy_until, finished)
+
+    def _on_retry(self, retry_state) -> None:
+        with self._stats_lock:
+            self.retried += 1
+        metrics.retried("upsert")
+        self._shrink()
+        logger.warning(
+            "Upsert attempt %d failed, retrying: %s",
+            retry_state.attempt_number,
+            retry_state.outcome.exception()
+        )
+
+    def _acquire(self) -> None:
+        with self._window:
+            while self._active >= self.limit:
+                self._window.wait()
+            self._active += 1
+
+    def _release(self, slow: bool) -> None:
+        with self._window:
+            self._active -= 1
+            if slow:
+                self.limit = max(1, self.limit // 2)
+            else:
+                self.limit = min(self.max_in_flight, self.limit + 1)
+            self._window.notify_all()
+
+    def _shrink(self) -> None:
+        with self._window:
+            self.limit = max(1, self.limit // 2)
+
+
+def _gather(futures: List[Future]) -> Future:
+    """A future completing when all ``futures`` have, failing with the first error."""
+    gathered: Future = Future()
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def on_done(future: Future) -> None:
+        error = future.exception()
+        with lock:
+            remaining[0] -= 1
+            finished = remaining[0] == 0
+        if gathered.done():
+            return
+        if error is not None:
+            try:
+                gathered.set_exception(error)
+            except Exception:
+                pass
+        elif finished:
+            try:
+                gathered.set_result(None)
+            except Exception:
+                pass
+
+    if not futures:
+        gathered.set_result(None)
+    for future in futures:
+        future.add_done_callback(on_done)
+    return gathered
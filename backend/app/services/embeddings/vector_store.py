@@ -1,100 +1,227 @@
 """Contains vector store"""
 
 import logging
-from typing import List
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional
 
-from chromadb import HttpClient
+import numpy as np
 
 from backend.app.domain.protocols import (
     VectorStoreProtocol,
     DocumentChunk,
+    SearchResult
 )
+from backend.app.services.embeddings.upsert_engine import UpsertEngine
+from backend.app.services.embeddings.vector_store_events import ChangeNotifier, chunk_sources
+from backend.app.utils import metrics
 
 logger = logging.getLogger(__name__)
 
+# Sources matched by one filtered delete
+SOURCES_PER_DELETE = 100
+# IDs fetched and deleted per request when falling back to deleting by ID
+DELETE_CHUNK_SIZE = 5000
 
-class ChromaVectorStore(VectorStoreProtocol):
-    def __init__(self, host: str, port: int, collection_name: str):
+
+class ChromaVectorStore(ChangeNotifier, VectorStoreProtocol):
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        collection_name: str,
+        upsert_engine: Optional[UpsertEngine] = None
+    ):
         self.host = host
         self.port = port
         self.collection_name = collection_name
+        self.upsert_engine = upsert_engine or UpsertEngine()
         self._client = None
         self._collection = None
+        # Ingestion workers share one store
+        self._lock = threading.RLock()
 
     @property
     def client(self):
         if self._client is None:
-            self._client = HttpClient(host=self.host, port=self.port)
+            with self._lock:
+                if self._client is None:
+                    # chromadb is slow to import, so it is only loaded once a client is needed
+                    from chromadb import HttpClient
+                    self._client = HttpClient(host=self.host, port=self.port)
         return self._client
 
     @property
     def collection(self):
         if self._collection is None:
-            self._collection = self.client.get_or_create_collection(name=self.collection_name)
+            with self._lock:
+                if self._collection is None:
+                    self._collection = self.client.get_or_create_collection(name=self.collection_name)
         return self._collection
 
-    def add_documents(
-            self,
-            chunks: List[DocumentChunk],
-            embeddings: List[List[float]],
-            batch_size: int=1000
-        ) -> None:
+    def add_documents(self, chunks: List[DocumentChunk], embeddings: np.ndarray) -> None:
+        self.submit_documents(chunks, embeddings).result()
+
+    def submit_documents(self, chunks: List[DocumentChunk], embeddings: np.ndarray) -> "Future[None]":
+        """
+        Queue chunks for upserting through the upsert engine, blocking only
+        while its window of in-flight requests is full.
+        """
         if len(chunks) != len(embeddings):
             raise ValueError(f"Mismatch between chunks ({len(chunks)}) and embeddings ({len(embeddings)})")
 
-        total = len(chunks)
-        for i in range(0, total, batch_size):
-            batch_chunks = chunks[i:i + batch_size]
-            batch_embeddings = embeddings[i:i + batch_size]
+        return self.upsert_engine.submit(self._upsert_batch, chunks, embeddings)
 
+    def _upsert_batch(self, chunks: List[DocumentChunk], embeddings: np.ndarray) -> None:
+        with metrics.stage("upsert"):
             self.collection.upsert(
-                embeddings=batch_embeddings,
-                documents=[chunk.content for chunk in batch_chunks],
-                metadatas=[chunk.metadata for chunk in batch_chunks],
-                ids=[chunk.id for chunk in batch_chunks]
+                embeddings=embeddings,
+                documents=[chunk.content for chunk in chunks],
+                metadatas=[chunk.metadata for chunk in chunks],
+                ids=[chunk.id for chunk in chunks]
             )
+        metrics.record("upsert", items=len(chunks))
+        self._notify_change(chunk_sources(chunks), embeddings)
+        logger.debug(
+            "Upserted %d documents into Chroma collection '%s'",
+            len(chunks),
+            self.collection_name
+        )
 
-            logger.info(
-                "Inserted batch %d-%d of %d documents into Chroma collection '%s'",
-                i + 1,
-                min(i + batch_size, total),
-                total,
-                self.collection_name
+    def search(
+        self,
+        query_embedding: np.ndarray,
+        top_k: int = 5,
+        where: Optional[Dict[str, Any]] = None
+    ) -> List[SearchResult]:
+        """Top-k chunks nearest to the query, optionally filtered on metadata."""
+        with metrics.stage("vector_search"):
+            response = self.collection.query(
+                query_embeddings=[np.asarray(query_embedding, dtype=np.float32).ravel()],
+                n_results=top_k,
+                where=where or None,
+                include=["documents", "metadatas", "distances"]
             )
-
-        logger.info(
-            "Successfully added %d documents to Chroma collection '%s'", 
-            len(chunks), 
-            self.collection_name
+        return [
+            SearchResult(id=chunk_id, content=document or "", metadata=metadata or {}, score=-distance)
+            for chunk_id, document, metadata, distance in zip(
+                response["ids"][0],
+                response["documents"][0],
+                response["metadatas"][0],
+                response["distances"][0]
+            )
+        ]
+
+    def get_documents(self, ids: List[str], where: Optional[Dict[str, Any]] = None) -> List[SearchResult]:
+        """Chunks with the given IDs that match ``where``, in the order of ``ids``, scored 0."""
+        if not ids:
+            return []
+        response = self.collection.get(ids=ids, where=where or None, include=["documents", "metadatas"])
+        found = {
+            chunk_id: SearchResult(id=chunk_id, content=document or "", metadata=metadata or {}, score=0.0)
+            for chunk_id, document, metadata in zip(response["ids"], response["documents"], response["metadatas"])
+        }
+        return [found[chunk_id] for chunk_id in ids if chunk_id in found]
+
+    def get_embeddings(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        """Stored embeddings of the chunks with the given IDs, by ID."""
+        if not ids:
+            return {}
+        response = self.collection.get(ids=ids, include=["embeddings"])
+        return {
+            chunk_id: np.asarray(embedding, dtype=np.float32)
+            for chunk_id, embedding in zip(response["ids"], response["embeddings"])
+        }
+
+    @staticmethod
+    def similarity(embeddings: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        """Search scores of embeddings against queries: negated squared L2 distance, Chroma's default space."""
+        embeddings = np.atleast_2d(embeddings)
+        queries = np.atleast_2d(queries)
+        return -(
+            np.einsum("ij,ij->i", embeddings, embeddings)[:, None]
+            - 2 * embeddings @ queries.T
+            + np.einsum("ij,ij->i", queries, queries)[None, :]
         )
 
-    def delete_by_source(self, source: str) -> None:
+    def stats(self) -> Dict[str, float]:
+        return self.upsert_engine.stats()
+
+    def close(self) -> None:
+        self.upsert_engine.close()
+
+    def delete_ids(self, ids: List[str]) -> None:
         """
-        Delete all document chunks associated with a given source file.
+        Delete document chunks by ID.
         """
+        if not ids:
+            return
+
         try:
-            # Query all chunk IDs that have this source in metadata
-            results = self.collection.get(
-                where={"source": source},
-                include=["metadatas"]
+            self.collection.delete(ids=ids)
+            self._notify_change(None)
+            logger.info(
+                "Deleted %d chunks from collection '%s'",
+                len(ids),
+                self.collection_name
             )
+        except Exception as e:
+            logger.error("Error deleting %d chunks: %s", len(ids), e)
+            raise RuntimeError("Failed to delete embeddings by ID") from e
 
-            ids_to_delete = results["ids"]
-
-            if not ids_to_delete:
-                logger.info("No chunks found for source: %s", source)
-                return
+    def delete_by_source(self, source: str) -> None:
+        """
+        Delete all document chunks associated with a given source file.
+        """
+        self._delete_where({"source": source}, source, [source])
 
-            # Delete by IDs
-            self.collection.delete(ids=ids_to_delete)
+    def delete_by_sources(self, sources: List[str]) -> None:
+        """
+        Delete the document chunks of many source files, a batch of
+        sources per request.
+        """
+        for i in range(0, len(sources), SOURCES_PER_DELETE):
+            batch = sources[i:i + SOURCES_PER_DELETE]
+            self._delete_where({"source": {"$in": batch}}, f"{len(batch)} sources", batch)
 
+    def _delete_where(self, where: Dict[str, Any], description: str, sources: List[str]) -> None:
+        try:
+            # The server filters and deletes in one round-trip
+            self.collection.delete(where=where)
+            self._notify_change(sources)
             logger.info(
-                "Deleted %d chunks for source '%s' from collection '%s'",
-                len(ids_to_delete),
-                source,
+                "Deleted chunks for %s from collection '%s'",
+                description,
                 self.collection_name
             )
+            return
+        except Exception as e:
+            logger.warning("Filtered delete for %s failed, deleting in chunks: %s", description, e)
 
+        try:
+            deleted = self._delete_where_chunked(where)
+            self._notify_change(sources)
+            logger.info(
+                "Deleted %d chunks for %s from collection '%s'",
+                deleted,
+                description,
+                self.collection_name
+            )
         except Exception as e:
-            logger.error("Error deleting chunks for source %s: %s", source, e)
-            raise RuntimeError(f"Failed to delete embeddings for {source}") from e
\ No newline at end of file
+            logger.error("Error deleting chunks for %s: %s", description, e)
+            raise RuntimeError(f"Failed to delete embeddings for {description}") from e
+
+    def _delete_where_chunked(self, where: Dict[str, Any]) -> int:
+        """Fetch matching IDs only, a bounded page at a time, and delete each page."""
+        deleted = 0
+        previous = None
+        while True:
+            ids = self.collection.get(where=where, include=[], limit=DELETE_CHUNK_SIZE)["ids"]
+            if not ids:
+                return deleted
+            # A delete that didn't take effect would return the same page forever
+            if set(ids) == previous:
+                raise RuntimeError(f"{len(ids)} chunks are still present after being deleted")
+            self.collection.delete(ids=ids)
+            deleted += len(ids)
+            previous = set(ids)
@@ -0,0 +1,43 @@
+"""Contains change notifications of vector stores"""
+
+import logging
+from typing import Callable, FrozenSet, Iterable, List, NamedTuple, Optional, Set
+
+import numpy as np
+
+from backend.app.domain.protocols import DocumentChunk
+
+logger = logging.getLogger(__name__)
+
+
+class VectorStoreChange(NamedTuple):
+    # Sources whose chunks were written or deleted; None when unknown, e.g. deletes by ID
+    sources: Optional[FrozenSet[str]]
+    # Embeddings of added chunks, so caches can tell which results they could enter
+    embeddings: Optional[np.ndarray] = None
+
+
+ChangeListener = Callable[[VectorStoreChange], None]
+
+
+class ChangeNotifier:
+    """Lets caches subscribe to the writes of a vector store."""
+
+    def add_change_listener(self, listener: ChangeListener) -> None:
+        self.__dict__.setdefault("_change_listeners", []).append(listener)
+
+    def _notify_change(self, sources: Optional[Iterable[str]], embeddings: Optional[np.ndarray] = None) -> None:
+        listeners = self.__dict__.get("_change_listeners", ())
+        if not listeners:
+            return
+
+        change = VectorStoreChange(None if sources is None else frozenset(sources), embeddings)
+        for listener in listeners:
+            try:
+                listener(change)
+            except Exception as e:
+                logger.warning("Vector store change listener failed: %s", e)
+
+
+def chunk_sources(chunks: List[DocumentChunk]) -> Set[str]:
+    return {chunk.metadata["source"] for chunk in chunks if "source" in chunk.metadata}
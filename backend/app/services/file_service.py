@@ -1,52 +1,208 @@
 
+import hashlib
 import logging
-from io import BytesIO
+from typing import Optional
 
-import boto3
-from botocore.client import Config
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
 
 from backend.app.core.config import settings
+from backend.app.schemas.file_schema import UploadResponse
+from backend.app.utils.s3 import create_s3_client, ensure_bucket
 
 
 logger = logging.getLogger(__name__)
 
+# S3 rejects multipart parts smaller than 5 MiB (except the last one)
+MIN_PART_SIZE = 5 * 1024 * 1024
 
-async def save_uploaded_file(file):
-    # Create MinIO/S3 client
-    s3_client = boto3.client(
-        "s3",
-        endpoint_url=settings.MINIO_ENDPOINT,
-        aws_access_key_id=settings.MINIO_ACCESS_KEY,
-        aws_secret_access_key=settings.MINIO_SECRET_KEY,
-        config=Config(signature_version="s3v4"),
-        region_name="us-east-1",
-        verify=False,
-    )
-    logger.info("File storage initialized")
+# Room for the multipart boundaries and part headers around the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+async def save_uploaded_file(file, s3_client=None) -> UploadResponse:
+    """
+    Copy an upload to S3/MinIO in fixed-size parts while hashing it.
+
+    Starlette has already spooled the whole request body (to a temporary
+    file once it outgrows memory) before this runs, so oversized requests
+    are rejected from their Content-Length by ``reject_oversized_upload``
+    before the body is received; the checks here cover requests without
+    one. Small files are sent with a single put, larger ones with a
+    multipart upload; at most one part is held in memory and all blocking
+    S3 calls run in the threadpool. If the object already exists with the
+    same content hash, it is left untouched.
+    """
+    # Without a shared client (which has its bucket checked at startup),
+    # create one for this upload
+    if s3_client is None:
+        s3_client = await run_in_threadpool(create_s3_client)
+        logger.info("File storage initialized")
+        await run_in_threadpool(ensure_bucket, s3_client, settings.MINIO_BUCKET)
 
     bucket = settings.MINIO_BUCKET
+    key = file.filename
+    part_size = max(settings.UPLOAD_PART_SIZE, MIN_PART_SIZE)
 
-    # Ensure bucket exists
-    try:
-        s3_client.head_bucket(Bucket=bucket)
-    except Exception:
-        s3_client.create_bucket(Bucket=bucket)
-    logger.info("Bucket exists")
-
-    # Read file content
-    file_content = await file.read()
-    logger.info("file read")
-
-    # Upload
-    s3_client.upload_fileobj(
-        BytesIO(file_content),
-        bucket,
-        file.filename,
-        ExtraArgs={"ContentType": "application/pdf"}
-    )
-    logger.info("File loaded")
+    declared_size = getattr(file, "size", None)
+    if declared_size is not None and declared_size > settings.UPLOAD_MAX_BYTES:
+        raise _too_large()
+
+    existing_hash = await run_in_threadpool(_get_content_hash, s3_client, bucket, key)
+    hasher = hashlib.sha256()
+
+    data = await _read_part(file, part_size)
+    if len(data) < part_size:
+        # Fits in one part: a single put is cheaper than a multipart upload
+        _check_size(len(data))
+        hasher.update(data)
+        sha256 = hasher.hexdigest()
+        deduplicated = sha256 == existing_hash
+        if not deduplicated:
+            await run_in_threadpool(
+                s3_client.put_object,
+                Bucket=bucket,
+                Key=key,
+                Body=data,
+                ContentType="application/pdf"
+            )
+            await _tag_content_hash(s3_client, bucket, key, sha256)
+        size = len(data)
+    else:
+        size, sha256, deduplicated = await _multipart_upload(
+            s3_client, bucket, key, file, data, part_size, hasher, existing_hash
+        )
+
+    if deduplicated:
+        logger.info("File %s is unchanged (sha256 %s), upload skipped", key, sha256)
+    else:
+        logger.info("Uploaded %s (%d bytes, sha256 %s)", key, size, sha256)
 
     # Return public or presigned URL
     # In production, use presigned for private access
-    file_url = f"{settings.MINIO_ENDPOINT}/{bucket}/{file.filename}"
-    return file_url
\ No newline at end of file
+    file_url = f"{settings.MINIO_ENDPOINT}/{bucket}/{key}"
+    return UploadResponse(
+        filename=key,
+        location=file_url,
+        size=size,
+        sha256=sha256,
+        deduplicated=deduplicated
+    )
+
+
+async def _multipart_upload(s3_client, bucket, key, file, data, part_size, hasher, existing_hash):
+    response = await run_in_threadpool(
+        s3_client.create_multipart_upload,
+        Bucket=bucket,
+        Key=key,
+        ContentType="application/pdf"
+    )
+    upload_id = response["UploadId"]
+
+    try:
+        parts = []
+        size = 0
+        while data:
+            size += len(data)
+            _check_size(size)
+            hasher.update(data)
+
+            part_number = len(parts) + 1
+            response = await run_in_threadpool(
+                s3_client.upload_part,
+                Bucket=bucket,
+                Key=key,
+                PartNumber=part_number,
+                UploadId=upload_id,
+                Body=data
+            )
+            parts.append({"ETag": response["ETag"], "PartNumber": part_number})
+            data = await _read_part(file, part_size)
+
+        sha256 = hasher.hexdigest()
+        if sha256 == existing_hash:
+            # Same content: keep the stored object (and its ETag) as is
+            await run_in_threadpool(
+                s3_client.abort_multipart_upload, Bucket=bucket, Key=key, UploadId=upload_id
+            )
+            return size, sha256, True
+
+        await run_in_threadpool(
+            s3_client.complete_multipart_upload,
+            Bucket=bucket,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={"Parts": parts}
+        )
+    except BaseException:
+        await run_in_threadpool(
+            s3_client.abort_multipart_upload, Bucket=bucket, Key=key, UploadId=upload_id
+        )
+        raise
+
+    # The hash is only known once streamed, so it is attached as a tag
+    await _tag_content_hash(s3_client, bucket, key, sha256)
+    return size, sha256, False
+
+
+async def _tag_content_hash(s3_client, bucket: str, key: str, sha256: str) -> None:
+    """
+    Tag a stored object with its sha256. The object is stored either way;
+    without the tag the next upload of the same content just isn't
+    deduplicated, so a failure is only logged.
+    """
+    try:
+        await run_in_threadpool(
+            s3_client.put_object_tagging,
+            Bucket=bucket,
+            Key=key,
+            Tagging={"TagSet": [{"Key": "sha256", "Value": sha256}]}
+        )
+    except Exception as e:
+        logger.warning("Uploaded %s but could not tag it with its sha256: %s", key, e)
+
+
+async def _read_part(file, part_size: int) -> bytes:
+    """Read up to part_size bytes, looping over short reads."""
+    buffer = bytearray()
+    while len(buffer) < part_size:
+        data = await file.read(part_size - len(buffer))
+        if not data:
+            break
+        buffer.extend(data)
+    return bytes(buffer)
+
+
+def _get_content_hash(s3_client, bucket: str, key: str) -> Optional[str]:
+    """sha256 tag of an existing object, or None if it doesn't exist or has none."""
+    try:
+        response = s3_client.get_object_tagging(Bucket=bucket, Key=key)
+    except Exception:
+        return None
+    for tag in response.get("TagSet", []):
+        if tag["Key"] == "sha256":
+            return tag["Value"]
+    return None
+
+
+def reject_oversized_upload(content_length: Optional[str]) -> Optional[HTTPException]:
+    """The 413 for a request whose declared body can't fit the upload limit, if any."""
+    try:
+        length = int(content_length)
+    except (TypeError, ValueError):
+        return None
+    if length > settings.UPLOAD_MAX_BYTES + MULTIPART_OVERHEAD:
+        return _too_large()
+    return None
+
+
+def _check_size(size: int) -> None:
+    if size > settings.UPLOAD_MAX_BYTES:
+        raise _too_large()
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"File exceeds the maximum upload size of {settings.UPLOAD_MAX_BYTES} bytes"
+    )
@@ -0,0 +1,263 @@
+"""Contains the worker pool running ingestion jobs"""
+
+import os
+import socket
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from backend.app.schemas.index_schema import IndexSpec
+from backend.app.services.embeddings.embedding_service import EmbeddingService
+from backend.app.services.embeddings.file_processor import FileProcessor
+from backend.app.services.embeddings.sync_manifest import SyncManifest
+from backend.app.services.jobs.job_store import JobStore, COMPLETED, FAILED
+from backend.app.services.jobs.lease_store import LeaseStore
+
+logger = logging.getLogger(__name__)
+
+REINDEX = "reindex"
+
+# Opens the service and manifest of an index, and makes an index the one served
+IndexBuilder = Callable[[IndexSpec], Tuple[EmbeddingService, SyncManifest]]
+IndexActivator = Callable[[IndexSpec, EmbeddingService, SyncManifest], None]
+
+
+class JobRunner:
+    """
+    Runs queued ingestion jobs in ``workers`` threads.
+
+    Files of a job go through the file processor's ingestion pipeline,
+    several at a time, and their progress is written to the job store as
+    they complete. With a lease store, sync jobs queue their files as work
+    items shared with the other replicas and ingest whatever this replica
+    claims; files claimed by another replica are marked delegated. While a
+    job runs, its heartbeat is refreshed every ``heartbeat_interval``
+    seconds so another worker only takes it over after this process stops.
+
+    A re-index job ingests the whole bucket into the index built by
+    ``build_index`` while jobs and requests keep using the active one, then
+    hands it to ``activate_index`` if every file succeeded. Its files are
+    never leased, since the work items track the active index.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        file_processor: FileProcessor,
+        embedding_service: EmbeddingService,
+        manifest: Optional[SyncManifest] = None,
+        workers: int = 1,
+        poll_interval: float = 1.0,
+        heartbeat_interval: float = 10.0,
+        stale_after: float = 60.0,
+        build_index: Optional[IndexBuilder] = None,
+        activate_index: Optional[IndexActivator] = None,
+        lease_store: Optional[LeaseStore] = None
+    ):
+        self.store = store
+        self.file_processor = file_processor
+        self.embedding_service = embedding_service
+        self.manifest = manifest
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self.build_index = build_index
+        self.activate_index = activate_index
+        self.lease_store = lease_store
+        self._index_lock = threading.Lock()
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._active: Set[str] = set()
+        self._active_lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> None:
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"ingest-job-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+        heartbeat = threading.Thread(target=self._heartbeat, name="ingest-job-heartbeat", daemon=True)
+        heartbeat.start()
+        self._threads.append(heartbeat)
+        logger.info("Started %d ingestion job worker(s)", self.workers)
+
+    def submit(self, files: Optional[List[str]] = None) -> str:
+        """Queue a sync of the bucket, or of the given object keys, and return the job ID."""
+        job_id = self.store.create_job(files)
+        self._wakeup.set()
+        return job_id
+
+    def submit_reindex(self, spec: IndexSpec) -> str:
+        """Queue a rebuild of the bucket into the index ``spec`` describes and return the job ID."""
+        if self.build_index is None or self.activate_index is None:
+            raise RuntimeError("Re-indexing is not configured")
+        job_id = self.store.create_job(kind=REINDEX, params=spec.model_dump())
+        self._wakeup.set()
+        return job_id
+
+    def use_index(self, embedding_service: EmbeddingService, manifest: Optional[SyncManifest]) -> None:
+        """Run the jobs started from now on against another index."""
+        with self._index_lock:
+            self.embedding_service = embedding_service
+            self.manifest = manifest
+
+    def stop(self) -> None:
+        """Stop the workers; jobs still running are requeued and resume on the next start."""
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads.clear()
+
+    def _work(self) -> None:
+        while not self._stop.is_set():
+            try:
+                job = self.store.claim_job(self.worker_id, self.stale_after)
+            except Exception as e:
+                logger.error("Failed to claim ingestion job: %s", e)
+                job = None
+
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+
+            with self._active_lock:
+                self._active.add(job["id"])
+            try:
+                self._run_job(job)
+            finally:
+                with self._active_lock:
+                    self._active.discard(job["id"])
+
+    def _run_job(self, job: Dict[str, Any]) -> None:
+        job_id = job["id"]
+        logger.info("Running ingestion job %s (%s)", job_id, job["kind"])
+        spec = None
+        activated = False
+        embedding_service = manifest = None
+        try:
+            if job["kind"] == REINDEX:
+                spec = IndexSpec(**job["params"])
+                embedding_service, manifest = self.build_index(spec)
+            else:
+                with self._index_lock:
+                    embedding_service, manifest = self.embedding_service, self.manifest
+
+            lease_store = self.lease_store if spec is None else None
+            if job["files_listed"]:
+                objects = self._head_objects(job_id, self.store.unfinished_files(job_id))
+            else:
+                objects = iter(self._list_files(job_id, embedding_service, manifest, lease_store))
+
+            if lease_store is None:
+                objects = self._started(job_id, objects)
+            results = self.file_processor.ingest_objects(
+                objects, embedding_service, manifest, lease_store, stop=self._stop
+            )
+            for obj, chunk_ids, error in results:
+                # Items claimed from other replicas' jobs aren't files of this one; recording them is a no-op
+                if error is None:
+                    self.store.finish_file(job_id, obj["Key"], len(chunk_ids))
+                else:
+                    logger.error("Ingestion job %s failed to process %s: %s", job_id, obj["Key"], error)
+                    self.store.fail_file(job_id, obj["Key"], str(error))
+
+            if self._stop.is_set():
+                self.store.requeue(job_id)
+                logger.info("Ingestion job %s requeued at shutdown", job_id)
+                return
+            if lease_store is not None:
+                delegated = self.store.delegate_unfinished(job_id)
+                if delegated:
+                    logger.info("Ingestion job %s: %d file(s) were claimed by other replicas", job_id, delegated)
+
+            if spec is not None:
+                self._activate(job_id, spec, embedding_service, manifest)
+                activated = True
+
+            self.store.finish_job(job_id, COMPLETED)
+            logger.info("Ingestion job %s completed", job_id)
+        except Exception as e:
+            logger.error("Ingestion job %s failed: %s", job_id, e)
+            self.store.finish_job(job_id, FAILED, str(e))
+        finally:
+            # An index that was not activated is only reopened by a retry of its job
+            if spec is not None and not activated:
+                for component in (embedding_service, manifest):
+                    if component is not None:
+                        component.close()
+
+    def _activate(
+        self,
+        job_id: str,
+        spec: IndexSpec,
+        embedding_service: EmbeddingService,
+        manifest: SyncManifest
+    ) -> None:
+        failed = [f["filename"] for f in self.store.get_job(job_id)["files"] if f["status"] == FAILED]
+        if failed:
+            raise RuntimeError(
+                f"Index {spec.collection} was not activated: {len(failed)} file(s) failed, e.g. {failed[0]}"
+            )
+        self.activate_index(spec, embedding_service, manifest)
+        # Objects changed while the index was built are picked up by a sync
+        self.submit()
+
+    def _list_files(
+        self,
+        job_id: str,
+        embedding_service: EmbeddingService,
+        manifest: Optional[SyncManifest],
+        lease_store: Optional[LeaseStore]
+    ) -> List[Dict[str, Any]]:
+        """
+        Plan a sync job: queue new and modified objects and drop deleted ones.
+        Returns the objects to ingest.
+        """
+        versions = manifest.versions() if manifest is not None else {}
+        plan = self.file_processor.plan_sync(self.file_processor.iter_pdf_objects(), versions)
+        pending = list(plan)
+
+        removed = 0
+        if manifest is not None:
+            deleted = plan.deleted()
+            removed, errors = self.file_processor.remove_deleted(deleted, embedding_service, manifest)
+            for error in errors:
+                logger.warning("Ingestion job %s: %s", job_id, error)
+            if lease_store is not None:
+                lease_store.forget(deleted)
+
+        self.store.set_files(job_id, [obj["Key"] for obj in pending], plan.skipped, removed)
+        return pending
+
+    def _head_objects(self, job_id: str, keys: List[str]) -> Iterator[Dict[str, Any]]:
+        """Look up the versions of a job's remaining files; a failed lookup fails its file."""
+        for key in keys:
+            if self._stop.is_set():
+                return
+            try:
+                yield self.file_processor.head_pdf_object(key)
+            except Exception as e:
+                logger.error("Ingestion job %s failed to process %s: %s", job_id, key, e)
+                self.store.fail_file(job_id, key, str(e))
+
+    def _started(self, job_id: str, objects: Iterator[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        # The pipeline draws an object when it starts ingesting it
+        for obj in objects:
+            self.store.start_file(job_id, obj["Key"])
+            yield obj
+
+    def _heartbeat(self) -> None:
+        while not self._stop.wait(self.heartbeat_interval):
+            with self._active_lock:
+                job_ids = list(self._active)
+            if not job_ids:
+                continue
+            try:
+                self.store.heartbeat(job_ids, self.worker_id)
+            except Exception as e:
+                logger.warning("Failed to refresh ingestion job heartbeat: %s", e)
@@ -0,0 +1,231 @@
+"""Contains the SQLite-backed ingestion job queue"""
+
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+# File states
+PENDING = "pending"
+DONE = "done"
+# Claimed from the lease store and ingested by another replica
+DELEGATED = "delegated"
+
+
+class JobStore:
+    """
+    Durable queue of ingestion jobs and the progress of each of their files.
+
+    A job is either a bucket sync (``files`` is None), a list of object
+    keys, or a re-index rebuilding the bucket into the index its ``params``
+    describe. Running jobs carry a heartbeat; a job whose heartbeat is older
+    than ``stale_after`` seconds belongs to a crashed worker and may be
+    claimed again, resuming with the files that did not complete.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        # Autocommit mode, so claims can take the write lock up front with BEGIN IMMEDIATE
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                params TEXT,
+                status TEXT NOT NULL,
+                files_listed INTEGER NOT NULL DEFAULT 0,
+                skipped INTEGER NOT NULL DEFAULT 0,
+                removed INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                worker_id TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                heartbeat_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created_at);
+            CREATE TABLE IF NOT EXISTS job_files (
+                job_id TEXT NOT NULL,
+                key TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                chunks INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                started_at REAL,
+                finished_at REAL,
+                PRIMARY KEY (job_id, key)
+            );
+            """
+        )
+        # Stores created before jobs carried parameters
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "params" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN params TEXT")
+
+    def create_job(
+        self,
+        files: Optional[List[str]] = None,
+        kind: Optional[str] = None,
+        params: Optional[Dict[str, Any]] = None
+    ) -> str:
+        job_id = uuid.uuid4().hex
+        kind = kind or ("sync" if files is None else "files")
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, params, status, files_listed, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    job_id,
+                    kind,
+                    json.dumps(params) if params is not None else None,
+                    QUEUED,
+                    int(files is not None),
+                    time.time()
+                )
+            )
+            if files is not None:
+                self._insert_files(job_id, files)
+        return job_id
+
+    def claim_job(self, worker_id: str, stale_after: float) -> Optional[Dict[str, Any]]:
+        """Claim the oldest queued job, or a running job whose worker stopped heartbeating."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            row = self._conn.execute(
+                """
+                SELECT id FROM jobs
+                WHERE status = ? OR (status = ? AND heartbeat_at < ?)
+                ORDER BY created_at LIMIT 1
+                """,
+                (QUEUED, RUNNING, now - stale_after)
+            ).fetchone()
+            if row is None:
+                return None
+
+            self._conn.execute(
+                """
+                UPDATE jobs
+                SET status = ?, worker_id = ?, heartbeat_at = ?, started_at = COALESCE(started_at, ?)
+                WHERE id = ?
+                """,
+                (RUNNING, worker_id, now, now, row[0])
+            )
+        return self._get_job_row(row[0])
+
+    def heartbeat(self, job_ids: List[str], worker_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND worker_id = ?",
+                [(time.time(), job_id, worker_id) for job_id in job_ids]
+            )
+
+    def set_files(self, job_id: str, files: List[str], skipped: int = 0, removed: int = 0) -> None:
+        """Record the files of a sync job once the bucket was listed."""
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            self._insert_files(job_id, files)
+            self._conn.execute(
+                "UPDATE jobs SET files_listed = 1, skipped = ?, removed = ? WHERE id = ?",
+                (skipped, removed, job_id)
+            )
+
+    def unfinished_files(self, job_id: str) -> List[str]:
+        """Files still to ingest, including ones interrupted by a crash."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key FROM job_files WHERE job_id = ? AND status IN (?, ?) ORDER BY position",
+                (job_id, PENDING, RUNNING)
+            ).fetchall()
+        return [key for key, in rows]
+
+    def start_file(self, job_id: str, key: str) -> None:
+        self._update_file(job_id, key, "status = ?, started_at = ?, error = NULL", (RUNNING, time.time()))
+
+    def finish_file(self, job_id: str, key: str, chunks: int) -> None:
+        self._update_file(job_id, key, "status = ?, chunks = ?, finished_at = ?", (DONE, chunks, time.time()))
+
+    def fail_file(self, job_id: str, key: str, error: str) -> None:
+        self._update_file(job_id, key, "status = ?, error = ?, finished_at = ?", (FAILED, error, time.time()))
+
+    def delegate_unfinished(self, job_id: str) -> int:
+        """Mark the files left to other replicas once none is left to claim. Returns how many."""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE job_files SET status = ?, finished_at = ? WHERE job_id = ? AND status IN (?, ?)",
+                (DELEGATED, time.time(), job_id, PENDING, RUNNING)
+            )
+        return cursor.rowcount
+
+    def finish_job(self, job_id: str, status: str, error: Optional[str] = None) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                (status, error, time.time(), job_id)
+            )
+
+    def requeue(self, job_id: str) -> None:
+        """Hand a job back to the queue, e.g. when its worker shuts down."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, worker_id = NULL WHERE id = ? AND status = ?",
+                (QUEUED, job_id, RUNNING)
+            )
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """A job with its files, or None if it doesn't exist."""
+        job = self._get_job_row(job_id)
+        if job is None:
+            return None
+
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT key, status, chunks, error, started_at, finished_at
+                FROM job_files WHERE job_id = ? ORDER BY position
+                """,
+                (job_id,)
+            ).fetchall()
+        job["files"] = [
+            dict(zip(("filename", "status", "chunks", "error", "started_at", "finished_at"), row))
+            for row in rows
+        ]
+        return job
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _get_job_row(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            cursor = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        job = dict(zip((column[0] for column in cursor.description), row))
+        job["params"] = json.loads(job["params"]) if job["params"] else None
+        return job
+
+    def _insert_files(self, job_id: str, files: List[str]) -> None:
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO job_files (job_id, key, position, status) VALUES (?, ?, ?, ?)",
+            [(job_id, key, position, PENDING) for position, key in enumerate(files)]
+        )
+
+    def _update_file(self, job_id: str, key: str, assignments: str, params: tuple) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE job_files SET {assignments} WHERE job_id = ? AND key = ?",
+                (*params, job_id, key)
+            )
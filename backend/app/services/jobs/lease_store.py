@@ -0,0 +1,151 @@
+"""Contains the lease store sharding ingestion across replicas"""
+
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List
+
+from backend.app.utils.identifiers import generate_deterministic_id
+
+# Work item states
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+
+class LeaseStore:
+    """
+    Work items shared by every replica through one SQLite database.
+
+    Each object version (key and ETag) is one work item. Replicas claim
+    items under a lease of ``ttl`` seconds, renew it while they work and
+    mark the item done or failed. Leases that expire, e.g. because their
+    replica crashed, can be claimed by any other replica.
+    """
+
+    def __init__(self, path: str, ttl: float = 120.0):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # Autocommit mode, so claims can take the write lock up front with BEGIN IMMEDIATE
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS work_items (
+                id TEXT PRIMARY KEY,
+                key TEXT NOT NULL,
+                etag TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_modified TEXT NOT NULL,
+                status TEXT NOT NULL,
+                owner TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_work_items_status ON work_items(status, lease_expires);
+            CREATE INDEX IF NOT EXISTS idx_work_items_key ON work_items(key);
+            """
+        )
+
+    def enqueue(self, objects: Iterable[Dict[str, Any]]) -> None:
+        """Add work items for listed objects; items that failed before are retried."""
+        rows = [
+            (
+                work_item_id(obj["Key"], obj["ETag"]),
+                obj["Key"],
+                obj["ETag"],
+                obj["Size"],
+                obj["LastModified"].isoformat(),
+                PENDING
+            )
+            for obj in objects
+        ]
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                """
+                INSERT INTO work_items (id, key, etag, size, last_modified, status)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET status = excluded.status, error = NULL
+                WHERE work_items.status = 'failed'
+                """,
+                rows
+            )
+
+    def claim(self, owner: str, limit: int = 1) -> List[Dict[str, Any]]:
+        """Lease up to ``limit`` pending or expired items to ``owner``."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            cursor = self._conn.execute(
+                """
+                SELECT id, key, etag, size, last_modified FROM work_items
+                WHERE status = ? OR (status = ? AND lease_expires < ?)
+                ORDER BY key LIMIT ?
+                """,
+                (PENDING, LEASED, now, limit)
+            )
+            columns = [column[0] for column in cursor.description]
+            items = [dict(zip(columns, row)) for row in cursor.fetchall()]
+            self._conn.executemany(
+                "UPDATE work_items SET status = ?, owner = ?, lease_expires = ?, attempts = attempts + 1 WHERE id = ?",
+                [(LEASED, owner, now + self.ttl, item["id"]) for item in items]
+            )
+        return items
+
+    def renew(self, owner: str) -> None:
+        """Extend every lease held by ``owner``."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE work_items SET lease_expires = ? WHERE owner = ? AND status = ?",
+                (time.time() + self.ttl, owner, LEASED)
+            )
+
+    def complete(self, item_id: str, owner: str) -> None:
+        self._finish(item_id, owner, DONE, None)
+
+    def fail(self, item_id: str, owner: str, error: str) -> None:
+        self._finish(item_id, owner, FAILED, error)
+
+    def forget(self, keys: Iterable[str]) -> None:
+        """Drop the work items of objects deleted from the bucket."""
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.executemany("DELETE FROM work_items WHERE key = ?", [(key,) for key in keys])
+
+    @contextmanager
+    def keep_alive(self, owner: str) -> Iterator[None]:
+        """Renew ``owner``'s leases in the background for the duration of the block."""
+        stop = threading.Event()
+
+        def renew() -> None:
+            while not stop.wait(self.ttl / 3):
+                self.renew(owner)
+
+        thread = threading.Thread(target=renew, name="lease-renewal", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _finish(self, item_id: str, owner: str, status: str, error) -> None:
+        # A replica whose lease expired and was taken over doesn't overwrite the new owner
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE work_items SET status = ?, error = ?, lease_expires = NULL WHERE id = ? AND owner = ?",
+                (status, error, item_id, owner)
+            )
+
+
+def work_item_id(key: str, etag: str) -> str:
+    return generate_deterministic_id(key, {"etag": etag})
@@ -0,0 +1,349 @@
+"""Contains the BM25 inverted index of chunks"""
+
+import os
+import re
+import json
+import math
+import shutil
+import logging
+import threading
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from backend.app.domain.protocols import DocumentChunk
+from backend.app.services.embeddings.vector_store_events import ChangeNotifier, chunk_sources
+
+logger = logging.getLogger(__name__)
+
+# Words, and identifiers such as "4.2.1", "ERR-404" or "/v1/files" kept whole
+TOKEN_PATTERN = re.compile(r"\w+(?:[./:\-]\w+)*")
+TOKEN_SEPARATORS = re.compile(r"[./:\-_]+")
+MAX_TOKEN_LENGTH = 64
+# Term frequencies are stored as uint16
+MAX_TERM_FREQUENCY = 65535
+
+
+def term_counts(text: str) -> Counter:
+    """Counts of the lowercased terms of ``text``; compound identifiers also count their parts."""
+    counts = Counter(TOKEN_PATTERN.findall(text.lower()))
+    # Each distinct term is checked once, not every occurrence
+    for token, count in list(counts.items()):
+        if len(token) > MAX_TOKEN_LENGTH:
+            del counts[token]
+        elif not token.isalnum():
+            for part in TOKEN_SEPARATORS.split(token):
+                if part and part != token:
+                    counts[part] += count
+    return counts
+
+
+class LexicalIndex(ChangeNotifier):
+    """
+    BM25 index of chunk contents keyed by chunk ID.
+
+    Each term has a posting list of document numbers (uint32) and term
+    frequencies (uint16). Compacted postings live in an on-disk segment
+    of flat arrays that is memory-mapped; postings added since then are
+    kept in per-term ``array`` buffers and every change is appended to a
+    journal, which is replayed on open. Deletes and replaced chunks leave
+    tombstones. A new segment is written, dropping them, once the journal
+    exceeds ``journal_max_bytes`` or more than ``compact_ratio`` of the
+    documents are dead.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        k1: float = 1.2,
+        b: float = 0.75,
+        journal_max_bytes: int = 64 * 1024 * 1024,
+        compact_ratio: float = 0.25
+    ):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.journal_max_bytes = journal_max_bytes
+        self.compact_ratio = compact_ratio
+        self._lock = threading.RLock()
+        os.makedirs(path, exist_ok=True)
+
+        current = os.path.join(path, "CURRENT")
+        self.generation = 0
+        if os.path.exists(current):
+            with open(current) as f:
+                self.generation = int(f.read())
+        self._load_segment()
+        self._replay_journal()
+        self._journal = open(self._journal_path(self.generation), "a", encoding="utf-8")
+        logger.info(
+            "Opened lexical index %s with %d documents (%d deleted) and %d terms",
+            path,
+            len(self._lengths) - self._dead,
+            self._dead,
+            len(self._terms)
+        )
+
+    def add(self, chunks: List[DocumentChunk]) -> None:
+        """Index chunks, replacing earlier versions with the same IDs."""
+        if not chunks:
+            return
+        # Tokenized outside the lock; the journal keeps the text, which is cheaper to encode than counts
+        docs = [(chunk.id, chunk.metadata.get("source", ""), chunk.content) for chunk in chunks]
+        counts = [term_counts(text) for _, _, text in docs]
+        with self._lock:
+            self._append({"add": docs})
+            for (chunk_id, source, _), doc_counts in zip(docs, counts):
+                self._add_doc(chunk_id, source, doc_counts)
+            self._maybe_compact()
+        self._notify_change(chunk_sources(chunks))
+
+    def delete_sources(self, sources: Iterable[str]) -> None:
+        sources = list(sources)
+        with self._lock:
+            self._append({"delete_sources": sources})
+            for source in sources:
+                for doc in self._source_docs.pop(source, ()):
+                    self._tombstone(doc)
+            self._maybe_compact()
+        self._notify_change(sources)
+
+    def delete_ids(self, ids: Iterable[str]) -> None:
+        ids = list(ids)
+        with self._lock:
+            self._append({"delete_ids": ids})
+            for chunk_id in ids:
+                doc = self._id_docs.get(chunk_id)
+                if doc is not None:
+                    self._tombstone(doc)
+            self._maybe_compact()
+        self._notify_change(None)
+
+    def search(self, query: str, top_k: int = 5) -> List[Tuple[str, float]]:
+        """(chunk ID, BM25 score) of the ``top_k`` best matches of the query's terms."""
+        terms = list(term_counts(query))
+        if not terms or top_k <= 0:
+            return []
+
+        with self._lock:
+            return self._score(terms, top_k)
+
+    def compact(self) -> None:
+        """Write a new segment without tombstones and start a new journal."""
+        with self._lock:
+            keep = np.frombuffer(self._deleted, dtype=np.uint8) == 0
+            remap = np.full(len(keep), -1, dtype=np.int64)
+            remap[keep] = np.arange(int(keep.sum()))
+
+            terms, offsets, postings, freqs = [], [0], [], []
+            for term, term_id in self._terms.items():
+                docs, term_freqs = self._postings(term_id)
+                renumbered = remap[docs]
+                alive = renumbered >= 0
+                if not alive.any():
+                    continue
+                terms.append(term)
+                postings.append(renumbered[alive].astype(np.uint32))
+                freqs.append(term_freqs[alive])
+                offsets.append(offsets[-1] + int(alive.sum()))
+
+            generation = self.generation + 1
+            segment = self._segment_path(generation)
+            os.makedirs(segment, exist_ok=True)
+            np.save(os.path.join(segment, "offsets.npy"), np.array(offsets, dtype=np.uint64))
+            np.save(os.path.join(segment, "postings.npy"), np.concatenate(postings) if postings else np.zeros(0, np.uint32))
+            np.save(os.path.join(segment, "freqs.npy"), np.concatenate(freqs) if freqs else np.zeros(0, np.uint16))
+            np.save(os.path.join(segment, "lengths.npy"), np.frombuffer(self._lengths, dtype=np.uint32)[keep])
+            with open(os.path.join(segment, "docs.json"), "w", encoding="utf-8") as f:
+                json.dump({
+                    "terms": terms,
+                    "ids": [self._doc_ids[doc] for doc in np.flatnonzero(keep)],
+                    "sources": [self._doc_sources[doc] for doc in np.flatnonzero(keep)]
+                }, f)
+            open(self._journal_path(generation), "w").close()
+
+            # The switch is a single rename; a crash before it keeps the old generation
+            current = os.path.join(self.path, "CURRENT")
+            with open(current + ".tmp", "w") as f:
+                f.write(str(generation))
+            os.replace(current + ".tmp", current)
+
+            self._journal.close()
+            previous = self.generation
+            self.generation = generation
+            self._load_segment()
+            self._journal = open(self._journal_path(generation), "a", encoding="utf-8")
+            shutil.rmtree(self._segment_path(previous), ignore_errors=True)
+            if os.path.exists(self._journal_path(previous)):
+                os.remove(self._journal_path(previous))
+            logger.info("Compacted lexical index %s to generation %d", self.path, generation)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "documents": len(self._lengths) - self._dead,
+                "deleted": self._dead,
+                "terms": len(self._terms),
+                "segment_postings": len(self._base_postings),
+                "journal_bytes": self._journal.tell()
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._journal.close()
+
+    def _segment_path(self, generation: int) -> str:
+        return os.path.join(self.path, f"segment-{generation}")
+
+    def _journal_path(self, generation: int) -> str:
+        return os.path.join(self.path, f"journal-{generation}.jsonl")
+
+    def _load_segment(self) -> None:
+        segment = self._segment_path(self.generation)
+        if os.path.exists(os.path.join(segment, "docs.json")):
+            with open(os.path.join(segment, "docs.json"), encoding="utf-8") as f:
+                docs = json.load(f)
+            self._base_offsets = np.load(os.path.join(segment, "offsets.npy"))
+            self._base_postings = np.load(os.path.join(segment, "postings.npy"), mmap_mode="r")
+            self._base_freqs = np.load(os.path.join(segment, "freqs.npy"), mmap_mode="r")
+            lengths = np.load(os.path.join(segment, "lengths.npy"))
+        else:
+            docs = {"terms": [], "ids": [], "sources": []}
+            self._base_offsets = np.zeros(1, dtype=np.uint64)
+            self._base_postings = np.zeros(0, dtype=np.uint32)
+            self._base_freqs = np.zeros(0, dtype=np.uint16)
+            lengths = np.zeros(0, dtype=np.uint32)
+
+        self._terms: Dict[str, int] = {term: i for i, term in enumerate(docs["terms"])}
+        self._base_terms = len(self._terms)
+        # Postings added since the segment was written, per term ID
+        self._tail: Dict[int, Tuple[array, array]] = {}
+        self._doc_ids: List[str] = docs["ids"]
+        self._doc_sources: List[str] = docs["sources"]
+        self._lengths = array("I", lengths.astype(np.uint32).tobytes())
+        self._deleted = bytearray(len(self._doc_ids))
+        self._dead = 0
+        self._total_length = int(lengths.sum())
+        self._id_docs: Dict[str, int] = {chunk_id: doc for doc, chunk_id in enumerate(self._doc_ids)}
+        self._source_docs: Dict[str, List[int]] = {}
+        for doc, source in enumerate(self._doc_sources):
+            self._source_docs.setdefault(source, []).append(doc)
+
+    def _replay_journal(self) -> None:
+        path = self._journal_path(self.generation)
+        if not os.path.exists(path):
+            return
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn write at the end of the journal from a crash
+                    logger.warning("Skipping truncated lexical index journal entry")
+                    break
+                for chunk_id, source, text in entry.get("add", ()):
+                    self._add_doc(chunk_id, source, term_counts(text))
+                for source in entry.get("delete_sources", ()):
+                    for doc in self._source_docs.pop(source, ()):
+                        self._tombstone(doc)
+                for chunk_id in entry.get("delete_ids", ()):
+                    doc = self._id_docs.get(chunk_id)
+                    if doc is not None:
+                        self._tombstone(doc)
+
+    def _append(self, entry: Dict) -> None:
+        self._journal.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self._journal.flush()
+
+    def _add_doc(self, chunk_id: str, source: str, counts: Dict[str, int]) -> None:
+        previous = self._id_docs.get(chunk_id)
+        if previous is not None:
+            self._tombstone(previous)
+
+        doc = len(self._doc_ids)
+        self._doc_ids.append(chunk_id)
+        self._doc_sources.append(source)
+        self._id_docs[chunk_id] = doc
+        self._source_docs.setdefault(source, []).append(doc)
+        length = sum(counts.values())
+        self._lengths.append(length)
+        self._deleted.append(0)
+        self._total_length += length
+
+        terms, tail = self._terms, self._tail
+        for term, count in counts.items():
+            term_id = terms.get(term)
+            if term_id is None:
+                term_id = terms[term] = len(terms)
+            postings = tail.get(term_id)
+            if postings is None:
+                postings = tail[term_id] = (array("I"), array("H"))
+            postings[0].append(doc)
+            postings[1].append(count if count <= MAX_TERM_FREQUENCY else MAX_TERM_FREQUENCY)
+
+    def _tombstone(self, doc: int) -> None:
+        if self._deleted[doc]:
+            return
+        self._deleted[doc] = 1
+        self._dead += 1
+        self._total_length -= self._lengths[doc]
+        if self._id_docs.get(self._doc_ids[doc]) == doc:
+            del self._id_docs[self._doc_ids[doc]]
+
+    def _score(self, terms: Iterable[str], top_k: int) -> List[Tuple[str, float]]:
+        # Runs under the lock: the views of the growable arrays must be gone before they grow again
+        live = len(self._lengths) - self._dead
+        if not live:
+            return []
+        average_length = self._total_length / live
+        lengths = np.frombuffer(self._lengths, dtype=np.uint32)
+        deleted = np.frombuffer(self._deleted, dtype=np.uint8)
+
+        all_docs, all_weights = [], []
+        for term in terms:
+            term_id = self._terms.get(term)
+            if term_id is None:
+                continue
+            docs, freqs = self._postings(term_id)
+            # Tombstoned documents still count towards document frequency until compaction
+            idf = math.log(1 + (live - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * lengths[docs] / average_length)
+            weights = idf * freqs * (self.k1 + 1) / (freqs + norm)
+            weights[deleted[docs] == 1] = 0
+            all_docs.append(docs)
+            all_weights.append(weights)
+
+        if not all_docs:
+            return []
+        docs, inverse = np.unique(np.concatenate(all_docs), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(all_weights))
+        matched = scores > 0
+        docs, scores = docs[matched], scores[matched]
+        if len(docs) > top_k:
+            best = np.argpartition(-scores, top_k - 1)[:top_k]
+            docs, scores = docs[best], scores[best]
+        order = np.argsort(-scores, kind="stable")
+        return [(self._doc_ids[docs[i]], float(scores[i])) for i in order]
+
+    def _postings(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Document numbers and term frequencies of a term, as fresh arrays."""
+        parts_docs, parts_freqs = [], []
+        if term_id < self._base_terms:
+            start, end = int(self._base_offsets[term_id]), int(self._base_offsets[term_id + 1])
+            parts_docs.append(self._base_postings[start:end])
+            parts_freqs.append(self._base_freqs[start:end])
+        if term_id in self._tail:
+            tail_docs, tail_freqs = self._tail[term_id]
+            parts_docs.append(np.frombuffer(tail_docs, dtype=np.uint32))
+            parts_freqs.append(np.frombuffer(tail_freqs, dtype=np.uint16))
+        # concatenate copies, so no buffer of the growable arrays stays exported
+        docs = np.concatenate(parts_docs).astype(np.int64)
+        freqs = np.concatenate(parts_freqs).astype(np.float64)
+        return docs, freqs
+
+    def _maybe_compact(self) -> None:
+        dead_ratio = self._dead / len(self._lengths) if self._lengths else 0.0
+        if self._journal.tell() > self.journal_max_bytes or dead_ratio > self.compact_ratio:
+            self.compact()
@@ -0,0 +1,266 @@
+"""Contains the retrieval service with query and result caches"""
+
+import json
+import time
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from backend.app.domain.protocols import (
+    EmbeddingProviderProtocol,
+    VectorStoreProtocol,
+    SearchResult
+)
+from backend.app.services.embeddings.vector_store_events import VectorStoreChange
+from backend.app.services.search.lexical_index import LexicalIndex
+from backend.app.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+ResultKey = Tuple[str, int, str, str]
+
+VECTOR = "vector"
+LEXICAL = "lexical"
+HYBRID = "hybrid"
+SEARCH_MODES = (VECTOR, LEXICAL, HYBRID)
+
+
+class _CachedResults(NamedTuple):
+    expires_at: float
+    results: List[SearchResult]
+    # None for lexical results
+    query_embedding: Optional[np.ndarray]
+    top_k: int
+    mode: str
+    sources: FrozenSet[str]
+
+
+class SearchService:
+    """
+    Embeds queries and searches the vector store, caching both steps.
+
+    Besides vector search, queries can be matched on keywords against the
+    lexical index, or both rankings fused by reciprocal rank (``hybrid``),
+    each taking ``candidates`` results per requested one.
+
+    Query embeddings are kept in an LRU of ``query_cache_size`` entries
+    keyed by normalized query text. Results are kept for ``result_ttl``
+    seconds per (query, k, filter) and dropped as soon as the vector store
+    reports a change that could alter them: chunks of one of their sources
+    were written or deleted, or new chunks score above their worst result.
+    Lexical and hybrid results are dropped on every write.
+    """
+
+    def __init__(
+        self,
+        embedding_provider: EmbeddingProviderProtocol,
+        vector_store: VectorStoreProtocol,
+        lexical_index: Optional[LexicalIndex] = None,
+        query_cache_size: int = 10_000,
+        result_cache_size: int = 10_000,
+        result_ttl: float = 300.0,
+        rrf_k: int = 60,
+        candidates: int = 4
+    ):
+        self.embedding_provider = embedding_provider
+        self.vector_store = vector_store
+        self.lexical_index = lexical_index
+        self.rrf_k = rrf_k
+        self.candidates = candidates
+        self.query_cache_size = query_cache_size
+        self.result_cache_size = result_cache_size
+        self.result_ttl = result_ttl
+        self._lock = threading.Lock()
+        self._query_embeddings: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._results: "OrderedDict[ResultKey, _CachedResults]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # Bumped on every store change
+        self._version = 0
+
+        if hasattr(vector_store, "add_change_listener"):
+            vector_store.add_change_listener(self._on_change)
+        if lexical_index is not None:
+            lexical_index.add_change_listener(self._on_lexical_change)
+
+    def cached_search(
+        self,
+        query: str,
+        top_k: int = 5,
+        where: Optional[Dict[str, Any]] = None,
+        mode: str = VECTOR
+    ) -> Optional[List[SearchResult]]:
+        """Results from the cache, or None on a miss. Never blocks on I/O."""
+        key = _result_key(query, top_k, where, mode)
+        with self._lock:
+            entry = self._results.get(key)
+            if entry is None or entry.expires_at < time.monotonic():
+                return None
+            self._results.move_to_end(key)
+            self.hits += 1
+            return entry.results
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 5,
+        where: Optional[Dict[str, Any]] = None,
+        mode: str = VECTOR
+    ) -> List[SearchResult]:
+        """Top-k chunks for a query, served from the cache when possible."""
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {mode}")
+        if mode != VECTOR and self.lexical_index is None:
+            raise ValueError(f"Search mode {mode} needs the lexical index, which is disabled")
+
+        cached = self.cached_search(query, top_k, where, mode)
+        if cached is not None:
+            return cached
+
+        key = _result_key(query, top_k, where, mode)
+        with self._lock:
+            version = self._version
+        query_embedding = None
+        if mode == VECTOR:
+            query_embedding = self._embed_query(key[0])
+            results = self.vector_store.search(query_embedding, top_k, where)
+        elif mode == LEXICAL:
+            results = self._lexical_search(key[0], top_k, where)
+        else:
+            results = self._hybrid_search(key[0], top_k, where)
+
+        with self._lock:
+            self.misses += 1
+            # The store changed while searching, so these results may already be stale
+            if version != self._version:
+                return results
+            self._results[key] = _CachedResults(
+                expires_at=time.monotonic() + self.result_ttl,
+                results=results,
+                query_embedding=query_embedding,
+                top_k=top_k,
+                mode=mode,
+                sources=frozenset(result.metadata.get("source") for result in results)
+            )
+            self._results.move_to_end(key)
+            while len(self._results) > self.result_cache_size:
+                self._results.popitem(last=False)
+        return results
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "cached_queries": len(self._query_embeddings),
+                "cached_results": len(self._results)
+            }
+
+    def _lexical_search(
+        self,
+        query: str,
+        top_k: int,
+        where: Optional[Dict[str, Any]],
+        limit: Optional[int] = None
+    ) -> List[SearchResult]:
+        # Filters are applied by the vector store, so take more matches than needed when filtering
+        with metrics.stage("lexical_search"):
+            hits = self.lexical_index.search(query, limit or (top_k * self.candidates if where else top_k))
+        scores = dict(hits)
+        documents = self.vector_store.get_documents([chunk_id for chunk_id, _ in hits], where)
+        return [result.model_copy(update={"score": scores[result.id]}) for result in documents][:top_k]
+
+    def _hybrid_search(self, query: str, top_k: int, where: Optional[Dict[str, Any]]) -> List[SearchResult]:
+        """Reciprocal rank fusion of the vector and keyword rankings."""
+        candidates = top_k * self.candidates
+        rankings = [
+            self.vector_store.search(self._embed_query(query), candidates, where),
+            self._lexical_search(query, candidates, where, limit=candidates)
+        ]
+
+        fused: Dict[str, float] = {}
+        documents: Dict[str, SearchResult] = {}
+        for ranking in rankings:
+            for rank, result in enumerate(ranking):
+                fused[result.id] = fused.get(result.id, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+                documents.setdefault(result.id, result)
+
+        best = sorted(fused, key=fused.get, reverse=True)[:top_k]
+        return [documents[chunk_id].model_copy(update={"score": fused[chunk_id]}) for chunk_id in best]
+
+    def _embed_query(self, normalized: str) -> np.ndarray:
+        with self._lock:
+            embedding = self._query_embeddings.get(normalized)
+            if embedding is not None:
+                self._query_embeddings.move_to_end(normalized)
+                return embedding
+
+        embedding = np.asarray(self.embedding_provider.get_embeddings([normalized]), dtype=np.float32)[0]
+        with self._lock:
+            self._query_embeddings[normalized] = embedding
+            while len(self._query_embeddings) > self.query_cache_size:
+                self._query_embeddings.popitem(last=False)
+        return embedding
+
+    def _on_change(self, change: VectorStoreChange) -> None:
+        with self._lock:
+            self._version += 1
+            if change.sources is None:
+                self._results.clear()
+                return
+
+            added = change.embeddings is not None and len(change.embeddings) > 0
+            stale = [
+                key for key, entry in self._results.items()
+                if entry.sources & change.sources or (added and entry.mode != VECTOR)
+            ]
+            for key in stale:
+                del self._results[key]
+            # Scored outside the lock, so lookups aren't blocked while a write is checked
+            cached = list(self._results.items()) if added else []
+
+        if cached:
+            stale.extend(self._outranked(change.embeddings, cached))
+
+        if stale:
+            logger.debug("Invalidated %d cached search results", len(stale))
+
+    def _on_lexical_change(self, change: VectorStoreChange) -> None:
+        # Chunks are indexed after they are stored, so keyword results cached in between are stale too
+        with self._lock:
+            self._version += 1
+            stale = [key for key, entry in self._results.items() if entry.mode != VECTOR]
+            for key in stale:
+                del self._results[key]
+
+    def _outranked(self, embeddings: np.ndarray, cached: List[Tuple[ResultKey, _CachedResults]]) -> List[ResultKey]:
+        """Drop the cached results that one of the new embeddings would enter."""
+        queries = np.stack([entry.query_embedding for _, entry in cached])
+        best = self.vector_store.similarity(embeddings, queries).max(axis=0)
+        outranked = [
+            (key, entry) for (key, entry), score in zip(cached, best)
+            if len(entry.results) < entry.top_k or score > entry.results[-1].score
+        ]
+
+        stale = []
+        with self._lock:
+            for key, entry in outranked:
+                # Results cached since the snapshot were searched after this write
+                if self._results.get(key) is entry:
+                    del self._results[key]
+                    stale.append(key)
+        return stale
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", query).split())
+
+
+def _result_key(query: str, top_k: int, where: Optional[Dict[str, Any]], mode: str) -> ResultKey:
+    return normalize_query(query), top_k, json.dumps(where, sort_keys=True) if where else "", mode
@@ -0,0 +1,294 @@
+"""Contains in-process metrics and their Prometheus text exposition"""
+
+import sys
+import time
+import bisect
+import resource
+import threading
+import contextvars
+from contextlib import nullcontext
+from typing import Callable, ContextManager, Dict, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BYTES_BUCKETS = tuple(float(2 ** power) for power in range(24, 36))
+
+_enabled = False
+_NOOP = nullcontext()
+_PAGE_SIZE = resource.getpagesize()
+# Stage breakdown of the request being profiled, if any
+_profile: contextvars.ContextVar[Optional["StageProfile"]] = contextvars.ContextVar("stage_profile", default=None)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def _labels(self, values: Tuple[str, ...]) -> str:
+        if not values:
+            return ""
+        return "{" + ",".join(f'{name}="{value}"' for name, value in zip(self.labelnames, values)) + "}"
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, *labelvalues: str) -> None:
+        if not _enabled:
+            return
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{self._labels(labels)} {_format(value)}" for labels, value in sorted(self._values.items())]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, *labelvalues: str) -> None:
+        if not _enabled:
+            return
+        with self._lock:
+            self._values[labelvalues] = value
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{self._labels(labels)} {_format(value)}" for labels, value in sorted(self._values.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+        # Per label values: count per bucket (the last one is +Inf), sum
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        if not _enabled:
+            return
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(labelvalues, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    def samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for labels, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else _format(bound)
+                    lines.append(f"{self.name}_bucket{self._bucket_labels(labels, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{self._labels(labels)} {_format(total[0])}")
+                lines.append(f"{self.name}_count{self._labels(labels)} {cumulative}")
+        return lines
+
+    def _bucket_labels(self, values: Tuple[str, ...], le: str) -> str:
+        pairs = [f'{name}="{value}"' for name, value in zip(self.labelnames, values)] + [f'le="{le}"']
+        return "{" + ",".join(pairs) + "}"
+
+
+_REGISTRY: List[_Metric] = []
+
+STAGE_SECONDS = Histogram(
+    "rag_stage_duration_seconds",
+    "Duration of calls to each ingestion and search stage",
+    ("stage",)
+)
+STAGE_ITEMS = Counter(
+    "rag_stage_items_total",
+    "Items handled per stage: objects listed, pages parsed, texts tokenized or embedded, chunks upserted",
+    ("stage",)
+)
+STAGE_BYTES = Counter("rag_stage_bytes_total", "Bytes handled per stage", ("stage",))
+STAGE_RETRIES = Counter("rag_stage_retries_total", "Retried calls per stage", ("stage",))
+STAGE_ERRORS = Counter("rag_stage_errors_total", "Failed calls per stage", ("stage",))
+FILES = Counter("rag_files_total", "Ingested files by outcome", ("outcome",))
+FILE_RSS = Histogram(
+    "rag_file_finished_rss_bytes",
+    "Resident memory of the process (without its parse workers) sampled as each file finished",
+    buckets=BYTES_BUCKETS
+)
+PEAK_RSS = Gauge("rag_process_peak_rss_bytes", "Peak resident memory of the process and its parse workers")
+
+
+class StageProfile:
+    """Time, calls, items and bytes per stage within one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float = 0.0, calls: int = 0, items: int = 0, nbytes: int = 0) -> None:
+        with self._lock:
+            totals = self.stages.setdefault(stage, [0.0, 0, 0, 0])
+            totals[0] += seconds
+            totals[1] += calls
+            totals[2] += items
+            totals[3] += nbytes
+
+    def summary(self) -> str:
+        with self._lock:
+            parts = [
+                f"{stage} {seconds:.3f}s/{calls} calls"
+                + (f"/{items} items" if items else "")
+                + (f"/{nbytes / 2**20:.1f} MiB" if nbytes else "")
+                for stage, (seconds, calls, items, nbytes) in sorted(self.stages.items(), key=lambda item: -item[1][0])
+            ]
+        return ", ".join(parts) or "no stages recorded"
+
+    def server_timing(self) -> str:
+        """The breakdown as a Server-Timing header value."""
+        with self._lock:
+            return ", ".join(
+                f"{stage};dur={seconds * 1000:.1f}" for stage, (seconds, _, _, _) in self.stages.items()
+            )
+
+
+def configure(enabled: bool) -> None:
+    global _enabled
+    _enabled = enabled
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def stage(name: str) -> ContextManager:
+    """Time a call to a stage. A shared no-op unless metrics or profiling are on."""
+    if not _enabled and _profile.get() is None:
+        return _NOOP
+    return _StageTimer(name)
+
+
+class _StageTimer:
+    __slots__ = ("name", "started")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.started = time.perf_counter()
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        elapsed = time.perf_counter() - self.started
+        STAGE_SECONDS.observe(elapsed, self.name)
+        if exc_type is not None:
+            STAGE_ERRORS.inc(1, self.name)
+        profile = _profile.get()
+        if profile is not None:
+            profile.add(self.name, seconds=elapsed, calls=1)
+
+
+def record(name: str, items: int = 0, nbytes: int = 0) -> None:
+    """Count the items and bytes a stage handled."""
+    if _enabled:
+        if items:
+            STAGE_ITEMS.inc(items, name)
+        if nbytes:
+            STAGE_BYTES.inc(nbytes, name)
+    profile = _profile.get()
+    if profile is not None:
+        profile.add(name, items=items, nbytes=nbytes)
+
+
+def retried(name: str) -> None:
+    STAGE_RETRIES.inc(1, name)
+
+
+def file_finished(outcome: str) -> None:
+    """Count a finished file and sample current and peak memory."""
+    if not _enabled:
+        return
+    FILES.inc(1, outcome)
+    FILE_RSS.observe(current_rss_bytes())
+    PEAK_RSS.set(peak_rss_bytes())
+
+
+def current_rss_bytes() -> int:
+    """Current RSS of this process; the peak where /proc isn't available."""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+    except OSError:
+        return peak_rss_bytes()
+    return resident_pages * _PAGE_SIZE
+
+
+def peak_rss_bytes() -> int:
+    """Peak RSS of this process or its largest child, e.g. a parse worker."""
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    )
+    # Reported in KiB on Linux and in bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def start_profile() -> Tuple[StageProfile, contextvars.Token]:
+    profile = StageProfile()
+    return profile, _profile.set(profile)
+
+
+def stop_profile(token: contextvars.Token) -> None:
+    _profile.reset(token)
+
+
+def propagate(func: Callable) -> Callable:
+    """
+    Run ``func`` in the caller's profiling context when it is handed to
+    another thread; unchanged when no request is being profiled.
+    """
+    if _profile.get() is None:
+        return func
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        # A context can only be entered by one thread at a time
+        return context.copy().run(func, *args, **kwargs)
+    return run
+
+
+def _format(value: float) -> str:
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    PEAK_RSS.set(peak_rss_bytes())
+    lines = []
+    for metric in _REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help_text}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,35 @@
+"""S3/MinIO client helpers"""
+
+import logging
+
+from backend.app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def create_s3_client():
+    """Create an S3/MinIO client with a connection pool sized for ingestion workers."""
+    import boto3
+    from botocore.client import Config
+
+    return boto3.client(
+        "s3",
+        endpoint_url=settings.MINIO_ENDPOINT,
+        aws_access_key_id=settings.MINIO_ACCESS_KEY,
+        aws_secret_access_key=settings.MINIO_SECRET_KEY,
+        config=Config(
+            signature_version="s3v4",
+            max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS
+        ),
+        region_name="us-east-1",
+        verify=False,
+    )
+
+
+def ensure_bucket(s3_client, bucket: str) -> None:
+    """Create the bucket if it does not exist yet."""
+    try:
+        s3_client.head_bucket(Bucket=bucket)
+    except Exception:
+        s3_client.create_bucket(Bucket=bucket)
+    logger.info("Bucket '%s' exists", bucket)
@@ -0,0 +1,92 @@
+"""
+Compares sequential fixed-size upserts with the concurrent upsert engine.
+
+Runs against a stand-in collection that serves a limited number of
+requests at a time, takes time proportional to the payload and fails a
+fraction of requests transiently. The baseline sends batches of 1000 one
+after another without retrying, as ChromaVectorStore used to; the engine
+uses the default settings. Reports throughput, retries and whether every
+chunk was stored.
+
+Usage: python -m benchmarks.chroma_upserts [chunks] [dim] [failure_rate]
+"""
+
+import sys
+import time
+import random
+import threading
+
+import numpy as np
+
+from backend.app.domain.protocols import DocumentChunk
+from backend.app.services.embeddings.upsert_engine import UpsertEngine
+
+
+class StandInCollection:
+    def __init__(self, workers: int = 4, mib_per_second: float = 200.0, failure_rate: float = 0.02):
+        self.slots = threading.BoundedSemaphore(workers)
+        self.seconds_per_byte = 1 / (mib_per_second * 2**20)
+        self.failure_rate = failure_rate
+        self.rng = random.Random(0)
+        self.stored = set()
+        self.lock = threading.Lock()
+
+    def upsert(self, chunks, embeddings) -> None:
+        payload = embeddings.size * 12 + sum(len(chunk.content) for chunk in chunks)
+        with self.slots:
+            time.sleep(0.005 + payload * self.seconds_per_byte)
+            with self.lock:
+                if self.rng.random() < self.failure_rate:
+                    raise ConnectionError("transient stand-in failure")
+                self.stored.update(chunk.id for chunk in chunks)
+
+
+def make_chunks(count: int):
+    text = "lorem ipsum dolor sit amet " * 40
+    return [
+        DocumentChunk(content=text, metadata={"source": "bench.pdf", "page": i // 10, "chunk_index": i}, id=f"chunk-{i}")
+        for i in range(count)
+    ]
+
+
+def run(engine: UpsertEngine, collection: StandInCollection, chunks, embeddings, per_call: int = 32):
+    started = time.perf_counter()
+    errors = 0
+    futures = []
+    # Same shape as the ingestion pipeline: one call per embedding batch
+    for i in range(0, len(chunks), per_call):
+        futures.append(engine.submit(collection.upsert, chunks[i:i + per_call], embeddings[i:i + per_call]))
+    for future in futures:
+        try:
+            future.result()
+        except Exception:
+            errors += 1
+    elapsed = time.perf_counter() - started
+    engine.close()
+    return elapsed, errors
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    dim = int(sys.argv[2]) if len(sys.argv) > 2 else 768
+    failure_rate = float(sys.argv[3]) if len(sys.argv) > 3 else 0.02
+
+    chunks = make_chunks(count)
+    embeddings = np.random.default_rng(0).standard_normal((count, dim), dtype=np.float32)
+
+    for name, engine in (
+        ("sequential, no retry", UpsertEngine(max_batch_bytes=2**40, max_in_flight=1, retries=1)),
+        ("upsert engine", UpsertEngine())
+    ):
+        collection = StandInCollection(failure_rate=failure_rate)
+        elapsed, errors = run(engine, collection, chunks, embeddings)
+        stats = engine.stats()
+        print(
+            f"{name:22s} {elapsed:6.2f}s  {stats['items_per_second']:9.0f} items/s  "
+            f"retried {stats['retried']:3d}  failed calls {errors:3d}  "
+            f"stored {len(collection.stored)}/{count}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Measures what chunk deduplication saves on a redundant corpus, and checks
+that deletes keep shared chunks for as long as a source references them.
+
+Documents are made of unique pages plus a disclaimer and an appendix shared
+by all, the appendix with a word changed per document. EmbeddingService
+ingests them into a FakeVectorStore without deduplication, with exact
+deduplication and with near-duplicate matching, and the texts embedded and
+chunks stored are reported. Then documents are deleted and re-ingested in
+an order that moves shared chunks between owners, checking after each step
+that every remaining document's chunks are in the store and that moving
+them embedded nothing, and a document failing to embed is checked to leave
+no references behind.
+
+Usage: python -m benchmarks.chunk_dedup [documents] [unique_pages]
+"""
+
+import sys
+import time
+import random
+import tempfile
+
+from backend.app.services.embeddings.chunk_dedup import ChunkDeduplicator
+from backend.app.services.embeddings.embedding_service import EmbeddingService
+from benchmarks.fakes import FakeEmbeddingProvider, FakeVectorStore
+from benchmarks.lexical_index import StandInLoader
+
+WORDS = ["agreement", "party", "clause", "notice", "payment", "service", "period", "liability", "term", "record"]
+
+
+class CountingProvider(FakeEmbeddingProvider):
+    def __init__(self):
+        super().__init__()
+        self.texts = 0
+        self.failing = False
+
+    def get_embeddings(self, texts):
+        if self.failing:
+            raise ConnectionError("embedding failed")
+        self.texts += len(texts)
+        return super().get_embeddings(texts)
+
+
+def paragraph(rng: random.Random, words: int = 180) -> str:
+    return " ".join(rng.choice(WORDS) + str(rng.randint(0, 999)) for _ in range(words))
+
+
+def make_documents(count: int, unique_pages: int, seed: int = 0):
+    rng = random.Random(seed)
+    disclaimer = paragraph(rng)
+    appendix = paragraph(rng).split()
+    documents = {}
+    for i in range(count):
+        edited = list(appendix)
+        edited[rng.randrange(len(edited))] = f"revision{i}"
+        texts = [paragraph(rng) for _ in range(unique_pages)] + [disclaimer, " ".join(edited), f"  {disclaimer}\n"]
+        documents[f"doc-{i:04d}.pdf"] = [(text, {"page": page}) for page, text in enumerate(texts)]
+    return documents
+
+
+def ingest(documents, deduplicator=None):
+    provider = CountingProvider()
+    service = EmbeddingService(StandInLoader(), provider, FakeVectorStore(), batch_size=32, deduplicator=deduplicator)
+    chunk_ids = {}
+    started = time.perf_counter()
+    for source, pages in documents.items():
+        chunk_ids[source] = service.process_pages(pages, source=source)
+    return service, provider, chunk_ids, time.perf_counter() - started
+
+
+def check(service, chunk_ids, step: str) -> None:
+    stored = set(service.vector_store._chunks)
+    missing = {source: len(set(ids) - stored) for source, ids in chunk_ids.items() if set(ids) - stored}
+    assert not missing, f"after {step}, chunks missing for {missing}"
+    referenced = set().union(*chunk_ids.values()) if chunk_ids else set()
+    orphaned = stored - referenced
+    assert not orphaned, f"after {step}, {len(orphaned)} chunks no document references"
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    unique_pages = int(sys.argv[2]) if len(sys.argv) > 2 else 6
+    documents = make_documents(count, unique_pages)
+    chunks = sum(len(pages) for pages in documents.values())
+
+    with tempfile.TemporaryDirectory() as path:
+        print(f"{count} documents, {chunks} chunks")
+        sources = list(documents)
+        for name, near in (("no dedup", None), ("exact", False), ("near", True)):
+            deduplicator = None if near is None else ChunkDeduplicator(f"{path}/{name}.sqlite3", "benchmark", near_duplicates=near)
+            service, provider, chunk_ids, elapsed = ingest(documents, deduplicator)
+            print(f"  {name:>8}: {provider.texts} texts embedded, {len(service.vector_store)} chunks stored, {elapsed:.2f}s")
+
+        # A document that fails to embed references nothing, so it can't keep shared chunks alive
+        before = service.deduplicator.stats()
+        provider.failing = True
+        try:
+            service.process_pages(documents[sources[0]] + [("a page of its own", {"page": 99})], source="failing.pdf")
+        except ConnectionError:
+            pass
+        provider.failing = False
+        assert service.deduplicator.stats() == before, "a failed document left references behind"
+
+        # Delete the owners of the shared chunks first, then re-ingest changed documents
+        embedded = provider.texts
+        for source in sources[:count // 2]:
+            service.delete_by_source(source)
+            del chunk_ids[source]
+            check(service, chunk_ids, f"deleting {source}")
+        for source in sources[count // 2:count // 2 + 10]:
+            pages = documents[source][1:]
+            new_ids = service.process_pages(pages, source=source)
+            service.delete_ids(sorted(set(chunk_ids[source]) - set(new_ids)), source=source)
+            chunk_ids[source] = new_ids
+            check(service, chunk_ids, f"re-ingesting {source}")
+        service.delete_by_sources(sources[count // 2:])
+        chunk_ids.clear()
+        check(service, chunk_ids, "deleting every document")
+        assert provider.texts == embedded, f"moving shared chunks embedded {provider.texts - embedded} texts"
+        print(f"  deletes and re-ingestion kept shared chunks consistent: {service.deduplicator.stats()}")
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Generates a deterministic corpus of text PDFs for benchmarks.
+
+Pages hold Zipf-distributed words with a few identifiers mixed in, laid
+out as lines of Helvetica text that pypdf extracts like a real report.
+"""
+
+import random
+from typing import Dict, List
+
+WORDS_PER_LINE = 12
+LINES_PER_PAGE = 45
+_VOCABULARY = [
+    "agreement", "party", "clause", "termination", "service", "request", "payment", "liability",
+    "document", "section", "notice", "period", "response", "error", "status", "endpoint",
+    "the", "of", "and", "to", "in", "a", "is", "that", "for", "on", "with", "as", "by", "be",
+]
+
+
+def _words(rng: random.Random, count: int) -> List[str]:
+    words = []
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.01:
+            words.append(f"ERR-{rng.randint(100, 999)}")
+        elif roll < 0.02:
+            words.append(f"{rng.randint(1, 20)}.{rng.randint(1, 9)}.{rng.randint(1, 9)}")
+        elif roll < 0.3:
+            words.append(f"term{int(rng.paretovariate(1.1)) % 5000}")
+        else:
+            words.append(rng.choice(_VOCABULARY))
+    return words
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(pages: int, seed: int = 0, words_per_page: int = WORDS_PER_LINE * LINES_PER_PAGE) -> bytes:
+    """A PDF of ``pages`` text pages, identical for the same arguments."""
+    rng = random.Random(seed)
+    page_count = max(pages, 1)
+    # Objects: 1 catalog, 2 page tree, 3 font, then a page and its content stream per page
+    objects: List[bytes] = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        ("<< /Type /Pages /Kids [%s] /Count %d >>" % (
+            " ".join(f"{4 + 2 * i} 0 R" for i in range(page_count)), page_count
+        )).encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i in range(page_count):
+        words = _words(rng, words_per_page)
+        lines = [" ".join(words[j:j + WORDS_PER_LINE]) for j in range(0, len(words), WORDS_PER_LINE)]
+        ops = ["BT", "/F1 9 Tf", "11 TL", "40 800 Td"]
+        for line in lines:
+            ops.append(f"({_escape(line)}) Tj T*")
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>".encode()
+        )
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def generate_corpus(files: int, pages: int, prefix: str = "corpus/", seed: int = 0) -> Dict[str, bytes]:
+    """Object keys and PDF bytes; page counts vary between half and twice ``pages``."""
+    rng = random.Random(seed)
+    return {
+        f"{prefix}doc-{i:05d}.pdf": make_pdf(rng.randint(max(pages // 2, 1), pages * 2), seed=seed * 100_003 + i)
+        for i in range(files)
+    }
@@ -0,0 +1,47 @@
+"""
+Compares the memory and parse cost of embeddings held as List[List[float]]
+with a contiguous float32 matrix.
+
+Usage: python -m benchmarks.embedding_memory [chunks] [dim]
+"""
+
+import sys
+import json
+import time
+import random
+import tracemalloc
+
+import numpy as np
+import orjson
+
+
+def measure(build):
+    tracemalloc.start()
+    started = time.perf_counter()
+    value = build()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    current = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return value, current, peak, elapsed
+
+
+def main(chunks: int = 2000, dim: int = 768) -> None:
+    rng = random.Random(0)
+    payload = json.dumps([[rng.uniform(-1, 1) for _ in range(dim)] for _ in range(chunks)]).encode()
+
+    _, list_bytes, list_peak, list_time = measure(lambda: json.loads(payload))
+    _, array_bytes, array_peak, array_time = measure(
+        lambda: np.array(orjson.loads(payload), dtype=np.float32, order="C")
+    )
+
+    print(f"chunks x dim:              {chunks} x {dim}")
+    print(f"List[List[float]] (json):  {list_bytes / 2**20:8.1f} MiB held, "
+          f"{list_peak / 2**20:8.1f} MiB peak, {list_time:.3f}s")
+    print(f"float32 matrix (orjson):   {array_bytes / 2**20:8.1f} MiB held, "
+          f"{array_peak / 2**20:8.1f} MiB peak, {array_time:.3f}s")
+    print(f"held memory ratio:         {list_bytes / max(array_bytes, 1):.1f}x")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,312 @@
+"""
+In-process stand-ins for TEI, Chroma and MinIO used by the benchmarks.
+
+Each fake takes a ``Faults`` describing its latency per call and per item
+and the fraction of calls that fail, drawn from a seeded generator so runs
+are reproducible.
+"""
+
+import io
+import re
+import time
+import bisect
+import random
+import hashlib
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from botocore.exceptions import ClientError
+
+from backend.app.domain.protocols import (
+    DocumentChunk,
+    EmbeddingProviderProtocol,
+    SearchResult,
+    TokenizerProtocol,
+    VectorStoreProtocol
+)
+from backend.app.services.embeddings.vector_store_events import ChangeNotifier, chunk_sources
+
+_TOKEN_PATTERN = re.compile(r"\w{1,4}|[^\w\s]")
+
+
+class InjectedFault(ConnectionError):
+    """A failure raised on purpose by a fake."""
+
+
+class Faults:
+    def __init__(self, latency: float = 0.0, per_item: float = 0.0, error_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.per_item = per_item
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+
+    def call(self, items: int = 1, what: str = "call") -> None:
+        """Sleep for the call's latency, then fail it at the configured rate."""
+        delay = self.latency + self.per_item * items
+        if delay:
+            time.sleep(delay)
+        with self._lock:
+            self.calls += 1
+            fail = self.error_rate and self._rng.random() < self.error_rate
+            if fail:
+                self.failures += 1
+        if fail:
+            raise InjectedFault(f"injected {what} failure")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"latency": self.latency, "per_item": self.per_item, "error_rate": self.error_rate}
+
+
+class FakeTokenizer(TokenizerProtocol):
+    """Subword-like tokens of at most four characters, one request per batch."""
+
+    def __init__(self, faults: Optional[Faults] = None):
+        self.faults = faults or Faults()
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.token_offsets(text))
+
+    def token_offsets(self, text: str) -> List[Tuple[int, int]]:
+        return self.token_offsets_batch([text])[0]
+
+    def token_offsets_batch(self, texts: List[str]) -> List[List[Tuple[int, int]]]:
+        self.faults.call(len(texts), "tokenize")
+        return [[match.span() for match in _TOKEN_PATTERN.finditer(text)] for text in texts]
+
+
+class FakeEmbeddingProvider(EmbeddingProviderProtocol):
+    """Unit vectors derived from a hash of each text, so equal texts embed equally."""
+
+    def __init__(self, dim: int = 384, faults: Optional[Faults] = None):
+        self.dim = dim
+        self.faults = faults or Faults()
+
+    def get_embeddings(self, texts: List[str]) -> np.ndarray:
+        self.faults.call(len(texts), "embed")
+        seeds = [int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little") for text in texts]
+        embeddings = np.stack([np.random.default_rng(seed).standard_normal(self.dim, dtype=np.float32) for seed in seeds])
+        return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+
+class FakeVectorStore(ChangeNotifier, VectorStoreProtocol):
+    """Chunks and embeddings in dictionaries, searched exactly by inner product."""
+
+    def __init__(self, faults: Optional[Faults] = None):
+        self.faults = faults or Faults()
+        self._lock = threading.Lock()
+        self._chunks: Dict[str, DocumentChunk] = {}
+        self._embeddings: Dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self._chunks)
+
+    def add_documents(self, chunks: List[DocumentChunk], embeddings: np.ndarray) -> None:
+        if len(chunks) != len(embeddings):
+            raise ValueError(f"Mismatch between chunks ({len(chunks)}) and embeddings ({len(embeddings)})")
+        self.faults.call(len(chunks), "upsert")
+        with self._lock:
+            for chunk, embedding in zip(chunks, embeddings):
+                self._chunks[chunk.id] = chunk
+                self._embeddings[chunk.id] = np.asarray(embedding, dtype=np.float32)
+        self._notify_change(chunk_sources(chunks), embeddings)
+
+    def delete_ids(self, ids: List[str]) -> None:
+        self.faults.call(len(ids), "delete")
+        with self._lock:
+            for chunk_id in ids:
+                self._chunks.pop(chunk_id, None)
+                self._embeddings.pop(chunk_id, None)
+        self._notify_change(None)
+
+    def delete_by_source(self, source: str) -> None:
+        self.delete_by_sources([source])
+
+    def delete_by_sources(self, sources: List[str]) -> None:
+        self.faults.call(len(sources), "delete")
+        wanted = set(sources)
+        with self._lock:
+            for chunk_id in [chunk_id for chunk_id, chunk in self._chunks.items() if chunk.metadata.get("source") in wanted]:
+                del self._chunks[chunk_id]
+                del self._embeddings[chunk_id]
+        self._notify_change(sources)
+
+    def search(
+        self,
+        query_embedding: np.ndarray,
+        top_k: int = 5,
+        where: Optional[Dict[str, Any]] = None
+    ) -> List[SearchResult]:
+        self.faults.call(1, "search")
+        with self._lock:
+            ids = [chunk_id for chunk_id, chunk in self._chunks.items() if _matches(chunk.metadata, where)]
+            if not ids:
+                return []
+            scores = np.stack([self._embeddings[chunk_id] for chunk_id in ids]) @ np.asarray(query_embedding, dtype=np.float32)
+            best = np.argsort(-scores)[:top_k]
+            return [self._result(ids[i], float(scores[i])) for i in best]
+
+    @staticmethod
+    def similarity(embeddings: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        return np.atleast_2d(embeddings) @ np.atleast_2d(queries).T
+
+    def get_documents(self, ids: List[str], where: Optional[Dict[str, Any]] = None) -> List[SearchResult]:
+        with self._lock:
+            return [
+                self._result(chunk_id, 0.0) for chunk_id in ids
+                if chunk_id in self._chunks and _matches(self._chunks[chunk_id].metadata, where)
+            ]
+
+    def get_embeddings(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        with self._lock:
+            return {chunk_id: self._embeddings[chunk_id] for chunk_id in ids if chunk_id in self._embeddings}
+
+    def _result(self, chunk_id: str, score: float) -> SearchResult:
+        chunk = self._chunks[chunk_id]
+        return SearchResult(id=chunk_id, content=chunk.content, metadata=chunk.metadata, score=score)
+
+
+def _matches(metadata: Dict[str, Any], where: Optional[Dict[str, Any]]) -> bool:
+    for key, value in (where or {}).items():
+        if isinstance(value, dict) and "$in" in value:
+            if metadata.get(key) not in value["$in"]:
+                return False
+        elif metadata.get(key) != value:
+            return False
+    return True
+
+
+class _Body:
+    def __init__(self, data: bytes):
+        self._stream = io.BytesIO(data)
+
+    def read(self, size: int = -1) -> bytes:
+        return self._stream.read(size)
+
+    def iter_chunks(self, chunk_size: int = 1024 * 1024):
+        while True:
+            chunk = self._stream.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def close(self) -> None:
+        self._stream.close()
+
+
+class FakeS3:
+    """
+    Just enough of a boto3 S3 client for the file processor: paginated
+    listing, heads, downloads, uploads and deletes over objects held in
+    memory, with ``faults`` applied to each request and ``mib_per_second``
+    bounding transfer speed.
+    """
+
+    page_size = 1000
+
+    def __init__(self, objects: Optional[Dict[str, bytes]] = None, faults: Optional[Faults] = None, mib_per_second: float = 0.0):
+        self.faults = faults or Faults()
+        self.seconds_per_byte = 1 / (mib_per_second * 2**20) if mib_per_second else 0.0
+        self._lock = threading.Lock()
+        self._objects: Dict[str, Tuple[bytes, str, datetime]] = {}
+        self._keys: List[str] = []
+        for key, data in (objects or {}).items():
+            self.put_object(Bucket="", Key=key, Body=data)
+        self.faults.calls = 0
+
+    def put_object(self, Bucket: str, Key: str, Body: Any, **kwargs) -> Dict[str, Any]:
+        data = Body if isinstance(Body, bytes) else Body.read()
+        self.faults.call(1, "put")
+        etag = f'"{hashlib.md5(data).hexdigest()}"'
+        with self._lock:
+            if Key not in self._objects:
+                bisect.insort(self._keys, Key)
+            self._objects[Key] = (data, etag, datetime.now(timezone.utc))
+        return {"ETag": etag}
+
+    def head_bucket(self, Bucket: str) -> Dict[str, Any]:
+        return {}
+
+    def create_bucket(self, Bucket: str) -> Dict[str, Any]:
+        return {}
+
+    def head_object(self, Bucket: str, Key: str) -> Dict[str, Any]:
+        self.faults.call(1, "head")
+        data, etag, modified = self._get(Key)
+        return {"ETag": etag, "ContentLength": len(data), "LastModified": modified}
+
+    def get_object(self, Bucket: str, Key: str) -> Dict[str, Any]:
+        data, etag, modified = self._get(Key)
+        self._transfer(len(data))
+        return {"Body": _Body(data), "ETag": etag, "ContentLength": len(data), "LastModified": modified}
+
+    def download_file(self, Bucket: str, Key: str, Filename: str) -> None:
+        data, _, _ = self._get(Key)
+        self._transfer(len(data))
+        with open(Filename, "wb") as f:
+            f.write(data)
+
+    def delete_object(self, Bucket: str, Key: str) -> Dict[str, Any]:
+        self.faults.call(1, "delete")
+        self._remove([Key])
+        return {}
+
+    def delete_objects(self, Bucket: str, Delete: Dict[str, Any]) -> Dict[str, Any]:
+        self.faults.call(len(Delete["Objects"]), "delete")
+        self._remove([entry["Key"] for entry in Delete["Objects"]])
+        return {"Errors": []}
+
+    def list_objects_v2(self, Bucket: str, Prefix: str = "", StartAfter: Optional[str] = None,
+                        ContinuationToken: Optional[str] = None, MaxKeys: int = 1000) -> Dict[str, Any]:
+        self.faults.call(1, "list")
+        with self._lock:
+            after = ContinuationToken or StartAfter or ""
+            start = bisect.bisect_right(self._keys, after) if after else 0
+            start = max(start, bisect.bisect_left(self._keys, Prefix))
+            contents = []
+            for key in self._keys[start:]:
+                if not key.startswith(Prefix) or len(contents) == min(MaxKeys, self.page_size):
+                    break
+                data, etag, modified = self._objects[key]
+                contents.append({"Key": key, "ETag": etag, "Size": len(data), "LastModified": modified})
+            next_index = start + len(contents)
+            truncated = next_index < len(self._keys) and self._keys[next_index].startswith(Prefix)
+
+        response = {"Contents": contents, "IsTruncated": truncated, "KeyCount": len(contents)}
+        if truncated:
+            response["NextContinuationToken"] = contents[-1]["Key"]
+        return response
+
+    def get_paginator(self, operation: str) -> "FakeS3":
+        assert operation == "list_objects_v2"
+        return self
+
+    def paginate(self, **params):
+        while True:
+            page = self.list_objects_v2(**params)
+            yield page
+            if not page["IsTruncated"]:
+                return
+            params["ContinuationToken"] = page["NextContinuationToken"]
+
+    def _get(self, key: str) -> Tuple[bytes, str, datetime]:
+        with self._lock:
+            found = self._objects.get(key)
+        if found is None:
+            raise ClientError({"Error": {"Code": "NoSuchKey", "Message": f"{key} not found"}}, "GetObject")
+        return found
+
+    def _transfer(self, size: int) -> None:
+        self.faults.call(1, "get")
+        if self.seconds_per_byte:
+            time.sleep(size * self.seconds_per_byte)
+
+    def _remove(self, keys: List[str]) -> None:
+        with self._lock:
+            for key in keys:
+                if self._objects.pop(key, None) is not None:
+                    del self._keys[bisect.bisect_left(self._keys, key)]
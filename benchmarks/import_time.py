@@ -0,0 +1,138 @@
+"""
+Checks that importing and starting the application stay within a time budget.
+
+``backend.app.main`` is imported in fresh interpreters, each timing its
+own import and then the lifespan startup (``ServiceRegistry.start``, with
+the warm-up that follows it left out); the medians are compared with
+--budget and --startup-budget. Neither may load the heavy dependencies
+meant to load on first use (PDF parsers, chromadb, boto3), and the import
+must not create the state or upload directories. The modules with the
+largest cumulative import time are listed from ``-X importtime``. Exits
+non-zero when a check fails, so it can gate CI.
+
+Usage: python -m benchmarks.import_time [--budget SECONDS] [--startup-budget SECONDS] [--runs N]
+"""
+
+import os
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+from typing import Dict, List, Tuple
+
+# Loaded on first use, never by importing the application
+LAZY_MODULES = ("chromadb", "langchain_community", "langchain_core", "pypdf", "boto3", "botocore")
+
+_CHILD = """
+import os, sys, json, time
+lazy = json.loads(sys.argv[1])
+started = time.perf_counter()
+import backend.app.main
+elapsed = time.perf_counter() - started
+loaded = [name for name in lazy if name in sys.modules]
+created = [path for path in (os.environ["STATE_DIR"], os.environ["UPLOAD_DIR"]) if os.path.exists(path)]
+
+# The warm-up loads the heavy dependencies on purpose, after startup
+from backend.app.core.registry import ServiceRegistry
+ServiceRegistry._keep_warming_up = lambda self: None
+registry = ServiceRegistry()
+started = time.perf_counter()
+registry.start()
+startup = time.perf_counter() - started
+loaded_at_startup = [name for name in lazy if name in sys.modules and name not in loaded]
+registry.close()
+
+print(json.dumps({
+    "seconds": elapsed,
+    "startup_seconds": startup,
+    "loaded": loaded,
+    "loaded_at_startup": loaded_at_startup,
+    "created": created,
+}))
+"""
+
+
+def child_env(state_dir: str) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update({
+        "CHROMA_HOST": "localhost",
+        "CHROMA_PORT": "8000",
+        "MINIO_ENDPOINT": "http://localhost:9000",
+        "MINIO_ACCESS_KEY": "benchmark",
+        "MINIO_SECRET_KEY": "benchmark",
+        "MINIO_BUCKET": "benchmark",
+        "BASE_COLLECTION_NAME": "benchmark",
+        "EMBEDDING_MODEL": "fake",
+        "EMBEDDING_BASE_URL": "http://localhost:1",
+        "WARM_UP_IN_BACKGROUND": "true",
+        "STATE_DIR": os.path.join(state_dir, "state"),
+        "UPLOAD_DIR": os.path.join(state_dir, "uploads"),
+        "PYTHONPATH": os.pathsep.join(filter(None, [os.getcwd(), env.get("PYTHONPATH")])),
+    })
+    return env
+
+
+def slowest_imports(env: Dict[str, str], count: int) -> List[Tuple[str, float]]:
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import backend.app.main"],
+        env=env, capture_output=True, text=True, check=True
+    )
+    cumulative = []
+    for line in completed.stderr.splitlines():
+        fields = line.split("|")
+        if len(fields) == 3 and fields[1].strip().isdigit():
+            cumulative.append((fields[2].strip(), int(fields[1]) / 1e6))
+    return sorted(cumulative, key=lambda item: -item[1])[:count]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--budget", type=float, default=1.5, help="seconds allowed for the median import")
+    parser.add_argument("--startup-budget", type=float, default=0.25, help="seconds allowed for the median startup")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to time")
+    parser.add_argument("--top", type=int, default=10, help="slowest modules to list")
+    args = parser.parse_args()
+
+    failures = []
+    with tempfile.TemporaryDirectory() as state_dir:
+        runs = []
+        for run in range(args.runs):
+            # Startup creates the directories, so every run gets its own
+            env = child_env(os.path.join(state_dir, str(run)))
+            completed = subprocess.run(
+                [sys.executable, "-c", _CHILD, json.dumps(LAZY_MODULES)],
+                env=env, capture_output=True, text=True, check=True
+            )
+            runs.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+        slowest = slowest_imports(env, args.top)
+
+    median = statistics.median(run["seconds"] for run in runs)
+    startup = statistics.median(run["startup_seconds"] for run in runs)
+    print(f"import backend.app.main: median {median:.3f}s over {args.runs} runs (budget {args.budget:.3f}s)")
+    print(f"ServiceRegistry.start:   median {startup:.3f}s over {args.runs} runs (budget {args.startup_budget:.3f}s)")
+    for name, seconds in slowest:
+        print(f"  {seconds:8.3f}s  {name}")
+
+    if median > args.budget:
+        failures.append(f"median import time {median:.3f}s exceeds the budget of {args.budget:.3f}s")
+    loaded = sorted({name for run in runs for name in run["loaded"]})
+    if loaded:
+        failures.append(f"modules meant to load on first use were imported: {', '.join(loaded)}")
+    if startup > args.startup_budget:
+        failures.append(f"median startup time {startup:.3f}s exceeds the budget of {args.startup_budget:.3f}s")
+    loaded_at_startup = sorted({name for run in runs for name in run["loaded_at_startup"]})
+    if loaded_at_startup:
+        failures.append(f"modules meant to load on first use were imported at startup: {', '.join(loaded_at_startup)}")
+    created = sorted({os.path.basename(path) for run in runs for path in run["created"]})
+    if created:
+        failures.append(f"importing created directories: {', '.join(created)}")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Simulates replicas sharing a bucket sync through the lease store.
+
+Each replica is a separate process that claims work items from one SQLite
+lease store and "ingests" them by sleeping. One replica can be made to
+crash after its first claim; its leases expire and are picked up by the
+others. Reports wall time per replica count and checks that every item
+was completed exactly once (crashed leases aside).
+
+Usage: python -m benchmarks.lease_claiming [items] [seconds_per_item]
+"""
+
+import os
+import sys
+import time
+import tempfile
+import multiprocessing
+from datetime import datetime, timezone
+
+from backend.app.services.jobs.lease_store import LeaseStore, DONE
+
+
+def make_objects(count: int):
+    now = datetime.now(timezone.utc)
+    return [
+        {"Key": f"doc-{i:05d}.pdf", "ETag": f'"{i:032x}"', "Size": 1024, "LastModified": now}
+        for i in range(count)
+    ]
+
+
+def replica(path: str, work: float, ttl: float, crash: bool, counts) -> None:
+    store = LeaseStore(path, ttl)
+    owner = f"replica-{os.getpid()}"
+    done = 0
+    with store.keep_alive(owner):
+        while True:
+            items = store.claim(owner, 4)
+            if not items:
+                break
+            if crash:
+                # Leave the leases behind without renewing them
+                os._exit(1)
+            for item in items:
+                time.sleep(work)
+                store.complete(item["id"], owner)
+                done += 1
+    counts[owner] = done
+    store.close()
+
+
+def run(replicas: int, items: int, work: float, crash: bool = False):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "leases.sqlite3")
+        store = LeaseStore(path, ttl=1.0)
+        store.enqueue(make_objects(items))
+
+        ctx = multiprocessing.get_context("spawn")
+        with ctx.Manager() as manager:
+            counts = manager.dict()
+            processes = [
+                ctx.Process(target=replica, args=(path, work, 1.0, crash and i == 0, counts))
+                for i in range(replicas)
+            ]
+            started = time.perf_counter()
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+            elapsed = time.perf_counter() - started
+            completed = sum(counts.values())
+
+        remaining = store._conn.execute(
+            "SELECT COUNT(*) FROM work_items WHERE status != ?", (DONE,)
+        ).fetchone()[0]
+        store.close()
+    return elapsed, completed, remaining
+
+
+def main() -> None:
+    items = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    work = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+
+    baseline = None
+    for replicas in (1, 2, 4):
+        elapsed, completed, remaining = run(replicas, items, work)
+        baseline = baseline or elapsed
+        print(
+            f"{replicas} replica(s): {elapsed:.2f}s, speedup {baseline / elapsed:.2f}x, "
+            f"completed {completed}/{items}, left {remaining}"
+        )
+
+    elapsed, completed, remaining = run(3, items, work, crash=True)
+    print(f"3 replicas, one crashing: {elapsed:.2f}s, completed {completed}/{items}, left {remaining}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Measures what the BM25 lexical index adds to ingestion, and its queries.
+
+Runs EmbeddingService over generated chunks of Zipf-distributed words,
+with a stand-in embedding provider taking ``embed_ms`` per batch and a
+LocalVectorStore in a temporary directory, once without and once with
+the lexical index, and reports the ingestion overhead. Then reports
+keyword and hybrid query latency and checks that an exact identifier
+buried in one chunk is found by keyword search.
+
+Usage: python -m benchmarks.lexical_index [chunks] [embed_ms]
+"""
+
+import sys
+import time
+import tempfile
+
+import numpy as np
+
+from backend.app.domain.protocols import DocumentChunk
+from backend.app.services.embeddings.embedding_service import EmbeddingService
+from backend.app.services.embeddings.local_vector_store import LocalVectorStore
+from backend.app.services.search.lexical_index import LexicalIndex
+from backend.app.services.search.search_service import SearchService, LEXICAL, HYBRID
+from benchmarks.fakes import FakeEmbeddingProvider, Faults
+from benchmarks.stats import percentiles
+
+DIM = 384
+WORDS_PER_CHUNK = 200
+IDENTIFIER = "ERR-4711"
+
+
+class StandInLoader:
+    """Splits nothing: pages are already chunks."""
+
+    def lazy_split_pages(self, pages, chunk_size, chunk_overlap, source=None):
+        for i, (text, metadata) in enumerate(pages):
+            yield DocumentChunk(content=text, metadata={**metadata, "source": source, "chunk_index": i}, id=f"{source}-{i}")
+
+
+def make_pages(count: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    vocabulary = np.array([f"w{i}" for i in range(20_000)])
+    words = np.minimum(rng.zipf(1.3, size=(count, WORDS_PER_CHUNK)) - 1, len(vocabulary) - 1)
+    pages = [(" ".join(vocabulary[row]), {"page": i}) for i, row in enumerate(words)]
+    text, metadata = pages[count // 2]
+    pages[count // 2] = (f"{text} raised {IDENTIFIER} while parsing", metadata)
+    return pages
+
+
+def ingest(pages, embed_ms: float, with_index: bool, path: str):
+    store = LocalVectorStore(f"{path}/vectors")
+    index = LexicalIndex(f"{path}/lexical") if with_index else None
+    service = EmbeddingService(StandInLoader(), FakeEmbeddingProvider(DIM, Faults(embed_ms / 1000)), store, batch_size=32, lexical_index=index)
+    started = time.perf_counter()
+    for start in range(0, len(pages), 500):
+        service.process_pages(pages[start:start + 500], source=f"doc-{start // 500}.pdf")
+    return time.perf_counter() - started, service
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    embed_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+    pages = make_pages(count)
+
+    with tempfile.TemporaryDirectory() as base, tempfile.TemporaryDirectory() as indexed:
+        baseline, service = ingest(pages, embed_ms, False, base)
+        service.close()
+        with_index, service = ingest(pages, embed_ms, True, indexed)
+        print(f"{count} chunks, {embed_ms:.0f} ms per embedding batch")
+        print(f"  ingestion without index: {baseline:.2f}s, with index: {with_index:.2f}s "
+              f"({(with_index / baseline - 1) * 100:+.1f}%)")
+
+        index = service.lexical_index
+        started = time.perf_counter()
+        index.add([DocumentChunk(content=text, metadata={"source": "again.pdf"}, id=f"again-{i}") for i, (text, _) in enumerate(pages)])
+        print(f"  indexing alone: {count / (time.perf_counter() - started):,.0f} chunks/s, {index.stats()}")
+        index.delete_sources(["again.pdf"])
+
+        search = SearchService(FakeEmbeddingProvider(DIM), service.vector_store, lexical_index=index, result_cache_size=0)
+        rng = np.random.default_rng(1)
+        queries = [f"w{a} w{b} w{c}" for a, b, c in rng.integers(0, 2000, size=(300, 3))]
+        for mode in (LEXICAL, HYBRID):
+            samples = []
+            for query in queries:
+                started = time.perf_counter()
+                search.search(query, 10, mode=mode)
+                samples.append(time.perf_counter() - started)
+            print(f"  {mode} queries: {percentiles(samples)}")
+
+        hits = search.search(IDENTIFIER, 5, mode=LEXICAL)
+        assert hits and IDENTIFIER in hits[0].content, "identifier not found by keyword search"
+        print(f"  '{IDENTIFIER}' found by keyword search in {hits[0].id}")
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
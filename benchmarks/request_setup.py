@@ -0,0 +1,63 @@
+"""
+Measures the per-request cost of building clients and services.
+
+Compares constructing the embedding service, file processor and S3 client
+for every request (as before the service registry) with looking them up in
+a registry built once. Needs the usual service environment variables; the
+startup bucket and collection checks are skipped so no services need to be
+running.
+
+Usage: python -m benchmarks.request_setup [requests]
+"""
+
+import sys
+import time
+import statistics
+
+from backend.app.core.registry import ServiceRegistry
+from backend.app.services.embeddings.factory import EmbeddingServiceFactory
+from backend.app.services.embeddings.file_processor import FileProcessor
+from benchmarks.stats import percentile
+
+
+def per_request_setup() -> None:
+    embedding_service = EmbeddingServiceFactory.create()
+    file_processor = FileProcessor()
+    file_processor.s3_client
+    file_processor.close()
+    embedding_service.close()
+
+
+def registry_lookup(registry: ServiceRegistry) -> None:
+    registry.embedding_service
+    registry.file_processor
+    registry.s3_client
+
+
+def timed(func, requests: int):
+    samples = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return statistics.mean(samples), percentile(samples, 99)
+
+
+def main(requests: int = 200) -> None:
+    registry = ServiceRegistry()
+    spec = EmbeddingServiceFactory.default_spec()
+    registry.index = registry._open_index(spec, *registry.build_index(spec))
+    registry.file_processor = FileProcessor()
+    registry.s3_client
+
+    setup_mean, setup_p99 = timed(per_request_setup, requests)
+    lookup_mean, lookup_p99 = timed(lambda: registry_lookup(registry), requests)
+    registry.close()
+
+    print(f"requests:            {requests}")
+    print(f"per-request setup:   mean {setup_mean * 1000:8.3f} ms, p99 {setup_p99 * 1000:8.3f} ms")
+    print(f"registry lookup:     mean {lookup_mean * 1000:8.3f} ms, p99 {lookup_p99 * 1000:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
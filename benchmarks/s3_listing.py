@@ -0,0 +1,50 @@
+"""
+Measures listing a large bucket through the paginated object generator.
+
+Runs FileProcessor.iter_pdf_objects against the in-memory FakeS3, which
+follows list_objects_v2 paging (1000 keys per page, Prefix, StartAfter and
+continuation tokens), reporting the time to the first key, the total time
+and that no key is lost past the first page. Needs the usual service
+environment variables; no services need to be running.
+
+Usage: python -m benchmarks.s3_listing [objects]
+"""
+
+import sys
+import time
+
+from backend.app.services.embeddings.file_processor import FileProcessor
+from benchmarks.fakes import FakeS3
+
+# Seconds per list_objects_v2 request
+LIST_LATENCY = 0.005
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    keys = [f"docs/{i // 1000:04d}/file-{i:07d}.pdf" for i in range(count)]
+    keys += [f"docs/{i:04d}/notes.txt" for i in range(count // 1000)]
+    # Filled in key order, so each put appends; only the listing pays latency
+    s3 = FakeS3({key: b"" for key in sorted(keys)})
+    s3.faults.latency = LIST_LATENCY
+    s3.faults.calls = 0
+    processor = FileProcessor(s3)
+
+    started = time.perf_counter()
+    objects = processor.iter_pdf_objects()
+    next(objects)
+    first = time.perf_counter() - started
+    listed = 1 + sum(1 for _ in objects)
+    total = time.perf_counter() - started
+    print(f"{count} objects: first key after {first * 1000:.1f} ms, all {listed} after {total:.2f}s, {s3.faults.calls} pages")
+    assert listed == count, f"listed {listed} of {count} PDFs"
+
+    s3.faults.calls = 0
+    cursor = keys[count // 2]
+    resumed = sum(1 for _ in processor.iter_pdf_objects("docs/", start_after=cursor))
+    print(f"resumed after {cursor}: {resumed} objects, {s3.faults.calls} pages")
+    assert resumed == count - count // 2 - 1
+
+
+if __name__ == "__main__":
+    main()
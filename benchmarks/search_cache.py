@@ -0,0 +1,97 @@
+"""
+Measures search latency with and without the query and result caches.
+
+Fills a LocalVectorStore in a temporary directory with random unit
+vectors, then replays a skewed query stream (a few popular queries, many
+rare ones) through SearchService with a stand-in embedding provider that
+takes ``embed_ms`` per call like a TEI round trip. Reports p50/p99 of
+cache hits and misses, the hit rate, and checks that writing or deleting
+a source drops exactly the cached results it could change.
+
+Usage: python -m benchmarks.search_cache [chunks] [queries] [embed_ms]
+"""
+
+import sys
+import time
+import random
+import tempfile
+
+import numpy as np
+
+from backend.app.domain.protocols import DocumentChunk
+from backend.app.services.embeddings.local_vector_store import LocalVectorStore
+from backend.app.services.search.search_service import SearchService
+from benchmarks.fakes import FakeEmbeddingProvider, Faults
+from benchmarks.stats import percentiles
+
+DIM = 384
+
+
+def fill(store: LocalVectorStore, count: int, sources: int = 100) -> None:
+    rng = np.random.default_rng(0)
+    for start in range(0, count, 1000):
+        end = min(start + 1000, count)
+        chunks = [
+            DocumentChunk(content=f"chunk {i}", metadata={"source": f"doc-{i % sources}.pdf", "chunk_index": i}, id=f"c-{i}")
+            for i in range(start, end)
+        ]
+        embeddings = rng.standard_normal((end - start, DIM)).astype(np.float32)
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+        store.add_documents(chunks, embeddings)
+
+
+def main() -> None:
+    chunks = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    queries = int(sys.argv[2]) if len(sys.argv) > 2 else 5_000
+    embed_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 20.0
+
+    with tempfile.TemporaryDirectory() as path:
+        store = LocalVectorStore(path)
+        fill(store, chunks)
+        provider = FakeEmbeddingProvider(DIM, Faults(embed_ms / 1000))
+        service = SearchService(provider, store)
+
+        # Zipf-like: most traffic goes to a few hundred queries
+        rng = random.Random(0)
+        stream = [f"query {min(int(rng.paretovariate(1.2)), 5000)}" for _ in range(queries)]
+
+        hits, misses = [], []
+        for query in stream:
+            started = time.perf_counter()
+            cached = service.cached_search(query, 5)
+            if cached is None:
+                service.search(query, 5)
+                misses.append(time.perf_counter() - started)
+            else:
+                hits.append(time.perf_counter() - started)
+
+        print(f"{chunks} chunks, {queries} queries, {embed_ms:.0f} ms per embedding call")
+        print(f"  hits:   {percentiles(hits)}")
+        print(f"  misses: {percentiles(misses)}")
+        print(f"  stats:  {service.stats()}, provider calls {provider.faults.calls}")
+
+        # Deleting a source drops the results containing it and nothing else
+        popular = service.search("query 1", 5)
+        source = popular[0].metadata["source"]
+        before = service.stats()["cached_results"]
+        store.delete_by_source(source)
+        assert service.cached_search("query 1", 5) is None, "result with a deleted source was served"
+        print(f"  delete {source}: {before - service.stats()['cached_results']} of {before} cached results dropped")
+
+        # A new chunk that matches a cached query invalidates only what it outranks
+        query_embedding = provider.get_embeddings(["query 2"])[0]
+        service.search("query 2", 5)
+        before = service.stats()["cached_results"]
+        store.add_documents(
+            [DocumentChunk(content="exact match", metadata={"source": "new.pdf"}, id="new-0")],
+            query_embedding[None, :]
+        )
+        dropped = before - service.stats()["cached_results"]
+        assert service.cached_search("query 2", 5) is None, "result outranked by a new chunk was served"
+        assert service.search("query 2", 5)[0].id == "new-0"
+        print(f"  add matching chunk: {dropped} of {before} cached results dropped")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+"""
+Latency summaries shared by the benchmarks.
+"""
+
+from typing import List
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """The q-th percentile of samples, interpolating linearly between ranks."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = q / 100 * (len(ordered) - 1)
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def percentiles(samples: List[float]) -> str:
+    """p50 and p99 of latencies in seconds, formatted in milliseconds."""
+    if not samples:
+        return "n/a"
+    p50, p99 = (percentile(samples, q) * 1000 for q in (50, 99))
+    return f"p50 {p50:.3f} ms, p99 {p99:.3f} ms ({len(samples)} samples)"
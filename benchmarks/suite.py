@@ -0,0 +1,476 @@
+"""
+End-to-end ingestion and search benchmarks against in-process fakes.
+
+A generated PDF corpus is served by a fake S3 client, and tokenization,
+embedding and vector storage are fakes with configurable latency and
+error injection, so no TEI, Chroma or MinIO is needed and runs with the
+same arguments are comparable. Scenarios:
+
+- process_file: EmbeddingService.process_file over the corpus on disk
+- process_files: FileProcessor.process_files, a full sync then a no-op re-sync
+- routers: POST /embed/ and POST /search through the FastAPI app
+- faults: a sync with failing calls, then the re-sync that retries failed files
+- reindex: a sync storing page text, then a re-index job rebuilding the
+  collection with other chunking from it, without downloads or parsing
+
+Each scenario runs in its own process so its peak memory is its own. The
+report covers files/s, chunks/s, p50/p99 latency per file (per query for
+searches), peak RSS, the stage breakdown and, with --tracemalloc, the
+peak of traced Python allocations. Results are written as JSON with the
+commit and configuration; --compare prints the change against a
+previous result and exits non-zero when a metric regressed beyond
+--tolerance.
+
+Usage: python -m benchmarks.suite [--files N] [--pages N] [--output FILE] [--compare FILE]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import shutil
+import tempfile
+import subprocess
+from typing import Any, Dict, List, Optional
+
+from benchmarks.stats import percentile
+
+# Settings are read on import, so defaults go in before any backend module loads;
+# scenario processes inherit the state directory of the run that started them
+_STATE_DIR = os.environ.get("RAG_BENCHMARK_STATE_DIR") or tempfile.mkdtemp(prefix="rag-bench-")
+os.environ["RAG_BENCHMARK_STATE_DIR"] = _STATE_DIR
+for _name, _value in {
+    "CHROMA_HOST": "localhost",
+    "CHROMA_PORT": "8000",
+    "MINIO_ENDPOINT": "http://localhost:9000",
+    "MINIO_ACCESS_KEY": "benchmark",
+    "MINIO_SECRET_KEY": "benchmark",
+    "MINIO_BUCKET": "benchmark",
+    "BASE_COLLECTION_NAME": "benchmark",
+    "EMBEDDING_MODEL": "fake",
+    "EMBEDDING_BASE_URL": "http://localhost:1",
+    "UPLOAD_DIR": os.path.join(_STATE_DIR, "uploads"),
+    "STATE_DIR": _STATE_DIR,
+}.items():
+    os.environ.setdefault(_name, _value)
+
+SCENARIOS = ("process_file", "process_files", "routers", "faults", "reindex")
+# Metrics where a higher value is better; every other metric is better lower
+HIGHER_IS_BETTER = ("files_per_second", "chunks_per_second", "queries_per_second")
+
+
+def summarize(seconds: float, latencies: List[float], chunks: int, files: Optional[int] = None) -> Dict[str, Any]:
+    files = len(latencies) if files is None else files
+    return {
+        "files": files,
+        "chunks": chunks,
+        "seconds": round(seconds, 4),
+        "files_per_second": round(files / seconds, 3) if seconds else 0.0,
+        "chunks_per_second": round(chunks / seconds, 3) if seconds else 0.0,
+        "p50_file_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_file_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+class _Scenario:
+    """Builds the services one scenario runs against."""
+
+    def __init__(self, args: argparse.Namespace, work_dir: str):
+        from benchmarks.corpus import generate_corpus
+        from benchmarks.fakes import Faults
+
+        self.args = args
+        self.work_dir = work_dir
+        self.corpus = generate_corpus(args.files, args.pages, seed=args.seed)
+        self.faults = {
+            "tokenize": Faults(args.tokenize_ms / 1000, seed=args.seed),
+            "embed": Faults(args.embed_ms / 1000, args.embed_item_ms / 1000, seed=args.seed + 1),
+            "store": Faults(args.store_ms / 1000, seed=args.seed + 2),
+            "s3": Faults(args.s3_ms / 1000, seed=args.seed + 3),
+        }
+
+    def inject_errors(self, rate: float) -> None:
+        for faults in self.faults.values():
+            faults.error_rate = rate
+
+    def embedding_service(self, lexical: bool = False, spec=None):
+        from backend.app.core.config import settings
+        from backend.app.services.embeddings.batching import TokenBudgetBatcher
+        from backend.app.services.embeddings.chunk_dedup import ChunkDeduplicator
+        from backend.app.services.embeddings.document_loader import PDFDocumentLoader
+        from backend.app.services.embeddings.embedding_service import EmbeddingService
+        from backend.app.services.search.lexical_index import LexicalIndex
+        from benchmarks.fakes import FakeEmbeddingProvider, FakeTokenizer, FakeVectorStore
+
+        collection = spec.collection if spec is not None else "benchmark"
+        return EmbeddingService(
+            document_loader=PDFDocumentLoader(FakeTokenizer(self.faults["tokenize"])),
+            embedding_provider=FakeEmbeddingProvider(faults=self.faults["embed"]),
+            vector_store=FakeVectorStore(self.faults["store"]),
+            batch_size=settings.EMBEDDING_BATCH_MAX_SIZE,
+            embed_concurrency=settings.EMBEDDING_MAX_IN_FLIGHT,
+            batcher=TokenBudgetBatcher(
+                max_tokens=settings.EMBEDDING_BATCH_MAX_TOKENS,
+                max_count=settings.EMBEDDING_BATCH_MAX_SIZE,
+                target_latency=settings.EMBEDDING_BATCH_TARGET_LATENCY
+            ),
+            lexical_index=LexicalIndex(os.path.join(self.work_dir, "lexical", collection)) if lexical else None,
+            deduplicator=ChunkDeduplicator(
+                os.path.join(self.work_dir, "dedup.sqlite3"), collection, near_duplicates=self.args.dedup == "near"
+            ) if self.args.dedup != "off" else None,
+            chunk_size=spec.chunk_size if spec is not None else settings.CHUNK_SIZE,
+            chunk_overlap=spec.chunk_overlap if spec is not None else settings.CHUNK_OVERLAP
+        )
+
+    def file_processor(self, page_store=None):
+        from backend.app.services.embeddings.file_processor import FileProcessor
+        from benchmarks.fakes import FakeS3
+
+        class TimedFileProcessor(FileProcessor):
+            """Records how long each file took and how many chunks it produced."""
+
+            def __init__(self, s3_client, page_store):
+                super().__init__(s3_client, page_store)
+                self.timings: List[float] = []
+                self.chunks = 0
+
+            def _ingest_file(self, obj, *args, **kwargs):
+                started = time.perf_counter()
+                chunk_ids = super()._ingest_file(obj, *args, **kwargs)
+                self.timings.append(time.perf_counter() - started)
+                self.chunks += len(chunk_ids)
+                return chunk_ids
+
+        return TimedFileProcessor(FakeS3(self.corpus, self.faults["s3"], self.args.s3_mib_per_second), page_store)
+
+    def manifest(self, collection: str = "benchmark"):
+        from backend.app.services.embeddings.sync_manifest import SyncManifest
+        return SyncManifest(os.path.join(self.work_dir, "manifest.sqlite3"), collection)
+
+
+def sync(processor, service, manifest) -> Dict[str, Any]:
+    processor.timings, processor.chunks = [], 0
+    started = time.perf_counter()
+    response = processor.process_files(service, manifest)
+    elapsed = time.perf_counter() - started
+    result = summarize(elapsed, processor.timings, processor.chunks)
+    result.update(
+        processed=len(response.processed),
+        failed=len(response.failed),
+        skipped=response.skipped,
+    )
+    return result
+
+
+def run_process_file(scenario: _Scenario) -> Dict[str, Any]:
+    paths = []
+    for key, data in scenario.corpus.items():
+        path = os.path.join(scenario.work_dir, os.path.basename(key))
+        with open(path, "wb") as f:
+            f.write(data)
+        paths.append(path)
+
+    service = scenario.embedding_service()
+    latencies, chunks = [], 0
+    started = time.perf_counter()
+    for path in paths:
+        file_started = time.perf_counter()
+        chunks += len(service.process_file(path, source=os.path.basename(path)))
+        latencies.append(time.perf_counter() - file_started)
+    result = summarize(time.perf_counter() - started, latencies, chunks)
+    service.close()
+    return result
+
+
+def run_process_files(scenario: _Scenario) -> Dict[str, Any]:
+    service = scenario.embedding_service()
+    processor = scenario.file_processor()
+    manifest = scenario.manifest()
+    try:
+        result = sync(processor, service, manifest)
+        result["resync"] = sync(processor, service, manifest)
+    finally:
+        processor.close()
+        manifest.close()
+        service.close()
+    return result
+
+
+def run_routers(scenario: _Scenario) -> Dict[str, Any]:
+    from fastapi.testclient import TestClient
+
+    from backend.app.core.registry import ServiceRegistry
+    from backend.app.main import app
+    from backend.app.services.embeddings.factory import EmbeddingServiceFactory
+
+    # The lifespan would connect to real services, so the registry is filled in by hand
+    registry = ServiceRegistry()
+    spec = EmbeddingServiceFactory.default_spec()
+    registry.index = registry._open_index(spec, scenario.embedding_service(lexical=True, spec=spec), scenario.manifest())
+    registry.file_processor = scenario.file_processor()
+    registry.bucket_ready = True
+    app.state.registry = registry
+
+    client = TestClient(app)
+    try:
+        started = time.perf_counter()
+        response = client.post("/embed/")
+        elapsed = time.perf_counter() - started
+        response.raise_for_status()
+        result = summarize(elapsed, registry.file_processor.timings, registry.file_processor.chunks)
+
+        queries = [f"term{i} error status" for i in range(scenario.args.queries)]
+        for mode in ("vector", "lexical", "hybrid"):
+            latencies = []
+            # Every query is asked twice, so half the requests hit the result cache
+            for query in queries + queries:
+                query_started = time.perf_counter()
+                client.post("/search/", json={"query": query, "k": 10, "mode": mode}).raise_for_status()
+                latencies.append(time.perf_counter() - query_started)
+            result[f"search_{mode}"] = {
+                "queries": len(latencies),
+                "queries_per_second": round(len(latencies) / sum(latencies), 3),
+                "p50_query_ms": round(percentile(latencies, 50) * 1000, 3),
+                "p99_query_ms": round(percentile(latencies, 99) * 1000, 3),
+            }
+    finally:
+        client.close()
+        registry.close()
+    return result
+
+
+def run_faults(scenario: _Scenario) -> Dict[str, Any]:
+    service = scenario.embedding_service()
+    processor = scenario.file_processor()
+    manifest = scenario.manifest()
+    try:
+        scenario.inject_errors(scenario.args.error_rate)
+        result = sync(processor, service, manifest)
+        result["injected_failures"] = {name: faults.failures for name, faults in scenario.faults.items()}
+        # Failed files are not in the manifest, so the next sync picks them up
+        scenario.inject_errors(0.0)
+        result["recovery"] = sync(processor, service, manifest)
+    finally:
+        processor.close()
+        manifest.close()
+        service.close()
+    return result
+
+
+def run_reindex(scenario: _Scenario) -> Dict[str, Any]:
+    from backend.app.core.config import settings
+    from backend.app.schemas.index_schema import IndexSpec
+    from backend.app.services.embeddings.page_store import PageStore
+    from backend.app.services.jobs.job_runner import JobRunner
+    from backend.app.services.jobs.job_store import JobStore, COMPLETED, FAILED
+    from backend.app.utils import metrics
+
+    page_store = PageStore(os.path.join(scenario.work_dir, "pages.sqlite3"))
+    processor = scenario.file_processor(page_store)
+    service = scenario.embedding_service()
+    manifest = scenario.manifest()
+    store = JobStore(os.path.join(scenario.work_dir, "jobs.sqlite3"))
+    activated = []
+
+    def build_index(spec):
+        return scenario.embedding_service(spec=spec), scenario.manifest(spec.collection)
+
+    runner = JobRunner(
+        store,
+        processor,
+        service,
+        manifest,
+        poll_interval=0.05,
+        build_index=build_index,
+        activate_index=lambda spec, *index: activated.append(index)
+    )
+    # Job workers record their stages in this scenario's profile
+    runner._work = metrics.propagate(runner._work)
+    try:
+        # The first sync downloads and parses every PDF, storing its pages
+        result = sync(processor, service, manifest)
+        result["page_store"] = page_store.stats()
+
+        processor.timings, processor.chunks = [], 0
+        runner.start()
+        job_id = runner.submit_reindex(IndexSpec(
+            collection="benchmark_reindexed",
+            chunk_size=settings.CHUNK_SIZE * 2,
+            chunk_overlap=settings.CHUNK_OVERLAP
+        ))
+        while (job := store.get_job(job_id))["status"] not in (COMPLETED, FAILED):
+            time.sleep(0.05)
+        if job["status"] == FAILED:
+            raise RuntimeError(f"Re-index failed: {job['error']}")
+        result["reindex"] = summarize(job["finished_at"] - job["started_at"], processor.timings, processor.chunks)
+    finally:
+        runner.stop()
+        for component in (processor, manifest, service, store, page_store, *(c for index in activated for c in index)):
+            component.close()
+    return result
+
+
+def run_scenario(name: str, args: argparse.Namespace) -> Dict[str, Any]:
+    """Run one scenario in this process and return its measurements."""
+    import tracemalloc
+    from backend.app.utils import metrics
+
+    with tempfile.TemporaryDirectory(dir=_STATE_DIR) as work_dir:
+        scenario = _Scenario(args, work_dir)
+        if args.tracemalloc:
+            tracemalloc.start()
+        profile, token = metrics.start_profile()
+        try:
+            result = globals()[f"run_{name}"](scenario)
+        finally:
+            metrics.stop_profile(token)
+        if args.tracemalloc:
+            result["tracemalloc_peak_bytes"] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    result["peak_rss_bytes"] = metrics.peak_rss_bytes()
+    result["stages"] = {
+        stage: {"seconds": round(seconds, 4), "calls": calls, "items": items}
+        for stage, (seconds, calls, items, _) in sorted(profile.stages.items())
+    }
+    return result
+
+
+def git_commit() -> Optional[str]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f"{commit}-dirty" if dirty.strip() else commit
+
+
+def flatten(result: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    values = {}
+    for key, value in result.items():
+        if key == "stages":
+            continue
+        if isinstance(value, dict):
+            values.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[f"{prefix}{key}"] = value
+    return values
+
+
+def compare(previous: Dict[str, Any], current: Dict[str, Any], tolerance: float) -> List[str]:
+    """Print the change of each metric and return those that regressed."""
+    regressions = []
+    for name, result in current["scenarios"].items():
+        before = flatten(previous.get("scenarios", {}).get(name, {}))
+        if not before:
+            continue
+        print(f"{name} (vs {previous.get('commit') or 'previous run'}):")
+        for metric, value in flatten(result).items():
+            old = before.get(metric)
+            if not old or metric.endswith(("files", "chunks", "processed", "failed", "skipped", "queries")):
+                continue
+            change = value / old - 1
+            worse = -change if metric.rsplit(".", 1)[-1] in HIGHER_IS_BETTER else change
+            flag = ""
+            if worse > tolerance and metric.endswith(HIGHER_IS_BETTER + ("_ms", "_bytes")):
+                flag = "  REGRESSION"
+                regressions.append(f"{name}.{metric}")
+            print(f"  {metric}: {old:g} -> {value:g} ({change * 100:+.1f}%){flag}")
+    return regressions
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--files", type=int, default=50, help="PDFs in the corpus")
+    parser.add_argument("--pages", type=int, default=8, help="typical pages per PDF")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated subset to run")
+    parser.add_argument("--tokenize-ms", type=float, default=1.0, help="latency per tokenize call")
+    parser.add_argument("--embed-ms", type=float, default=10.0, help="latency per embedding call")
+    parser.add_argument("--embed-item-ms", type=float, default=0.2, help="extra embedding latency per text")
+    parser.add_argument("--store-ms", type=float, default=2.0, help="latency per vector store call")
+    parser.add_argument("--s3-ms", type=float, default=2.0, help="latency per S3 request")
+    parser.add_argument("--s3-mib-per-second", type=float, default=200.0, help="S3 transfer speed, 0 for unbounded")
+    parser.add_argument("--error-rate", type=float, default=0.05, help="failing call fraction in the faults scenario")
+    parser.add_argument("--dedup", choices=("off", "exact", "near"), default="off", help="chunk deduplication")
+    parser.add_argument("--queries", type=int, default=100, help="distinct search queries per mode")
+    parser.add_argument("--tracemalloc", action="store_true", help="also trace Python allocations (slower)")
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--compare", help="previous result file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="relative change counted as a regression")
+    parser.add_argument("--run-scenario", help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main() -> None:
+    args = parse_args()
+    if args.run_scenario:
+        result = run_scenario(args.run_scenario, args)
+        with open(args.result_file, "w") as f:
+            json.dump(result, f)
+        return
+
+    names = [name for name in args.scenarios.split(",") if name]
+    unknown = sorted(set(names) - set(SCENARIOS))
+    if unknown:
+        sys.exit(f"Unknown scenarios: {', '.join(unknown)}")
+
+    from backend.app.core.config import settings
+
+    config = {
+        key: value for key, value in vars(args).items()
+        if key not in ("output", "compare", "run_scenario", "result_file", "scenarios")
+    }
+    config.update({
+        name: getattr(settings, name) for name in (
+            "INGEST_DOWNLOAD_WORKERS", "INGEST_PARSE_WORKERS", "INGEST_EMBED_WORKERS",
+            "EMBEDDING_BATCH_MAX_SIZE", "EMBEDDING_BATCH_MAX_TOKENS", "EMBEDDING_MAX_IN_FLIGHT"
+        )
+    })
+    report = {
+        "commit": git_commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "config": config,
+        "scenarios": {},
+    }
+
+    result_file = os.path.join(_STATE_DIR, "result.json")
+    for name in names:
+        # Application logs go to stdout, so results come back through a file
+        completed = subprocess.run(
+            [sys.executable, "-m", "benchmarks.suite", *sys.argv[1:], "--run-scenario", name, "--result-file", result_file],
+            stdout=subprocess.DEVNULL
+        )
+        if completed.returncode != 0:
+            sys.exit(f"Scenario {name} failed with exit code {completed.returncode}")
+        with open(result_file) as f:
+            result = json.load(f)
+        report["scenarios"][name] = result
+        print(
+            f"{name}: {result['files_per_second']:.2f} files/s, {result['chunks_per_second']:.1f} chunks/s, "
+            f"p50 {result['p50_file_ms']:.1f} ms, p99 {result['p99_file_ms']:.1f} ms per file, "
+            f"peak RSS {result['peak_rss_bytes'] / 2**20:.0f} MiB"
+        )
+
+    shutil.rmtree(_STATE_DIR, ignore_errors=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        regressions = compare(previous, report, args.tolerance)
+        if regressions:
+            sys.exit(f"Regressed beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Counts tokenizer calls made while splitting a synthetic document.
+
+Compares RecursiveCharacterTextSplitter (one length_function call per
+candidate fragment) with TokenOffsetTextSplitter (one call per page).
+
+Usage: python -m benchmarks.tokenizer_calls [pages]
+"""
+
+import re
+import sys
+import time
+import random
+from typing import List, Tuple
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from backend.app.services.embeddings.text_splitter import TokenOffsetTextSplitter
+
+_TOKEN = re.compile(r"\w{1,4}|[^\w\s]")
+
+
+class CountingTokenizer:
+    def __init__(self):
+        self.calls = 0
+
+    def count_tokens(self, text: str) -> int:
+        self.calls += 1
+        return len(_TOKEN.findall(text))
+
+    def token_offsets(self, text: str) -> List[Tuple[int, int]]:
+        self.calls += 1
+        return [match.span() for match in _TOKEN.finditer(text)]
+
+
+def make_page(rng: random.Random) -> str:
+    words = ["clause", "section", "the", "agreement", "error", "E1042", "shall", "party", "notice", "of"]
+    paragraphs = []
+    for _ in range(rng.randint(4, 8)):
+        lines = [" ".join(rng.choice(words) for _ in range(rng.randint(8, 16))) for _ in range(rng.randint(3, 6))]
+        paragraphs.append("\n".join(lines))
+    return "\n\n".join(paragraphs)
+
+
+def main(pages: int = 400) -> None:
+    rng = random.Random(0)
+    corpus = [make_page(rng) for _ in range(pages)]
+
+    recursive_tokenizer = CountingTokenizer()
+    recursive = RecursiveCharacterTextSplitter(
+        chunk_size=256,
+        chunk_overlap=50,
+        length_function=recursive_tokenizer.count_tokens,
+        separators=["\n\n", "\n", " ", ""]
+    )
+    started = time.perf_counter()
+    recursive_chunks = sum(len(recursive.split_text(page)) for page in corpus)
+    recursive_time = time.perf_counter() - started
+
+    offset_tokenizer = CountingTokenizer()
+    offset = TokenOffsetTextSplitter(offset_tokenizer, chunk_size=256, chunk_overlap=50)
+    started = time.perf_counter()
+    offset_chunks = sum(len(offset.split_text(page)) for page in corpus)
+    offset_time = time.perf_counter() - started
+
+    print(f"pages:                 {pages}")
+    print(f"recursive splitter:    {recursive_tokenizer.calls} tokenizer calls, "
+          f"{recursive_chunks} chunks, {recursive_time:.3f}s")
+    print(f"offset splitter:       {offset_tokenizer.calls} tokenizer calls, "
+          f"{offset_chunks} chunks, {offset_time:.3f}s")
+    print(f"calls saved:           {recursive_tokenizer.calls - offset_tokenizer.calls}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 400)